@@ -1,14 +1,45 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+import json
 import time
 import uuid
-from zeal.backend.workflow.graph import handle_message
+from zeal.backend.workflow.graph import handle_message, STREAM_ERROR_MESSAGE
+from zeal.backend.workflow.app_context import APP_CONTEXT
+from zeal.backend.handlers.intent_classifier import get_intent_classifier
+from zeal.backend.memory.cache import get_cache_stats
+from zeal.backend.database.vector_store import get_embeddings
+from zeal.backend.memory.semantic_cache import get_semantic_cache_stats
+from zeal.backend.llm.prompts import get_prompt_stats
+from zeal.backend.memory.conversation import CONVERSATION_MEMORY
+from zeal.backend.config import WARMUP_ON_STARTUP
+from zeal.backend.logger import logger
 
 app = Flask(__name__)
 
+# Build the graph, retriever and LLM clients once per process, before the first user request
+if WARMUP_ON_STARTUP:
+    APP_CONTEXT.start(background=True)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    status = APP_CONTEXT.status()
+    return jsonify(status), 200 if status['status'] == 'ready' else 503
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'intent_classifier': get_intent_classifier().stats(),
+        'query_cache': get_cache_stats(),
+        'semantic_cache': get_semantic_cache_stats(),
+        'embedding_cache': get_embeddings().stats(),
+        'prompts': get_prompt_stats(),
+        'conversations': CONVERSATION_MEMORY.stats(),
+        'index_shards': APP_CONTEXT.sharded_index.stats() if APP_CONTEXT.sharded_index else None
+    })
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
@@ -25,5 +56,38 @@ def chat():
         'time_taken': f"{end_time - start_time:.2f}s"
     })
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    query = data.get('message', '')
+    session_id = data.get('session_id', str(uuid.uuid4()))
+    
+    def event_stream():
+        start_time = time.time()
+        first_token_time = None
+        try:
+            for token in handle_message(query, session_id, stream=True):
+                if first_token_time is None:
+                    first_token_time = time.time()
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming response for session {session_id}: {e}", exc_info=True)
+            yield f"event: error\ndata: {json.dumps({'error': STREAM_ERROR_MESSAGE, 'session_id': session_id})}\n\n"
+            return
+        end_time = time.time()
+        
+        done = {
+            'session_id': session_id,
+            'time_taken': f"{end_time - start_time:.2f}s",
+            'time_to_first_token': f"{(first_token_time or end_time) - start_time:.2f}s"
+        }
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+    
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
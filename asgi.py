@@ -0,0 +1,160 @@
+"""
+ASGI entry point for the restaurant agent.
+
+Serves the same API as app.py, but every request runs on one asyncio event loop
+and drives the async graph (graph.ainvoke), so in-flight conversations waiting
+on OpenAI do not each hold a thread. Run with:
+
+    uvicorn zeal.backend.asgi:app --workers 1
+"""
+import json
+import os
+import time
+import uuid
+from zeal.backend.logger import logger
+from zeal.backend.config import WARMUP_ON_STARTUP
+from zeal.backend.workflow.app_context import APP_CONTEXT
+from zeal.backend.workflow.graph import ahandle_message, astream_message, STREAM_ERROR_MESSAGE
+from zeal.backend.handlers.intent_classifier import get_intent_classifier
+from zeal.backend.memory.cache import get_cache_stats
+from zeal.backend.database.vector_store import get_embeddings
+from zeal.backend.memory.semantic_cache import get_semantic_cache_stats
+from zeal.backend.llm.prompts import get_prompt_stats
+from zeal.backend.memory.conversation import CONVERSATION_MEMORY
+
+INDEX_HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+async def _read_json(receive):
+    """Read the full request body and decode it as JSON."""
+    body = b""
+    more_body = True
+    while more_body:
+        event = await receive()
+        body += event.get("body", b"")
+        more_body = event.get("more_body", False)
+    return json.loads(body) if body else {}
+
+async def _send_response(send, status, body: bytes, content_type: str):
+    """Send a complete (non-streaming) HTTP response."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_json(send, status, payload):
+    """Send a JSON HTTP response."""
+    await _send_response(send, status, json.dumps(payload).encode(), "application/json")
+
+async def _index(scope, receive, send):
+    with open(INDEX_HTML_PATH, "rb") as file:
+        await _send_response(send, 200, file.read(), "text/html; charset=utf-8")
+
+async def _ready(scope, receive, send):
+    status = APP_CONTEXT.status()
+    await _send_json(send, 200 if status["status"] == "ready" else 503, status)
+
+async def _stats(scope, receive, send):
+    await _send_json(send, 200, {
+        "intent_classifier": get_intent_classifier().stats(),
+        "query_cache": get_cache_stats(),
+        "semantic_cache": get_semantic_cache_stats(),
+        "embedding_cache": get_embeddings().stats(),
+        "prompts": get_prompt_stats(),
+        "conversations": CONVERSATION_MEMORY.stats(),
+        "index_shards": APP_CONTEXT.sharded_index.stats() if APP_CONTEXT.sharded_index else None
+    })
+
+async def _chat(scope, receive, send):
+    data = await _read_json(receive)
+    query = data.get("message", "")
+    session_id = data.get("session_id", str(uuid.uuid4()))
+    
+    start_time = time.time()
+    response = await ahandle_message(query, session_id)
+    end_time = time.time()
+    
+    await _send_json(send, 200, {
+        "response": response,
+        "session_id": session_id,
+        "time_taken": f"{end_time - start_time:.2f}s"
+    })
+
+async def _chat_stream(scope, receive, send):
+    data = await _read_json(receive)
+    query = data.get("message", "")
+    session_id = data.get("session_id", str(uuid.uuid4()))
+    
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no")
+        ]
+    })
+    
+    start_time = time.time()
+    first_token_time = None
+    try:
+        async for token in astream_message(query, session_id):
+            if first_token_time is None:
+                first_token_time = time.time()
+            event = f"data: {json.dumps({'token': token})}\n\n"
+            await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+    except Exception as e:
+        # The response has started, so the error goes to the client as an event, not a 500
+        logger.error(f"Error streaming response for session {session_id}: {e}", exc_info=True)
+        event = f"event: error\ndata: {json.dumps({'error': STREAM_ERROR_MESSAGE, 'session_id': session_id})}\n\n"
+        await send({"type": "http.response.body", "body": event.encode(), "more_body": False})
+        return
+    end_time = time.time()
+    
+    done = {
+        "session_id": session_id,
+        "time_taken": f"{end_time - start_time:.2f}s",
+        "time_to_first_token": f"{(first_token_time or end_time) - start_time:.2f}s"
+    }
+    event = f"event: done\ndata: {json.dumps(done)}\n\n"
+    await send({"type": "http.response.body", "body": event.encode(), "more_body": False})
+
+ROUTES = {
+    ("GET", "/"): _index,
+    ("GET", "/api/ready"): _ready,
+    ("GET", "/api/stats"): _stats,
+    ("POST", "/api/chat"): _chat,
+    ("POST", "/api/chat/stream"): _chat_stream,
+}
+
+async def _lifespan(receive, send):
+    """Handle ASGI lifespan events: start the warm-up on startup."""
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            if WARMUP_ON_STARTUP:
+                APP_CONTEXT.start(background=True)
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    """ASGI application callable."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await _send_json(send, 404, {"error": "Not found"})
+        return
+    
+    try:
+        await handler(scope, receive, send)
+    except Exception as e:
+        logger.error(f"Error handling {scope['method']} {scope['path']}: {e}", exc_info=True)
+        await _send_json(send, 500, {"error": "Internal server error"})
@@ -0,0 +1,81 @@
+"""
+Recall and latency of the FAISS index types (database/ann_index.py) on synthetic vectors.
+
+For each catalog size, the vectors are drawn around random cluster centres (closer
+to real embeddings than uniform noise), every index type is built with
+create_index, and single-query searches are timed on one thread, the way a request
+is served. Recall@k is measured against the exact flat index.
+
+    python -m zeal.backend.benchmarks.ann_index_benchmark --sizes 1000,100000,1000000 --dim 128
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from zeal.backend.config import FAISS_INDEX_PARAMS
+from zeal.backend.database.ann_index import index_config, create_index, apply_search_params
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Gaussian vectors scattered around random cluster centres."""
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32) * 4
+    assignment = rng.integers(0, clusters, count)
+    return centres[assignment] + rng.standard_normal((count, dim), dtype=np.float32)
+
+def latency_and_results(index: faiss.Index, queries: np.ndarray, k: int):
+    """Search queries one at a time. Returns (p50 ms, p99 ms, (nq, k) result ids)."""
+    timings = np.empty(len(queries))
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, results[i] = index.search(query[None], k)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000, results
+
+def recall_at_k(results: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the true k nearest neighbours that were returned."""
+    return float(np.mean([len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)]))
+
+def main():
+    ivf_defaults, hnsw_defaults = FAISS_INDEX_PARAMS["ivf"], FAISS_INDEX_PARAMS["hnsw"]
+    parser = argparse.ArgumentParser(description="Recall@k and query latency of flat, IVF and HNSW indexes")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated numbers of vectors")
+    parser.add_argument("--dim", type=int, default=128, help="Vector dimensions (text-embedding-3-small has 1536)")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of timed queries")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--nlist", type=int, default=ivf_defaults["nlist"], help="IVF lists")
+    parser.add_argument("--nprobe", default=f"1,4,{ivf_defaults['nprobe']},64", help="Comma-separated IVF nprobe values")
+    parser.add_argument("--hnsw-m", type=int, default=hnsw_defaults["M"], help="HNSW neighbours per node")
+    parser.add_argument("--ef-search", default=f"16,{hnsw_defaults['ef_search']},256", help="Comma-separated HNSW efSearch values")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    build_threads = faiss.omp_get_max_threads()
+    print(f"{'vectors':>9} {'index':<28} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for count in [int(size) for size in args.sizes.split(",")]:
+        data = synthetic_vectors(count + args.queries, args.dim, max(10, count // 1000), rng)
+        vectors, queries = data[:count], data[count:]
+
+        configs = [index_config("flat"), index_config("ivf", nlist=args.nlist), index_config("hnsw", M=args.hnsw_m)]
+        truth = None
+        for config in configs:
+            faiss.omp_set_num_threads(build_threads)
+            start = time.perf_counter()
+            index = create_index(config, vectors)
+            build_seconds = time.perf_counter() - start
+
+            faiss.omp_set_num_threads(1)  # one request is served by one thread
+            if config["type"] == "flat":
+                sweep = [("flat", config)]
+            elif config["type"] == "ivf":
+                sweep = [(f"ivf nlist={config['nlist']} nprobe={nprobe}", {**config, "nprobe": int(nprobe)}) for nprobe in args.nprobe.split(",")]
+            else:
+                sweep = [(f"hnsw M={config['M']} ef={ef}", {**config, "ef_search": int(ef)}) for ef in args.ef_search.split(",")]
+            for label, search_config in sweep:
+                apply_search_params(index, search_config)
+                p50, p99, results = latency_and_results(index, queries, args.k)
+                if truth is None:
+                    truth = results  # the flat index runs first and is exact
+                print(f"{count:>9} {label:<28} {build_seconds:>8.2f} {recall_at_k(results, truth):>9.3f} {p50:>8.3f} {p99:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Concurrency benchmark for the threaded (Flask) vs. asyncio (ASGI) serving paths.
+
+Uses the offline fake LLM and fake embeddings, so no OpenAI calls are made. Both
+paths send the same greeting, which the local intent classifier routes as casual
+conversation: the LLM analysis is skipped, leaving one simulated LLM round trip
+(the handler's) per request.
+
+    python -m zeal.backend.benchmarks.async_concurrency --requests 500 --threads 32
+"""
+import os
+
+# The fake LLM (and embeddings) must be selected before the agent modules read the config
+os.environ.setdefault("USE_FAKE_LLM", "1")
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from zeal.backend.workflow.graph import handle_message, ahandle_message
+
+MESSAGE = "hello there"  # confidently casual for the local classifier
+
+def run_threaded(num_requests: int, num_threads: int) -> float:
+    """Run requests through handle_message on a bounded thread pool. Returns elapsed seconds."""
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(
+            lambda i: handle_message(MESSAGE, session_id=f"threaded-{i}"),
+            range(num_requests)
+        ))
+    return time.perf_counter() - start_time
+
+async def run_async(num_requests: int) -> float:
+    """Run all requests concurrently through ahandle_message on one event loop. Returns elapsed seconds."""
+    start_time = time.perf_counter()
+    await asyncio.gather(*[
+        ahandle_message(MESSAGE, session_id=f"async-{i}")
+        for i in range(num_requests)
+    ])
+    return time.perf_counter() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare threaded and asyncio request throughput with a fake LLM")
+    parser.add_argument("--requests", type=int, default=200, help="Number of concurrent chat requests")
+    parser.add_argument("--threads", type=int, default=32, help="Thread pool size for the threaded path")
+    args = parser.parse_args()
+    
+    latency = float(os.environ.get("FAKE_LLM_LATENCY", "0.5"))
+    print(f"{args.requests} requests, fake LLM latency {latency:.2f}s per call, 1 call per request")
+    
+    threaded_seconds = run_threaded(args.requests, args.threads)
+    print(f"threaded ({args.threads} threads): {threaded_seconds:.2f}s, {args.requests / threaded_seconds:.1f} req/s")
+    
+    async_seconds = asyncio.run(run_async(args.requests))
+    print(f"asyncio (1 event loop):   {async_seconds:.2f}s, {args.requests / async_seconds:.1f} req/s")
+    print(f"speedup: {threaded_seconds / async_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
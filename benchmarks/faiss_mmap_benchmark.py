@@ -0,0 +1,115 @@
+"""
+Resident memory and load time of the FAISS index per worker, heap vs. memory-mapped.
+
+Starts N worker processes that load the index at the same time, run searches over
+it, and report their load time and memory while all of them are resident. PSS
+(proportional set size) splits shared pages between the processes mapping them, so
+its total is the real cost of N workers; RSS counts shared pages in every worker.
+Linux only (reads /proc/self/smaps_rollup). Query embeddings are random vectors,
+so no OpenAI calls are made.
+
+    python -m zeal.backend.benchmarks.faiss_mmap_benchmark --synthetic 50000 --workers 1,2,4,8
+    python -m zeal.backend.benchmarks.faiss_mmap_benchmark --index-dir path/to/restaurant_idx
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from zeal.backend.config import FAISS_INDEX_DIR
+
+def memory_kb():
+    """Return (rss, pss) of this process in kB."""
+    values = {}
+    with open("/proc/self/smaps_rollup", "r") as file:
+        for line in file:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values["Rss"], values["Pss"]
+
+def build_synthetic_index(index_dir: str, count: int, dim: int) -> None:
+    """Save an index of random vectors with restaurant-like documents."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import FakeEmbeddings
+    from zeal.backend.database.vector_store import save_faiss_index
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    texts = [f"Restaurant {i}. Cuisine: cuisine {i % 40}. Location: neighborhood {i % 300}, city {i % 12}." for i in range(count)]
+    metadatas = [{"id": f"r{i}", "name": f"Restaurant {i}", "price": "$" * (1 + i % 4), "location": f"city {i % 12}"} for i in range(count)]
+    vector_store = FAISS.from_embeddings(zip(texts, vectors.tolist()), FakeEmbeddings(size=dim), metadatas=metadatas)
+    save_faiss_index(vector_store, index_dir)
+
+def worker(index_dir: str, mmap: bool, searches: int, barrier, results) -> None:
+    """Load the index, search it, and report load time and memory once every worker is resident."""
+    from langchain_core.embeddings import FakeEmbeddings
+    from zeal.backend.database.vector_store import load_faiss_index, search_restaurants_by_vector
+
+    rss_before, pss_before = memory_kb()
+    barrier.wait()
+    start = time.perf_counter()
+    vector_store = load_faiss_index(index_dir, FakeEmbeddings(size=1), mmap=mmap)
+    load_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(os.getpid())
+    start = time.perf_counter()
+    for _ in range(searches):
+        search_restaurants_by_vector(vector_store, rng.standard_normal(vector_store.index.d).tolist(), k=5)
+    search_ms = (time.perf_counter() - start) / max(searches, 1) * 1000
+
+    barrier.wait()  # every worker holds its index now
+    rss, pss = memory_kb()
+    results.put((load_seconds, search_ms, rss - rss_before, pss))
+    barrier.wait()
+
+def run(index_dir: str, mmap: bool, workers: int, searches: int):
+    """Run one configuration. Returns (mean load s, mean search ms, total RSS growth MB, total PSS MB)."""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(index_dir, mmap, searches, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return (
+        sum(row[0] for row in rows) / workers,
+        sum(row[1] for row in rows) / workers,
+        sum(row[2] for row in rows) / 1024,
+        sum(row[3] for row in rows) / 1024
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare heap and memory-mapped FAISS loading across worker counts")
+    parser.add_argument("--index-dir", default=FAISS_INDEX_DIR, help="Saved index directory")
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark a temporary index of this many random vectors instead")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimensions of the synthetic vectors")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts")
+    parser.add_argument("--searches", type=int, default=20, help="Searches per worker after loading")
+    args = parser.parse_args()
+
+    temp_dir = None
+    index_dir = args.index_dir
+    if args.synthetic:
+        temp_dir = tempfile.TemporaryDirectory()
+        index_dir = temp_dir.name
+        print(f"Building a synthetic index of {args.synthetic} x {args.dim} vectors")
+        build_synthetic_index(index_dir, args.synthetic, args.dim)
+    size_mb = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir)) / 2 ** 20
+    print(f"Index directory: {index_dir} ({size_mb:.1f} MB on disk)")
+
+    print(f"{'mode':<6} {'workers':>7} {'load s':>8} {'search ms':>10} {'RSS MB':>9} {'PSS MB':>9} {'PSS/worker':>11}")
+    for workers in [int(count) for count in args.workers.split(",")]:
+        for mmap in (False, True):
+            load_seconds, search_ms, rss_mb, pss_mb = run(index_dir, mmap, workers, args.searches)
+            print(f"{'mmap' if mmap else 'heap':<6} {workers:>7} {load_seconds:>8.3f} {search_ms:>10.2f} "
+                  f"{rss_mb:>9.1f} {pss_mb:>9.1f} {pss_mb / workers:>11.1f}")
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
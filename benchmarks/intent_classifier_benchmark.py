@@ -0,0 +1,65 @@
+"""
+Accuracy and latency benchmark for the local fast-path intent classifier.
+
+Reports, on a labeled evaluation set that is disjoint from the training data:
+overall accuracy, the share of messages answered locally (hit rate) and their
+accuracy at several confidence thresholds, and per-message latency.
+
+    python -m zeal.backend.benchmarks.intent_classifier_benchmark
+"""
+import argparse
+import os
+import statistics
+import time
+from collections import Counter
+from zeal.backend.handlers.intent_classifier import get_intent_classifier, load_labeled_examples
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_eval.jsonl")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local intent classifier")
+    parser.add_argument("--eval-path", default=EVAL_PATH, help="JSON Lines file of {text, intent} examples")
+    parser.add_argument("--repeat", type=int, default=200, help="Timing repetitions per message")
+    parser.add_argument("--show-errors", action="store_true", help="Print misclassified messages")
+    args = parser.parse_args()
+    
+    classifier = get_intent_classifier()
+    examples = load_labeled_examples(args.eval_path)
+    predictions = [classifier.predict(example["text"]) for example in examples]
+    
+    correct = sum(prediction[0] == example["intent"] for prediction, example in zip(predictions, examples))
+    print(f"{len(examples)} evaluation examples, overall accuracy {correct / len(examples):.1%}")
+    
+    print("\nthreshold  hit rate  accuracy on hits  LLM fallbacks")
+    for threshold in (0.6, 0.7, 0.8, 0.9, 0.95, 0.99):
+        hits = [(prediction, example) for prediction, example in zip(predictions, examples) if prediction[1] >= threshold]
+        hit_correct = sum(prediction[0] == example["intent"] for prediction, example in hits)
+        accuracy = hit_correct / len(hits) if hits else 0.0
+        marker = "  <- configured" if threshold == classifier.min_confidence else ""
+        print(f"{threshold:9.2f}  {len(hits) / len(examples):8.1%}  {accuracy:16.1%}  {len(examples) - len(hits):13d}{marker}")
+    
+    hits_by_intent = Counter(example["intent"] for prediction, example in zip(predictions, examples)
+                             if prediction[1] >= classifier.min_confidence)
+    totals_by_intent = Counter(example["intent"] for example in examples)
+    print("\nhit rate by intent at the configured threshold:")
+    for intent, total in totals_by_intent.items():
+        print(f"  {intent:28s} {hits_by_intent[intent] / total:.1%}")
+    
+    if args.show_errors:
+        print("\nmisclassified:")
+        for prediction, example in zip(predictions, examples):
+            if prediction[0] != example["intent"]:
+                print(f"  {example['text']!r}: expected {example['intent']}, got {prediction[0]} ({prediction[1]:.2f}, {prediction[2]})")
+    
+    latencies = []
+    for example in examples:
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            classifier.predict(example["text"])
+        latencies.append((time.perf_counter() - start_time) / args.repeat * 1e6)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    print(f"\nlatency per message: p50 {statistics.median(latencies):.1f}us, p99 {p99:.1f}us")
+
+if __name__ == "__main__":
+    main()
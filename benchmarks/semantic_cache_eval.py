@@ -0,0 +1,85 @@
+"""
+False-hit evaluation harness for the semantic cache thresholds.
+
+Each labeled pair is a new query and a previously cached query, marked equivalent
+(a hit is correct) or not (a hit would serve a wrong answer). For each namespace the
+harness sweeps thresholds and reports the true-hit rate on equivalent pairs and the
+false-hit rate on non-equivalent pairs, so thresholds can be tuned before deploying.
+Embeddings come from the configured embedding model and are cached in a local .npz file.
+
+    python -m zeal.backend.benchmarks.semantic_cache_eval
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+import numpy as np
+from zeal.backend.config import SEMANTIC_CACHE_THRESHOLDS
+from zeal.backend.database.vector_store import get_embeddings
+
+PAIRS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "semantic_cache_pairs.jsonl")
+
+def load_pairs(path: str):
+    """Load labeled {namespace, query, cached, equivalent} pairs from a JSON Lines file."""
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def embed_all(texts, cache_path: str):
+    """
+    Embed the distinct texts, reusing vectors stored in cache_path from earlier runs.
+    
+    Args:
+        texts: Texts to embed
+        cache_path: .npz file of previously computed embeddings
+        
+    Returns:
+        Dictionary of text -> unit-length float32 vector
+    """
+    vectors = {}
+    if cache_path and os.path.exists(cache_path):
+        stored = np.load(cache_path, allow_pickle=False)
+        vectors = dict(zip(stored["texts"].tolist(), stored["vectors"]))
+    
+    missing = sorted(set(texts) - set(vectors))
+    if missing:
+        for text, vector in zip(missing, get_embeddings().embed_documents(missing)):
+            vectors[text] = np.asarray(vector, dtype=np.float32)
+        if cache_path:
+            np.savez(cache_path, texts=np.array(list(vectors)), vectors=np.vstack(list(vectors.values())))
+    
+    return {text: vector / np.linalg.norm(vector) for text, vector in vectors.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure semantic cache true/false hit rates per threshold")
+    parser.add_argument("--pairs", default=PAIRS_PATH, help="JSON Lines file of labeled query pairs")
+    parser.add_argument("--embedding-cache", default="semantic_cache_eval_embeddings.npz", help="Where to keep computed embeddings ('' to disable)")
+    args = parser.parse_args()
+    
+    pairs = load_pairs(args.pairs)
+    vectors = embed_all([pair["query"] for pair in pairs] + [pair["cached"] for pair in pairs], args.embedding_cache)
+    
+    by_namespace = defaultdict(list)
+    for pair in pairs:
+        similarity = float(vectors[pair["query"]] @ vectors[pair["cached"]])
+        by_namespace[pair["namespace"]].append((similarity, pair))
+    
+    for namespace, scored in sorted(by_namespace.items()):
+        positives = [similarity for similarity, pair in scored if pair["equivalent"]]
+        negatives = [similarity for similarity, pair in scored if not pair["equivalent"]]
+        configured = SEMANTIC_CACHE_THRESHOLDS.get(namespace)
+        print(f"\n[{namespace}] {len(positives)} equivalent / {len(negatives)} non-equivalent pairs, configured threshold {configured}")
+        print("threshold  true-hit rate  false-hit rate")
+        for threshold in sorted({0.85, 0.88, 0.90, 0.92, 0.93, 0.94, 0.95, 0.96, 0.97, 0.98, configured} - {None}):
+            true_hits = sum(similarity >= threshold for similarity in positives) / len(positives) if positives else 0.0
+            false_hits = sum(similarity >= threshold for similarity in negatives) / len(negatives) if negatives else 0.0
+            marker = "  <- configured" if threshold == configured else ""
+            print(f"{threshold:9.2f}  {true_hits:13.1%}  {false_hits:14.1%}{marker}")
+        
+        # The most dangerous pairs: non-equivalent but highly similar
+        for similarity, pair in sorted(scored, key=lambda item: -item[0]):
+            if not pair["equivalent"]:
+                print(f"closest non-equivalent pair ({similarity:.3f}): {pair['query']!r} vs {pair['cached']!r}")
+                break
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Memory, recall and latency of compressed vector storage (database/ann_index.py).
+
+Each configuration is built with create_index over the same vectors and compared
+with exact float32 search: bytes per vector, recall@k of the top k, and the median
+single-thread query time. "codes B/vec" is what a search scans; with re-ranking the
+float32 vectors are stored too ("total B/vec"), but only the candidates' rows are
+read, so in mapped mode they stay on disk / in the shared page cache.
+
+The "dims N" rows shorten the vectors the way the embedding API's dimensions
+parameter does (truncate, then L2-normalize). That is only meaningful for real
+text-embedding-3 vectors, which are trained to be shortened; pass --index-dir to
+evaluate the vectors of a saved flat index (queries are held-out rows).
+
+    python -m zeal.backend.benchmarks.vector_compression_eval --count 100000
+    python -m zeal.backend.benchmarks.vector_compression_eval --index-dir path/to/restaurant_idx
+"""
+import argparse
+import os
+import time
+import faiss
+import numpy as np
+from zeal.backend.database.ann_index import index_config, create_index, index_vectors
+
+def synthetic_embeddings(count: int, dim: int, intrinsic_dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors near a random low-dimensional subspace, like text embeddings."""
+    latent = rng.standard_normal((count, intrinsic_dim), dtype=np.float32)
+    basis = rng.standard_normal((intrinsic_dim, dim), dtype=np.float32)
+    vectors = latent @ basis + 0.1 * rng.standard_normal((count, dim), dtype=np.float32) * np.sqrt(intrinsic_dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def index_file_vectors(index_dir: str) -> np.ndarray:
+    """The vectors of a saved index (decoded, if it is already compressed)."""
+    return index_vectors(faiss.read_index(os.path.join(index_dir, "index.faiss")))
+
+def shorten(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Truncate to the first dim components and re-normalize, as the embedding API does."""
+    short = np.ascontiguousarray(vectors[:, :dim])
+    return short / np.linalg.norm(short, axis=1, keepdims=True)
+
+def bytes_per_vector(index: faiss.Index):
+    """Return (bytes of the scanned codes, total bytes) per vector of a serialized index."""
+    total = len(faiss.serialize_index(index)) / index.ntotal
+    refine = faiss.downcast_index(index)
+    if isinstance(refine, faiss.IndexRefine):
+        return len(faiss.serialize_index(refine.base_index)) / index.ntotal, total
+    return total, total
+
+def evaluate(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int):
+    """Search queries one at a time. Returns (recall@k, p50 ms)."""
+    timings = np.empty(len(queries))
+    hits = 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query[None], k)
+        timings[i] = time.perf_counter() - start
+        hits += len(set(found[0]) & set(truth[i]))
+    return hits / truth.size, np.percentile(timings, 50) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy cost of reduced dimensions and quantized vector storage")
+    parser.add_argument("--index-dir", help="Evaluate the vectors of a saved index instead of synthetic ones")
+    parser.add_argument("--count", type=int, default=100000, help="Synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic vector dimensions (text-embedding-3-small)")
+    parser.add_argument("--intrinsic-dim", type=int, default=64, help="Dimensions of the subspace synthetic vectors lie near")
+    parser.add_argument("--queries", type=int, default=500, help="Held-out queries")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--index-type", default="flat", choices=("flat", "ivf", "hnsw"), help="Index type of every configuration")
+    parser.add_argument("--reduced-dims", type=int, default=256, help="Dimensions for PCA and API shortening")
+    parser.add_argument("--pq-m", type=int, default=96, help="PQ bytes per vector at full dimensions")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.index_dir:
+        data = index_file_vectors(args.index_dir)
+        data = data[rng.permutation(len(data))]
+    else:
+        data = synthetic_embeddings(args.count + args.queries, args.dim, args.intrinsic_dim, rng)
+    vectors, queries = data[args.queries:], data[:args.queries]
+    dim, reduced = vectors.shape[1], args.reduced_dims
+    print(f"{len(vectors)} x {dim} vectors, {len(queries)} queries, {args.index_type} index")
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    reduced_pq_m = max(m for m in (8, 16, 32, 48, 64) if reduced % m == 0 and m <= reduced // 4)
+    configs = [
+        ("float32", {}),
+        ("fp16", {"storage": "fp16"}),
+        ("sq8", {"storage": "sq8"}),
+        (f"pq{args.pq_m}", {"storage": "pq", "pq_m": args.pq_m}),
+        (f"pq{args.pq_m} + rerank", {"storage": "pq", "pq_m": args.pq_m, "rerank": True}),
+        (f"pca{reduced}", {"pca_dimensions": reduced}),
+        (f"pca{reduced} + sq8", {"pca_dimensions": reduced, "storage": "sq8"}),
+        (f"pca{reduced} + sq8 + rerank", {"pca_dimensions": reduced, "storage": "sq8", "rerank": True}),
+        (f"pca{reduced} + pq{reduced_pq_m} + rerank", {"pca_dimensions": reduced, "storage": "pq", "pq_m": reduced_pq_m, "rerank": True}),
+        (f"dims {reduced}", {"shorten": True}),
+        (f"dims {reduced} + sq8", {"shorten": True, "storage": "sq8"}),
+    ]
+
+    build_threads = faiss.omp_get_max_threads()
+    print(f"{'storage':<30} {'codes B/vec':>12} {'total B/vec':>12} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>8}")
+    for label, params in configs:
+        params = {"storage": "flat", "rerank": False, **params}
+        base, searched = vectors, queries
+        if params.pop("shorten", False):
+            base, searched = shorten(vectors, reduced), shorten(queries, reduced)
+        faiss.omp_set_num_threads(build_threads)
+        start = time.perf_counter()
+        index = create_index(index_config(args.index_type, **params), base)
+        build_seconds = time.perf_counter() - start
+
+        faiss.omp_set_num_threads(1)  # one request is served by one thread
+        recall, p50 = evaluate(index, searched, truth, args.k)
+        codes, total = bytes_per_vector(index)
+        print(f"{label:<30} {codes:>12.1f} {total:>12.1f} {build_seconds:>8.2f} {recall:>9.3f} {p50:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -12,14 +12,134 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
 # Model settings
 EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '0')) or None  # shorten text-embedding-3 vectors at the API (e.g. 256); None keeps 1536
 LLM_MODEL = "gpt-3.5-turbo"
 
+# Offline fake LLM (for local concurrency/latency testing without OpenAI calls)
+USE_FAKE_LLM = os.getenv('USE_FAKE_LLM', '0') == '1'
+FAKE_LLM_LATENCY = float(os.getenv('FAKE_LLM_LATENCY', '0.5'))  # seconds per simulated round trip
+
 # File paths
 RESTAURANTS_JSON_PATH = r"C:\Users\Rithwik Khera\OneDrive - iitr.ac.in\Desktop\assignment\zeal\100_restaurant_data.json"
 FAISS_INDEX_DIR = r"C:\Users\Rithwik Khera\OneDrive - iitr.ac.in\Desktop\assignment\zeal\restaurant_idx"
+INDEX_SYNC_ON_STARTUP = os.getenv('INDEX_SYNC_ON_STARTUP', '0') == '1'  # diff the catalog against the index manifest and embed only changes; with several workers, run `python -m zeal.backend.database.incremental_index` once per catalog change instead
+RESTAURANT_STORE_PATH = os.path.join(FAISS_INDEX_DIR, "restaurants.records")  # full records, read lazily by id
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.expanduser("~"), ".cache", "zeal"))  # SQLite databases shared by worker processes, outside the source tree
+FAISS_INDEX_MMAP = os.getenv('FAISS_INDEX_MMAP', '1') == '1'  # map the index read-only so workers share one copy of the vectors
+FAISS_DOCSTORE_CACHE_SIZE = 1024  # decoded documents kept per process in mapped mode
+RESTAURANT_RECORD_CACHE_SIZE = 256  # decoded records kept in memory per process
+
+# Index build settings (database/index_builder.py)
+EMBED_BATCH_MAX_TOKENS = 100000  # per embedding request; the API limit is 300k
+EMBED_BATCH_MAX_DOCS = 256
+EMBED_WORKERS = 4  # concurrent embedding requests
+EMBED_MAX_RETRIES = 5
+
+# Vector index type (database/ann_index.py), persisted with the index in index_config.json
+FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'flat')  # 'flat' (exact), 'ivf' or 'hnsw'; applies to new builds
+FAISS_INDEX_PARAMS = {
+    "ivf": {"nlist": 1024, "nprobe": 16},  # nlist is capped at ntotal / 39 for small catalogs
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+}
+FAISS_SEARCH_PARAMS = {}  # load-time overrides of the persisted search parameters (nprobe, ef_search, rerank_factor)
+FAISS_INDEX_COMPRESSION = {  # vector storage of new builds, for every index type
+    "pca_dimensions": None,  # project vectors to this many dimensions with a fitted PCA first
+    "storage": os.getenv('FAISS_INDEX_STORAGE', 'flat'),  # 'flat' (float32), 'fp16', 'sq8' (int8 scalar quantizer) or 'pq'
+    "pq_m": 64,  # PQ sub-quantizers of 8 bits, i.e. bytes per vector; must divide the dimensions
+    "rerank": False,  # keep the float32 vectors and re-rank rerank_factor * k candidates exactly
+    "rerank_factor": 4,
+}
+
+# Per-city index shards (database/sharded_index.py) searched by recommendations
+INDEX_SHARDING = os.getenv('INDEX_SHARDING', '1') == '1'
+INDEX_SHARD_METROS = {  # cities whose restaurants join a metro's shard
+    "brooklyn": "new york",
+    "queens": "new york",
+    "bronx": "new york",
+    "staten island": "new york",
+}
+INDEX_SHARD_MIN_RESTAURANTS = 20  # smaller cities share one shard per state
+INDEX_SHARD_MAX_RESIDENT = 8  # shards kept loaded per process (LRU)
+INDEX_SHARD_WORKERS = 4  # threads searching shards in parallel
+
+# Geospatial search over location_geom coordinates (database/geo_index.py)
+GEO_CELL_DEGREES = 0.01  # grid cell size, about 1.1 km of latitude
+GEO_NEAR_RADIUS_METERS = 1200  # "near X" without a distance: X's own extent, but at least this
+GEO_WALKING_METERS = 1000  # "walking distance"
+GEO_NEAREST_CANDIDATES = 20  # restaurants kept for "closest" queries and when nothing is inside the radius
+GEO_LANDMARKS = {}  # extra named places, name -> [latitude, longitude], on top of the dataset's neighborhoods and cities
 
 # Cache settings
-MAX_CACHE_ENTRIES = 100
+MAX_CACHE_ENTRIES = 100  # default entry budget for namespaces not listed below
+CACHE_SEGMENTS = 8  # lock stripes per namespace
+CACHE_NAMESPACES = {  # per-namespace LRU budgets; ttl in seconds (None = no expiry)
+    "analysis": {"max_entries": 1000, "max_bytes": 2 * 1024 * 1024, "ttl": 6 * 3600},
+    "recommendation": {"max_entries": 500, "max_bytes": 16 * 1024 * 1024, "ttl": 3600},
+    "info": {"max_entries": 500, "max_bytes": 16 * 1024 * 1024, "ttl": 3600},
+}
+
+# Persistent L2 cache shared by all worker processes on the host
+DISK_CACHE_ENABLED = os.getenv('DISK_CACHE_ENABLED', '1') == '1'
+DISK_CACHE_PATH = os.getenv('DISK_CACHE_PATH', os.path.join(CACHE_DIR, "query_cache.sqlite3"))
+DISK_CACHE_MAX_BYTES = 256 * 1024 * 1024  # sum of compressed value sizes
+DISK_CACHE_NAMESPACES = ("analysis", "recommendation", "info")
+DISK_CACHE_TOUCH_INTERVAL = 300  # seconds; a hit refreshes an entry's access time at most this often, so most reads write nothing
+
+# Prompt context settings: token budgets for the restaurant matches rendered into LLM prompts
+PROMPT_CONTEXT_TOKEN_BUDGETS = {
+    "recommendation": 600,
+    "info": 800,
+}
+
+# Prompt prefix caching: the provider only caches a prompt prefix of at least this many tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_TRACKED_SESSIONS = 10000  # sessions whose previous prompt is kept, per prompt, to measure the reused prefix
+
+# Query-embedding cache settings
+EMBEDDING_CACHE_MAX_ENTRIES = 10000  # ~60 MB of float32 vectors at 1536 dimensions
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH')  # optional .npy file to memory-map the vectors to
+
+# Conversation memory settings
+CONVERSATION_MAX_SESSIONS = 200000
+CONVERSATION_MAX_HISTORY = 15  # interactions kept per session
+CONVERSATION_SESSION_TTL = 24 * 3600  # seconds of inactivity before a session expires
+CONVERSATION_MAX_BYTES = 512 * 1024 * 1024
+CONVERSATION_LOCK_STRIPES = 16
+CONVERSATION_BACKEND = os.getenv('CONVERSATION_BACKEND', 'sqlite')  # 'sqlite' (durable, shared by workers) or 'memory'
+CONVERSATION_DB_PATH = os.getenv('CONVERSATION_DB_PATH', os.path.join(CACHE_DIR, "conversations.sqlite3"))
+CONVERSATION_WRITE_BATCH = 100  # interactions committed per transaction by the background writer
+CONVERSATION_FLUSH_INTERVAL = 0.05  # seconds the writer waits to fill a batch
+CONVERSATION_REVALIDATE_SECONDS = 5  # cached sessions are version-checked against the backend after this long, and reloaded only if other workers wrote to them
+
+# Conversation history windows sent to the LLM
+CONVERSATION_HISTORY_TOKEN_BUDGETS = {  # history tokens per prompt, including the rolling summary
+    "analysis": 400,
+    "response": 600,
+}
+CONVERSATION_SUMMARY_KEEP_TURNS = 4  # newest turns never folded into the rolling summary
+CONVERSATION_SUMMARY_BATCH = 4  # older turns folded per background summarization call
+CONVERSATION_SUMMARY_MAX_TOKENS = 200  # rolling summary cap; a window also caps it at half its budget
+CONVERSATION_COMPACT_RESPONSE_CHARS = 300  # bot responses without restaurants are cut to this length in history
+
+# Semantic (embedding-similarity) cache settings
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_MAX_ENTRIES = 1000  # per namespace
+SEMANTIC_CACHE_THRESHOLDS = {  # minimum cosine similarity for a hit, tuned with benchmarks/semantic_cache_eval.py
+    "analysis": 0.95,
+    "retrieval": 0.93,
+    "response": 0.97,
+}
+
+# Local intent classifier settings
+LOCAL_INTENT_MIN_CONFIDENCE = 0.9  # below this, the LLM query analyzer decides the intent
+
+# Restaurant name index settings
+NAME_MATCH_MIN_CONFIDENCE = 0.85  # below this, named lookups fall back to vector search
+
+# Startup warm-up settings
+WARMUP_ON_STARTUP = True
+WARMUP_QUERY = "Italian restaurants in New York"
+WARMUP_LLM_CALL = True  # sends a one-token request per LLM client to open the connection pool
 
 # Logger settings
 LOG_FILE = "restaurant_agent.log"
@@ -0,0 +1,256 @@
+"""
+Approximate nearest neighbour index types for the restaurant agent's FAISS index.
+
+An index is exact "flat" (brute force over every vector), "ivf" (inverted lists:
+vectors are bucketed by k-means centroid and only nprobe buckets are scanned) or
+"hnsw" (a navigable small-world graph explored with ef_search candidates). The
+type and its parameters are saved next to the index in index_config.json, so a
+loaded index is always searched the way it was built.
+
+Any type can store compressed vectors: projected to fewer dimensions by a fitted
+PCA, and/or encoded as fp16, int8 (sq8) or product-quantized codes (pq). With
+"rerank" the float32 vectors are kept as well and the top rerank_factor * k
+candidates of the compressed search are re-scored exactly; in mapped mode those
+vectors stay in the page cache and only the candidates' pages are touched.
+
+    python -m zeal.backend.benchmarks.ann_index_benchmark       # recall / latency per type
+    python -m zeal.backend.benchmarks.vector_compression_eval   # memory / recall per storage
+"""
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from zeal.backend.logger import logger
+from zeal.backend.config import FAISS_INDEX_TYPE, FAISS_INDEX_PARAMS, FAISS_INDEX_COMPRESSION
+
+INDEX_CONFIG_FILE = "index_config.json"
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+# index_factory codes of the vector storage options; "pq" becomes PQ{pq_m}
+STORAGE_CODES = {"flat": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": None}
+
+# k-means wants at least this many training points per IVF list
+IVF_MIN_POINTS_PER_LIST = 39
+IVF_MAX_TRAINING_POINTS_PER_LIST = 256
+# PCA and quantizer training sample; PQ's 256 centroids per sub-quantizer want 39 points each
+MAX_TRAINING_POINTS = 65536
+PQ_MIN_TRAINING_POINTS = 256 * 39
+
+def index_config(index_type: str = FAISS_INDEX_TYPE, **params) -> Dict[str, Any]:
+    """
+    Resolve an index type and parameter overrides against the configured defaults.
+
+    Args:
+        index_type: "flat", "ivf" or "hnsw"
+        **params: Overrides of FAISS_INDEX_PARAMS for the type or of FAISS_INDEX_COMPRESSION
+            (None values are ignored)
+
+    Returns:
+        The index configuration, e.g. {"type": "ivf", "nlist": 1024, "nprobe": 16, "storage": "sq8", ...}
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    config = {"type": index_type, **FAISS_INDEX_PARAMS.get(index_type, {}), **FAISS_INDEX_COMPRESSION}
+    config.update({name: value for name, value in params.items() if value is not None})
+    if config["storage"] not in STORAGE_CODES:
+        raise ValueError(f"Unknown vector storage {config['storage']!r}, expected one of {tuple(STORAGE_CODES)}")
+    return config
+
+def factory_string(config: Dict[str, Any]) -> str:
+    """
+    The faiss.index_factory description of a configuration, e.g. "PCA256,IVF1024,SQ8,RFlat".
+    Configurations saved before compression options existed are uncompressed.
+    """
+    storage = config.get("storage", "flat")
+    code = f"PQ{config['pq_m']}" if storage == "pq" else STORAGE_CODES[storage]
+    parts = [f"PCA{config['pca_dimensions']}"] if config.get("pca_dimensions") else []
+    if config["type"] == "flat":
+        parts.append(code)
+    elif config["type"] == "ivf":
+        parts += [f"IVF{config['nlist']}", code]
+    else:
+        parts.append(f"HNSW{config['M']}" + ("" if storage == "flat" else f"_{code}"))
+    if config.get("rerank"):
+        parts.append("RFlat")
+    return ",".join(parts)
+
+def _fit_config(config: Dict[str, Any], count: int, dim: int) -> None:
+    """Lower the parameters a small or low-dimensional set of vectors cannot support, in place."""
+    if config["type"] == "ivf":
+        nlist = max(1, min(config["nlist"], count // IVF_MIN_POINTS_PER_LIST))
+        if nlist != config["nlist"]:
+            logger.info(f"Lowering IVF nlist from {config['nlist']} to {nlist} for {count} vectors")
+            config["nlist"] = nlist
+    if config.get("pca_dimensions") and (config["pca_dimensions"] >= dim or count < config["pca_dimensions"]):
+        logger.info(f"Skipping PCA to {config['pca_dimensions']} dimensions for {count} x {dim} vectors")
+        config["pca_dimensions"] = None
+    if config.get("storage") == "pq":
+        if count < PQ_MIN_TRAINING_POINTS:
+            logger.info(f"Storing {count} vectors as sq8 instead of pq: PQ needs {PQ_MIN_TRAINING_POINTS} to train")
+            config["storage"] = "sq8"
+        elif (config.get("pca_dimensions") or dim) % config["pq_m"]:
+            raise ValueError(f"pq_m={config['pq_m']} does not divide {config.get('pca_dimensions') or dim} dimensions")
+
+def create_index(config: Dict[str, Any], vectors: np.ndarray) -> faiss.Index:
+    """
+    Build an index of the configured type and storage over a set of vectors. Trained
+    components (PCA, IVF centroids, quantizers) are fitted on a sample of the vectors.
+
+    Args:
+        config: Index configuration from index_config(); parameters the vectors cannot
+            support (an IVF nlist too large, PQ without enough training points) are
+            lowered in place, and the factory string is recorded under "factory"
+        vectors: (n, d) float32 array, added in row order
+
+    Returns:
+        The FAISS index, with its search parameters applied
+    """
+    count, dim = vectors.shape
+    _fit_config(config, count, dim)
+    config["factory"] = factory_string(config)
+    index = faiss.index_factory(dim, config["factory"])
+    if config["type"] == "hnsw":
+        faiss.downcast_index(_base_index(index)).hnsw.efConstruction = config["ef_construction"]
+    if not index.is_trained and count:
+        limit = max(MAX_TRAINING_POINTS, config.get("nlist", 0) * IVF_MAX_TRAINING_POINTS_PER_LIST)
+        training = vectors
+        if count > limit:
+            training = vectors[np.sort(np.random.default_rng(0).choice(count, limit, replace=False))]
+        index.train(training)
+    if config["type"] == "ivf":
+        # Hashtable direct map: id -> list entry, needed to reconstruct and remove vectors
+        faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+    if count:
+        index.add(vectors)
+    apply_search_params(index, config)
+    return index
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """The index under a re-ranking and/or PCA wrapper."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.base_index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def apply_search_params(index: faiss.Index, config: Dict[str, Any]) -> None:
+    """Set the query-time parameters (IVF nprobe, HNSW efSearch, re-ranking factor) of an index."""
+    base = _base_index(index)
+    if config["type"] == "ivf":
+        base.nprobe = min(config["nprobe"], base.nlist)
+    elif config["type"] == "hnsw":
+        base.hnsw.efSearch = config["ef_search"]
+    if config.get("rerank"):
+        faiss.downcast_index(index).k_factor = config["rerank_factor"]
+
+def search_parameters(index: faiss.Index, selector) -> faiss.SearchParameters:
+    """
+    Search parameters that restrict a search to a selector, of the subclass the index
+    type requires and carrying its current nprobe / efSearch / re-ranking factor.
+    """
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        params = faiss.IndexRefineSearchParameters(k_factor=index.k_factor, base_index_params=params, sel=selector)
+    return params
+
+def index_vectors(index: faiss.Index) -> np.ndarray:
+    """All vectors of an index in row order, decoded (so approximate) for compressed storage without re-ranking."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def convert_index(vector_store: FAISS, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace a vector store's index with one of the configured type and storage over
+    the same vectors, keeping row positions (and so the docstore mapping) unchanged.
+
+    Args:
+        vector_store: The FAISS vector store (modified in place)
+        config: Index configuration from index_config()
+
+    Returns:
+        The effective configuration, to be saved with the index
+    """
+    config = dict(config)
+    if factory_string(config) != "Flat" or not isinstance(vector_store.index, faiss.IndexFlat):
+        logger.info(f"Building {factory_string(config)} index over {vector_store.index.ntotal} vectors")
+        vector_store.index = create_index(config, index_vectors(vector_store.index))
+    return config
+
+def remove_documents(vector_store: FAISS, docstore_ids: Iterable[str], config: Dict[str, Any]) -> None:
+    """
+    Delete documents and their vectors. LangChain's delete relies on remove_ids
+    renumbering the remaining rows, which only unwrapped flat storage does: IVF and
+    PCA / re-ranking indexes are refilled with the remaining vectors (keeping their
+    trained centroids, projection and quantizers) and an HNSW graph, which cannot
+    drop nodes, is rebuilt.
+
+    Args:
+        vector_store: The FAISS vector store (modified in place)
+        docstore_ids: Docstore ids to delete
+        config: The index configuration
+    """
+    docstore_ids = set(docstore_ids)
+    if config["type"] == "flat" and isinstance(faiss.downcast_index(vector_store.index), faiss.IndexFlatCodes):
+        vector_store.delete(list(docstore_ids))
+        return
+    keep = [position for position, docstore_id in sorted(vector_store.index_to_docstore_id.items()) if docstore_id not in docstore_ids]
+    vectors = index_vectors(vector_store.index)[keep]
+    vector_store.docstore.delete(list(docstore_ids))
+    vector_store.index_to_docstore_id = {new: vector_store.index_to_docstore_id[old] for new, old in enumerate(keep)}
+    if config["type"] == "hnsw":
+        vector_store.index = create_index(dict(config), vectors)
+    else:
+        vector_store.index.reset()
+        vector_store.index.add(vectors)
+    logger.info(f"Rebuilt {config['type']} index without {len(docstore_ids)} documents")
+
+def save_index_config(index_dir: str, config: Dict[str, Any]) -> None:
+    """Atomically write the index configuration next to an index."""
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, INDEX_CONFIG_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(config, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+def load_index_config(index_dir: str) -> Dict[str, Any]:
+    """
+    Read the configuration an index was built with.
+
+    Args:
+        index_dir: The FAISS index directory
+
+    Returns:
+        The configuration; indexes saved before index types existed are flat
+    """
+    path = os.path.join(index_dir, INDEX_CONFIG_FILE)
+    if not os.path.exists(path):
+        return {"type": "flat"}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def configure_loaded_index(vector_store: FAISS, index_dir: str, search_params: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Apply the persisted search parameters, plus any overrides, to a loaded index.
+
+    Args:
+        vector_store: The loaded FAISS vector store
+        index_dir: The FAISS index directory
+        search_params: Overrides such as {"nprobe": 32}, {"ef_search": 128} or {"rerank_factor": 8}
+    """
+    config = {**load_index_config(index_dir), **(search_params or {})}
+    if config["type"] != FAISS_INDEX_TYPE:
+        logger.warning(f"Index in {index_dir} is {config['type']} but FAISS_INDEX_TYPE is {FAISS_INDEX_TYPE}; "
+                       f"rebuild it with the index builder to switch")
+    apply_search_params(vector_store.index, config)
+    logger.info(f"Serving {config['type']} index: {config}")
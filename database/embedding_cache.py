@@ -0,0 +1,274 @@
+"""
+Query-embedding cache for the restaurant agent.
+
+CachedEmbeddings wraps the OpenAI embedding client so repeated query texts are
+embedded once. Vectors live in a preallocated float32 matrix used as a ring buffer;
+optionally the matrix is a memory-mapped .npy file, so it survives restarts without
+holding every vector on the Python heap.
+
+A spilled store can be opened by every worker process on the host. Writers take a
+file lock and advance a slot counter kept in the file, and each slot records a digest
+of the key it holds, so a process never serves a vector that another process has
+since written over its slot.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from zeal.backend.logger import logger
+from zeal.backend.database.file_lock import file_lock
+
+def normalize_query_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different spellings of a query share an entry."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def key_digest(key: str) -> int:
+    """Non-zero 63-bit digest of a cache key; 0 marks an empty or half-written slot."""
+    digest = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") >> 1
+    return digest or 1
+
+class EmbeddingStore:
+    """
+    A fixed-capacity store of float32 vectors keyed by string. The oldest entry is
+    overwritten once full. With a path, vectors are kept in a memory-mapped .npy file,
+    the per-slot key digests and the next slot in path + ".slots.npy", and keys in a
+    sidecar log that is compacted every time the ring wraps around; all are reloaded
+    on startup.
+    """
+    def __init__(self, max_entries: int, path: Optional[str] = None):
+        """
+        Initialize the store.
+        
+        Args:
+            max_entries: Number of vectors kept
+            path: Optional .npy file to spill vectors to (keys go to path + ".keys")
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.vectors = None  # allocated on first insert, when the dimension is known
+        self.digests = None  # with a path: int64 digest per slot, then the next slot
+        self.slot_keys = [None] * max_entries
+        self.slots = {}  # key -> slot
+        self.next_slot = 0
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> bool:
+        """
+        Map a spilled store written by this or another process. Keys are replayed
+        from the log and kept only if their slot still holds them.
+        
+        Returns:
+            True if the store was mapped
+        """
+        try:
+            vectors = np.load(self.path, mmap_mode="r+")
+            digests = np.load(self.path + ".slots.npy", mmap_mode="r+")
+            if vectors.shape[0] != self.max_entries or digests.shape[0] != self.max_entries + 1:
+                logger.warning(f"Ignoring embedding cache at {self.path}: capacity changed")
+                return False
+            slot_keys = [None] * self.max_entries
+            slots = {}
+            if os.path.exists(self.path + ".keys"):
+                with open(self.path + ".keys", "r", encoding="utf-8") as file:
+                    for line in file:
+                        slot, key = json.loads(line)
+                        slot_keys[slot] = key
+            for slot, key in enumerate(slot_keys):
+                if key is not None and digests[slot] == key_digest(key):
+                    slots[key] = slot
+                else:
+                    slot_keys[slot] = None
+            self.vectors, self.digests, self.slot_keys, self.slots = vectors, digests, slot_keys, slots
+            logger.info(f"Loaded {len(self.slots)} cached embeddings from {self.path}")
+            return True
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load embedding cache from {self.path}: {e}")
+            return False
+
+    def _allocate(self, dimension: int) -> None:
+        """
+        Create the vector matrix. With a path, map the store another process created,
+        or write new files next to their final names and rename them into place, so
+        processes mapping an older store keep their copy. Called with the file lock held.
+        """
+        if not self.path:
+            self.vectors = np.zeros((self.max_entries, dimension), dtype=np.float32)
+            return
+        if os.path.exists(self.path) and self._load() and self.vectors.shape[1] == dimension:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        for path, dtype, shape in ((self.path + ".slots.npy", np.int64, (self.max_entries + 1,)),
+                                   (self.path, np.float32, (self.max_entries, dimension))):
+            np.lib.format.open_memmap(path + ".tmp.npy", mode="w+", dtype=dtype, shape=shape).flush()
+            os.replace(path + ".tmp.npy", path)
+        open(self.path + ".keys", "w", encoding="utf-8").close()
+        self._load()
+
+    def _compact_log(self) -> None:
+        """Rewrite the key log with one line per slot still holding its key. Called with the file lock held."""
+        log_path = self.path + ".keys"
+        slot_keys = {}
+        with open(log_path, "r", encoding="utf-8") as file:
+            for line in file:
+                slot, key = json.loads(line)
+                slot_keys[slot] = key
+        with open(log_path + ".tmp", "w", encoding="utf-8") as file:
+            for slot, key in sorted(slot_keys.items()):
+                if self.digests[slot] == key_digest(key):
+                    file.write(json.dumps([slot, key]) + "\n")
+        os.replace(log_path + ".tmp", log_path)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the vector stored for key, or None."""
+        with self.lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                return None
+            if self.digests is None:
+                return self.vectors[slot].tolist()
+            # Another process may have written over the slot, or be writing it now
+            digest = key_digest(key)
+            if self.digests[slot] == digest:
+                vector = self.vectors[slot].tolist()
+                if self.digests[slot] == digest:
+                    return vector
+            del self.slots[key]
+            return None
+
+    def set(self, key: str, vector: List[float]) -> None:
+        """Store a vector, overwriting the oldest slot when full."""
+        with self.lock:
+            if key in self.slots and (self.digests is None or self.digests[self.slots[key]] == key_digest(key)):
+                return
+            if not self.path:
+                self._set(key, vector)
+                return
+            with file_lock(self.path + ".lock"):
+                self._set(key, vector)
+
+    def _set(self, key: str, vector: List[float]) -> None:
+        """Write a vector into the next slot; with a path, called with the file lock held."""
+        if self.vectors is None:
+            self._allocate(len(vector))
+        if len(vector) != self.vectors.shape[1]:
+            logger.warning(f"Not caching embedding of dimension {len(vector)} (store holds {self.vectors.shape[1]})")
+            return
+        
+        slot = int(self.digests[-1]) if self.digests is not None else self.next_slot
+        previous = self.slot_keys[slot]
+        if previous is not None and self.slots.get(previous) == slot:
+            del self.slots[previous]
+        if self.digests is not None:
+            # Readers in other processes check the digest before and after copying the vector
+            self.digests[slot] = 0
+            self.vectors[slot] = vector
+            self.digests[slot] = key_digest(key)
+        else:
+            self.vectors[slot] = vector
+        self.slot_keys[slot] = key
+        self.slots[key] = slot
+        self.next_slot = (slot + 1) % self.max_entries
+        
+        if self.path:
+            self.digests[-1] = self.next_slot
+            # Opened per write: another process may have replaced the log while compacting it
+            with open(self.path + ".keys", "a", encoding="utf-8") as file:
+                file.write(json.dumps([slot, key]) + "\n")
+            if self.next_slot == 0:
+                self._compact_log()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+class CachedEmbeddings(Embeddings):
+    """
+    An Embeddings implementation that answers embed_query from an EmbeddingStore and
+    only calls the wrapped model on a miss. Keys combine the model name and the
+    normalized text. Document embedding (index builds) is passed through uncached.
+    """
+    def __init__(self, embeddings: Embeddings, model: str, max_entries: int, path: Optional[str] = None):
+        """
+        Wrap an embedding model.
+        
+        Args:
+            embeddings: The underlying embedding model
+            model: Model name, part of every cache key
+            max_entries: Number of query vectors kept
+            path: Optional .npy file to spill vectors to
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.store = EmbeddingStore(max_entries, path)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        """Cache key for a query text."""
+        return f"{self.model}\x1f{normalize_query_text(text)}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents with the wrapped model."""
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async version of embed_documents."""
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query, reusing the cached vector for the same model and normalized text.
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            The query embedding
+        """
+        key = self._key(text)
+        vector = self.store.get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self.store.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """
+        Async version of embed_query.
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            The query embedding
+        """
+        key = self._key(text)
+        vector = self.store.get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+        self.misses += 1
+        vector = await self.embeddings.aembed_query(text)
+        self.store.set(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count, hits, misses and hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "entries": len(self.store),
+            "max_entries": self.store.max_entries,
+            "spill_path": self.store.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
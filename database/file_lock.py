@@ -0,0 +1,45 @@
+"""
+Cross-process file locks for the restaurant agent.
+
+Index directories and the embedding cache file are shared by every worker process
+on the host; writers serialize on an exclusive lock of a small lock file next to them.
+"""
+import os
+import time
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Hold an exclusive lock on a lock file for the duration of the block, waiting for
+    other processes to release it. Locks belong to the open file, so nesting two
+    file_lock blocks on the same path in one process deadlocks.
+
+    Args:
+        path: Lock file (created if missing, never removed)
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+b") as file:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds; holders can take longer
+                    time.sleep(1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,275 @@
+"""
+Gazetteer-based local entity extraction for the restaurant agent.
+
+The cuisines, tags, popular dishes, cities, neighborhoods and payment options in the
+restaurant data form a closed vocabulary. A word-level Aho-Corasick automaton over that
+vocabulary (plus synonyms) fills user_preferences in one pass over the message, with
+edit-distance spelling correction for unknown words. The vocabulary is rebuilt whenever
+the restaurant data file changes.
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Tuple
+from zeal.backend.logger import logger
+from zeal.backend.config import RESTAURANTS_JSON_PATH
+from zeal.backend.database.restaurant_loader import iter_restaurants, LOCATION_ALIASES, PRICE_ALIASES
+from zeal.backend.database.text_utils import normalize_term, edit_distance
+
+# Alternative spellings and words users type -> canonical vocabulary terms
+SYNONYMS = {
+    "veggie": "vegetarian",
+    "plant based": "vegan",
+    "bbq": "barbecue",
+    "barbeque": "barbecue",
+    "sushi bar": "sushi",
+    "dimsum": "dim sum",
+    "patio": "outdoor seating",
+    "outdoor dining": "outdoor seating",
+    "outside": "outdoor seating",
+    "credit card": "credit cards",
+    "gluten free": "gluten-free",
+    **LOCATION_ALIASES,
+}
+
+# Words that carry no preference information once entities are removed
+STOPWORDS = {
+    "a", "an", "the", "in", "at", "on", "for", "with", "and", "or", "of", "to", "me", "my", "i", "im", "we",
+    "us", "some", "any", "please", "can", "could", "you", "would", "like", "want", "need", "get", "find",
+    "show", "recommend", "suggest", "suggestions", "looking", "look", "where", "what", "which", "is", "are",
+    "good", "great", "best", "nice", "top", "rated", "place", "places", "spot", "spots", "restaurant",
+    "restaurants", "food", "eat", "eats", "dinner", "lunch", "breakfast", "brunch", "tonight", "today",
+    "near", "around", "options", "serve", "serves", "serving", "also", "really", "very", "somewhere",
+    "something", "joint", "joints", "price", "priced", "range", "that", "take", "takes", "accept",
+    "accepts", "has", "have", "offer", "offers",
+}
+
+# Words that refer back to earlier turns; their presence needs the LLM and the conversation history
+ANAPHORA = {"there", "it", "those", "these", "them", "they", "above", "same", "similar", "first", "second", "third", "one", "ones", "else", "another", "more", "other"}
+
+FIELD_LOCATION = "location"
+
+class Gazetteer:
+    """Word-level Aho-Corasick automaton mapping vocabulary phrases to preference fields."""
+    def __init__(self):
+        """Initialize an empty automaton."""
+        self.goto = [{}]      # state -> {token: next_state}
+        self.fail = [0]
+        self.outputs = [[]]   # state -> [(phrase_length, field, canonical_value)]
+        self.tokens_by_length = {}  # token length -> set of vocabulary tokens, for spelling correction
+        self.vocabulary_tokens = set()
+        self.phrase_count = 0
+
+    def add_phrase(self, phrase: str, field: str, value: str) -> None:
+        """
+        Add a phrase to the automaton. Call build() after the last phrase.
+
+        Args:
+            phrase: Text to match (normalized internally)
+            field: user_preferences field the phrase fills
+            value: Canonical value to store for that field
+        """
+        tokens = normalize_term(phrase).split()
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            if token not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.goto[state][token] = len(self.goto) - 1
+            state = self.goto[state][token]
+            self.vocabulary_tokens.add(token)
+            self.tokens_by_length.setdefault(len(token), set()).add(token)
+        if (len(tokens), field, value) not in self.outputs[state]:
+            self.outputs[state].append((len(tokens), field, value))
+            self.phrase_count += 1
+
+    def build(self) -> "Gazetteer":
+        """Compute failure links (breadth-first), completing the automaton."""
+        queue = deque()
+        for state in self.goto[0].values():
+            self.fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for token, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(token, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+        return self
+
+    def correct_spelling(self, token: str) -> str:
+        """
+        Replace an unknown token with the closest vocabulary token, if one is close enough.
+
+        Args:
+            token: A normalized word from the message
+
+        Returns:
+            The corrected token, or the token unchanged
+        """
+        if token in self.vocabulary_tokens or len(token) < 5 or not token.isalpha():
+            return token
+        max_distance = 1 if len(token) < 8 else 2
+        best, best_distance = token, max_distance + 1
+        for length in range(len(token) - max_distance, len(token) + max_distance + 1):
+            for candidate in self.tokens_by_length.get(length, ()):
+                distance = edit_distance(token, candidate, max_distance)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def find(self, tokens: List[str]) -> List[Tuple[int, int, str, str]]:
+        """
+        Find the leftmost-longest, non-overlapping vocabulary matches.
+
+        Args:
+            tokens: Normalized message tokens
+
+        Returns:
+            List of (start, end, field, value) with end exclusive
+        """
+        matches = []
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+            for length, field, value in self.outputs[state]:
+                matches.append((position - length + 1, position + 1, field, value))
+
+        # Prefer longer phrases ("dim sum" over "sum"), then earlier ones
+        matches.sort(key=lambda match: (-(match[1] - match[0]), match[0]))
+        taken = set()
+        selected = []
+        for start, end, field, value in matches:
+            span = set(range(start, end))
+            if span & taken:
+                continue
+            taken |= span
+            selected.append((start, end, field, value))
+        return sorted(selected)
+
+    def extract(self, message: str) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Extract user preferences from a message in one pass.
+
+        Args:
+            message: The user message
+
+        Returns:
+            Tuple of (preferences, leftovers). preferences uses the user_preferences keys;
+            leftovers are the meaningful words that matched nothing, which the LLM should resolve.
+        """
+        raw_tokens = normalize_term(message.replace("'", "")).split()
+        tokens = [self.correct_spelling(token) for token in raw_tokens]
+
+        preferences = {"cuisine_type": [], "food_type": [], "location": "", "price": "", "special_features": []}
+        consumed = set()
+        locations = []
+        for start, end, field, value in self.find(tokens):
+            consumed.update(range(start, end))
+            if field == FIELD_LOCATION:
+                if value not in locations:
+                    locations.append(value)
+            elif field == "price":
+                preferences["price"] = value
+            elif value not in preferences[field]:
+                preferences[field].append(value)
+        preferences["location"] = ", ".join(locations)
+
+        leftovers = [
+            token for position, token in enumerate(raw_tokens)
+            if position not in consumed and (token not in STOPWORDS or token in ANAPHORA)
+        ]
+        return preferences, leftovers
+
+def build_gazetteer(restaurants) -> Gazetteer:
+    """
+    Build the gazetteer from the restaurant data's closed vocabulary.
+
+    Args:
+        restaurants: Iterable of restaurant dictionaries
+
+    Returns:
+        The built Gazetteer
+    """
+    gazetteer = Gazetteer()
+    cuisines = set()
+    canonical = {}  # normalized phrase -> (field, display value), so synonyms can point at real terms
+
+    def add(phrase, field, value):
+        gazetteer.add_phrase(phrase, field, value)
+        canonical.setdefault(normalize_term(phrase), (field, value))
+
+    # Phrases other than cuisines are added after the whole catalog has been seen, in first-seen
+    # order, because tags are classified by whether they are also cuisines. Deduplicating them
+    # keeps memory bounded by the vocabulary, so the catalog itself can be streamed in one pass.
+    deferred = {}
+    restaurant_count = 0
+    for restaurant in restaurants:
+        restaurant_count += 1
+        for cuisine in restaurant.get("cuisines") or []:
+            cuisines.add(normalize_term(cuisine))
+            add(cuisine, "cuisine_type", cuisine)
+        for tag in restaurant.get("tags") or []:
+            deferred.setdefault((tag, None, tag), None)
+        for payment_option in restaurant.get("payment_options") or []:
+            deferred.setdefault((payment_option, "special_features", payment_option), None)
+        for dish in restaurant.get("popular_dishes") or []:
+            deferred.setdefault((dish, "food_type", dish), None)
+            head_noun = normalize_term(dish).split()[-1:] or [""]
+            if len(head_noun[0]) >= 4 and head_noun[0] not in STOPWORDS:
+                deferred.setdefault((head_noun[0], "food_type", head_noun[0]), None)
+        for field in ("city", "neighborhood", "state"):
+            if restaurant.get(field):
+                deferred.setdefault((restaurant[field], FIELD_LOCATION, restaurant[field]), None)
+
+    for phrase, field, value in deferred:
+        if field is None:
+            # Tags that are also cuisines count as cuisines; the rest describe features
+            field = "cuisine_type" if normalize_term(phrase) in cuisines else "special_features"
+        add(phrase, field, value)
+
+    for word, target in SYNONYMS.items():
+        if normalize_term(target) in canonical:
+            field, value = canonical[normalize_term(target)]
+            gazetteer.add_phrase(word, field, value)
+    for word, level in PRICE_ALIASES.items():
+        gazetteer.add_phrase(word, "price", "$" * level)
+
+    gazetteer.build()
+    logger.info(f"Built gazetteer with {gazetteer.phrase_count} phrases from {restaurant_count} restaurants")
+    return gazetteer
+
+_GAZETTEER_CACHE = {"path": None, "mtime": None, "gazetteer": None}
+_GAZETTEER_LOCK = threading.Lock()
+
+def get_gazetteer(json_file_path: str = RESTAURANTS_JSON_PATH) -> Gazetteer:
+    """
+    Get the process-wide gazetteer, rebuilding it when the restaurant data file changes.
+
+    Args:
+        json_file_path: Path to the JSON file containing restaurant data
+
+    Returns:
+        The current Gazetteer
+    """
+    try:
+        mtime = os.path.getmtime(json_file_path)
+    except OSError:
+        mtime = None
+
+    with _GAZETTEER_LOCK:
+        if (_GAZETTEER_CACHE["gazetteer"] is None or _GAZETTEER_CACHE["path"] != json_file_path
+                or _GAZETTEER_CACHE["mtime"] != mtime):
+            if _GAZETTEER_CACHE["gazetteer"] is not None:
+                logger.info("Restaurant data changed, rebuilding gazetteer")
+            _GAZETTEER_CACHE.update(path=json_file_path, mtime=mtime,
+                                    gazetteer=build_gazetteer(iter_restaurants(json_file_path)))
+        return _GAZETTEER_CACHE["gazetteer"]
@@ -0,0 +1,369 @@
+"""
+Geospatial index over restaurant coordinates for the restaurant agent.
+
+Restaurants are bucketed into a uniform latitude/longitude grid built from the
+location_geom points of the catalog (GeoJSON order: [longitude, latitude]). A radius
+query reads only the cells overlapping the circle and computes exact haversine
+distances for those rows in one vectorized NumPy pass.
+
+Place names are resolved through a centroid table derived from the data: every
+neighborhood and city gets the mean position of its restaurants and an extent
+(90th percentile distance from that centre), plus any GEO_LANDMARKS. Proximity
+phrases such as "near Union Square", "within 1 mile of SoHo" or "closest to
+Back Bay" become a centre and a radius, so proximity is answered exactly rather
+than through the embedding of the address text.
+"""
+import math
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from zeal.backend.logger import logger
+from zeal.backend.config import (
+    RESTAURANTS_JSON_PATH, GEO_CELL_DEGREES, GEO_NEAR_RADIUS_METERS, GEO_WALKING_METERS,
+    GEO_NEAREST_CANDIDATES, GEO_LANDMARKS
+)
+from zeal.backend.database.restaurant_loader import iter_restaurants, LOCATION_ALIASES
+from zeal.backend.database.text_utils import normalize_term
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_MILE = 1609.344
+
+# Distance units users type -> meters
+UNIT_METERS = {
+    "mile": METERS_PER_MILE, "miles": METERS_PER_MILE, "mi": METERS_PER_MILE,
+    "kilometer": 1000, "kilometers": 1000, "kilometre": 1000, "kilometres": 1000, "km": 1000,
+    "meter": 1, "meters": 1, "metre": 1, "metres": 1, "m": 1,
+    "block": 80, "blocks": 80,
+    "minute": 80, "minutes": 80, "min": 80, "mins": 80,  # walking
+}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "half a": 0.5, "half": 0.5, "two": 2, "three": 3, "five": 5, "ten": 10}
+
+RADIUS_PATTERN = re.compile(
+    r"\b(?:within|under|less than|no more than|at most|inside)\s+"
+    r"(\d+(?:\.\d+)?|half a|half|an|a|one|two|three|five|ten)\s*"
+    r"(miles?|mi|kilomet(?:er|re)s?|km|met(?:er|re)s?|m|blocks?|minutes?|mins?|min)\b"
+)
+# "10 minute walk", "5 blocks away"
+WALK_PATTERN = re.compile(
+    r"\b(\d+(?:\.\d+)?|a|one|two|three|five|ten)[\s-]*(minutes?|mins?|min|blocks?)\s+(?:walk|away)\b"
+)
+WALKING_PATTERN = re.compile(r"\bwalking distance\b|\bwalkable\b|\bwalk from\b")
+NEAREST_PATTERN = re.compile(r"\b(?:closest|nearest)\b")
+# Only a proximity request when a place follows: "around 8pm in soho" is not
+NEAR_PATTERN = re.compile(r"\b(?:near|close to|around|next to|steps from)\b")
+NEARBY_PATTERN = re.compile(r"\bnearby\b")
+
+def haversine_meters(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances from one point to arrays of points.
+
+    Args:
+        lat: Latitude of the point, in degrees
+        lon: Longitude of the point, in degrees
+        lats: Latitudes in radians
+        lons: Longitudes in radians
+
+    Returns:
+        Distances in meters
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def format_distance(meters: float) -> str:
+    """Short human distance, e.g. "0.3 mi"."""
+    miles = meters / METERS_PER_MILE
+    return "<0.1 mi" if miles < 0.1 else f"{miles:.1f} mi"
+
+def _coordinates(restaurant: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) of a restaurant's GeoJSON point, or None if missing or invalid."""
+    try:
+        lon, lat = (restaurant.get("location_geom") or {}).get("coordinates")[:2]
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+class GeoIndex:
+    """Grid-bucketed restaurant coordinates with a place-name centroid table."""
+    def __init__(self, cell_degrees: float = GEO_CELL_DEGREES):
+        """
+        Initialize an empty index. Call add() for each restaurant, then build().
+
+        Args:
+            cell_degrees: Grid cell size in degrees of latitude and longitude
+        """
+        self.cell_degrees = cell_degrees
+        self.ids = []
+        self.id_array = None  # ids as a NumPy object array, for vectorized selection
+        self.points = []  # (latitude, longitude) in degrees, parallel to ids
+        self.place_rows = {}  # (normalized name, normalized city) -> restaurant rows
+        self.places = {}  # normalized name -> list of place dicts, largest first
+        self.lats = self.lons = None
+        self.rows_by_id = {}
+        self.cells = {}  # (lat cell, lon cell) -> (start, end) in cell_rows
+        self.cell_rows = None
+
+    def add(self, restaurant: Dict[str, Any]) -> None:
+        """
+        Add one restaurant, if it has an id and valid coordinates.
+
+        Args:
+            restaurant: Restaurant dictionary as loaded from the JSON file
+        """
+        point = _coordinates(restaurant)
+        if not restaurant.get("id") or point is None:
+            return
+        row = len(self.ids)
+        self.ids.append(restaurant["id"])
+        self.points.append(point)
+        city = normalize_term(restaurant.get("city") or "")
+        for field in ("neighborhood", "city"):
+            name = normalize_term(restaurant.get(field) or "")
+            if name:
+                self.place_rows.setdefault((name, city), []).append(row)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Grid cell of a point."""
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def build(self) -> "GeoIndex":
+        """Freeze the coordinates into arrays, bucket them into grid cells and compute place centroids."""
+        points = np.array(self.points, dtype=np.float64).reshape(-1, 2)
+        self.lats, self.lons = np.radians(points[:, 0]), np.radians(points[:, 1])
+        self.rows_by_id = {restaurant_id: row for row, restaurant_id in enumerate(self.ids)}
+        self.id_array = np.array(self.ids, dtype=object)
+
+        cells = np.floor(points / self.cell_degrees).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        self.cell_rows = order
+        sorted_cells = cells[order]
+        if len(order):
+            boundaries = np.flatnonzero(np.any(np.diff(sorted_cells, axis=0) != 0, axis=1)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(order)]))
+            self.cells = {(int(sorted_cells[start, 0]), int(sorted_cells[start, 1])): (int(start), int(end))
+                          for start, end in zip(starts, ends)}
+
+        for (name, city), rows in self.place_rows.items():
+            lat, lon = points[rows].mean(axis=0)
+            extent = float(np.percentile(haversine_meters(lat, lon, self.lats[rows], self.lons[rows]), 90))
+            self.places.setdefault(name, []).append(
+                {"name": name, "city": city, "lat": float(lat), "lon": float(lon), "extent": extent, "count": len(rows)})
+        for name, (lat, lon) in GEO_LANDMARKS.items():
+            self.places.setdefault(normalize_term(name), []).append(
+                {"name": normalize_term(name), "city": "", "lat": lat, "lon": lon, "extent": 0.0, "count": 0})
+        for candidates in self.places.values():
+            candidates.sort(key=lambda place: -place["count"])
+        self.points = []
+        self.place_rows = {}
+        return self
+
+    def _rows_near(self, lat: float, lon: float, radius: float) -> np.ndarray:
+        """Rows in the grid cells overlapping a circle (a superset of the rows inside it)."""
+        lat_span = math.degrees(radius / EARTH_RADIUS_METERS)
+        lon_span = lat_span / max(math.cos(math.radians(min(abs(lat) + lat_span, 89.9))), 1e-6)
+        if lon_span >= 180:
+            lon_ranges = [(-180.0, 180.0)]
+        elif lon - lon_span < -180:  # the circle crosses the antimeridian
+            lon_ranges = [(-180.0, lon + lon_span), (lon - lon_span + 360, 180.0)]
+        elif lon + lon_span > 180:
+            lon_ranges = [(lon - lon_span, 180.0), (-180.0, lon + lon_span - 360)]
+        else:
+            lon_ranges = [(lon - lon_span, lon + lon_span)]
+        low_lat, high_lat = self._cell(lat - lat_span, 0)[0], self._cell(lat + lat_span, 0)[0]
+        lon_cells = [range(self._cell(0, low)[1], self._cell(0, high)[1] + 1) for low, high in lon_ranges]
+        if (high_lat - low_lat + 1) * sum(len(cells) for cells in lon_cells) > len(self.cells):
+            return np.arange(len(self.ids))  # the circle spans more cells than are occupied
+        slices = [self.cells[(cell_lat, cell_lon)] for cell_lat in range(low_lat, high_lat + 1)
+                  for cells in lon_cells for cell_lon in cells if (cell_lat, cell_lon) in self.cells]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.cell_rows[start:end] for start, end in slices])
+
+    def within(self, lat: float, lon: float, radius: float) -> List[Tuple[str, float]]:
+        """
+        Restaurants within a radius of a point.
+
+        Args:
+            lat: Latitude in degrees
+            lon: Longitude in degrees
+            radius: Radius in meters
+
+        Returns:
+            (restaurant id, distance in meters) pairs, nearest first
+        """
+        rows = self._rows_near(lat, lon, radius)
+        distances = haversine_meters(lat, lon, self.lats[rows], self.lons[rows])
+        inside = distances <= radius
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(self.id_array[rows[order]].tolist(), distances[order].tolist()))
+
+    def nearest(self, lat: float, lon: float, k: int, restaurant_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        The k restaurants nearest to a point, optionally among a set of restaurants.
+
+        Args:
+            lat: Latitude in degrees
+            lon: Longitude in degrees
+            k: Number of restaurants
+            restaurant_ids: Restaurants to choose from (None means all)
+
+        Returns:
+            (restaurant id, distance in meters) pairs, nearest first
+        """
+        if restaurant_ids is None:
+            rows = np.arange(len(self.ids))
+        else:
+            rows = np.array([self.rows_by_id[restaurant_id] for restaurant_id in restaurant_ids
+                             if restaurant_id in self.rows_by_id], dtype=np.int64)
+        distances = haversine_meters(lat, lon, self.lats[rows], self.lons[rows])
+        if len(rows) > k:
+            top = np.argpartition(distances, k)[:k]
+            rows, distances = rows[top], distances[top]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(self.id_array[rows[order]].tolist(), distances[order].tolist()))
+
+    def distances(self, lat: float, lon: float, restaurant_ids: Iterable[str]) -> Dict[str, float]:
+        """Distances in meters from a point to the given restaurants (those with coordinates)."""
+        restaurant_ids = [restaurant_id for restaurant_id in restaurant_ids if restaurant_id in self.rows_by_id]
+        rows = np.array([self.rows_by_id[restaurant_id] for restaurant_id in restaurant_ids], dtype=np.int64)
+        return dict(zip(restaurant_ids, haversine_meters(lat, lon, self.lats[rows], self.lons[rows]).tolist()))
+
+    def resolve_place(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the longest known place name mentioned in a text. A name shared by several
+        cities ("downtown") resolves to the one whose city is also mentioned, otherwise
+        to the one with the most restaurants.
+
+        Args:
+            text: User text
+
+        Returns:
+            The place dict (name, city, lat, lon, extent, count), or None
+        """
+        tokens = [LOCATION_ALIASES.get(token, token) for token in normalize_term(text).split()]
+        for length in range(min(len(tokens), 6), 0, -1):
+            for start in range(len(tokens) - length + 1):
+                candidates = self.places.get(" ".join(tokens[start:start + length]))
+                if candidates:
+                    return self._choose_place(candidates, tokens)
+        return None
+
+    def _choose_place(self, candidates: List[Dict[str, Any]], tokens: List[str]) -> Dict[str, Any]:
+        """Among the places sharing a name, the one whose city is also mentioned, else the largest."""
+        padded = f" {' '.join(tokens)} "
+        return next((place for place in candidates if place["city"] and f" {place['city']} " in padded
+                     and place["city"] != place["name"]), candidates[0])
+
+    def _place_after_near(self, text: str) -> Optional[Dict[str, Any]]:
+        """The place named right after a "near"/"around"/"close to" in a text, if any."""
+        tokens = [LOCATION_ALIASES.get(token, token) for token in normalize_term(text).split()]
+        for match in NEAR_PATTERN.finditer(text):
+            following = [LOCATION_ALIASES.get(token, token) for token in normalize_term(text[match.end():]).split()]
+            if following[:1] == ["the"]:
+                following = following[1:]
+            for length in range(min(len(following), 6), 0, -1):
+                candidates = self.places.get(" ".join(following[:length]))
+                if candidates:
+                    return self._choose_place(candidates, tokens)
+        return None
+
+    def parse_proximity(self, message: str, location: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Turn a proximity request into a centre and a radius.
+
+        "within 1 mile of SoHo" and "10 minute walk from Back Bay" use the stated
+        distance; "walking distance" uses GEO_WALKING_METERS; "near"/"around" a place
+        use its extent, but at least GEO_NEAR_RADIUS_METERS; "closest"/"nearest" rank
+        by distance. The place comes from the message, or else the extracted location;
+        "near"/"around" only count when a place follows them ("around 8pm" is a time).
+
+        Args:
+            message: The user message
+            location: The location extracted from the conversation, if any
+
+        Returns:
+            {"place", "lat", "lon", "radius", "nearest"}, or None if the message asks for
+            no proximity or names no known place
+        """
+        text = message.lower()
+        radius_match = RADIUS_PATTERN.search(text) or WALK_PATTERN.search(text)
+        walking = WALKING_PATTERN.search(text)
+        nearest = bool(NEAREST_PATTERN.search(text))
+        distance_given = radius_match or walking or nearest
+        place = None if distance_given else self._place_after_near(text)
+        if not (distance_given or place or NEARBY_PATTERN.search(text)):
+            return None
+        place = place or self.resolve_place(message) or (self.resolve_place(location) if location else None)
+        if place is None:
+            return None
+        # A bare city ("restaurants in Boston") is a location filter, not a proximity request
+        if not distance_given and place["name"] == place["city"]:
+            return None
+
+        if radius_match:
+            amount = radius_match.group(1)
+            amount = float(amount) if amount[0].isdigit() else NUMBER_WORDS[amount]
+            radius = amount * UNIT_METERS[radius_match.group(2)]
+        elif walking:
+            radius = GEO_WALKING_METERS
+        else:
+            radius = max(place["extent"], GEO_NEAR_RADIUS_METERS)
+        return {"place": place["name"], "lat": place["lat"], "lon": place["lon"], "radius": radius, "nearest": nearest}
+
+    def proximity_candidates(self, proximity: Dict[str, Any], restaurant_ids: Optional[set] = None) -> Dict[str, float]:
+        """
+        Restaurants satisfying a proximity request, with their distances. "Nearest"
+        requests and radii containing no eligible restaurant fall back to the
+        GEO_NEAREST_CANDIDATES nearest eligible restaurants.
+
+        Args:
+            proximity: Request from parse_proximity()
+            restaurant_ids: Restaurants allowed by the other constraints (None means all)
+
+        Returns:
+            Dictionary of restaurant id -> distance in meters, nearest first
+        """
+        lat, lon = proximity["lat"], proximity["lon"]
+        if not proximity["nearest"]:
+            inside = [(restaurant_id, distance) for restaurant_id, distance in self.within(lat, lon, proximity["radius"])
+                      if restaurant_ids is None or restaurant_id in restaurant_ids]
+            if inside:
+                return dict(inside)
+            logger.debug(f"No restaurant within {proximity['radius']:.0f} m of {proximity['place']}, using the nearest")
+        return dict(self.nearest(lat, lon, GEO_NEAREST_CANDIDATES, restaurant_ids))
+
+def build_geo_index(restaurants) -> GeoIndex:
+    """
+    Build the geospatial index from restaurant records.
+
+    Args:
+        restaurants: Iterable of restaurant dictionaries
+
+    Returns:
+        The built GeoIndex
+    """
+    index = GeoIndex()
+    for restaurant in restaurants:
+        index.add(restaurant)
+    index.build()
+    logger.info(f"Built geo index over {len(index.ids)} restaurants in {len(index.cells)} cells with {len(index.places)} places")
+    return index
+
+@lru_cache(maxsize=1)
+def get_geo_index(json_file_path: str = RESTAURANTS_JSON_PATH) -> GeoIndex:
+    """
+    Get the process-wide geospatial index, building it from the restaurant data on first use.
+
+    Args:
+        json_file_path: Path to the JSON file containing restaurant data
+
+    Returns:
+        The GeoIndex
+    """
+    return build_geo_index(iter_restaurants(json_file_path))
@@ -0,0 +1,270 @@
+"""
+Incremental FAISS index maintenance for the restaurant agent.
+
+A manifest stored next to the index records, per restaurant, the docstore id and
+hashes of the document text and metadata produced by restaurant_to_doc. A
+sync diffs the current catalog against the manifest: only new or re-worded
+restaurants are embedded, metadata-only changes are patched in the docstore, and
+restaurants that disappeared from the catalog are deleted.
+
+    python -m zeal.backend.database.incremental_index [restaurants.json] [index_dir]
+"""
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from zeal.backend.logger import logger
+from zeal.backend.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, RESTAURANTS_JSON_PATH, FAISS_INDEX_DIR
+from zeal.backend.database.restaurant_loader import iter_restaurants, iter_restaurant_docs
+from zeal.backend.database.restaurant_store import refresh_restaurant_store, restaurant_store_path
+from zeal.backend.database.ann_index import load_index_config, remove_documents
+from zeal.backend.database.file_lock import file_lock
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+LOCK_FILE = ".sync.lock"
+
+def index_lock(index_dir: str):
+    """
+    Exclusive lock on an index directory, held while syncing or building it, so one
+    process writes the files and the others wait and then load the result.
+    
+    Args:
+        index_dir: The FAISS index directory
+        
+    Returns:
+        A context manager holding the lock
+    """
+    return file_lock(os.path.join(index_dir, LOCK_FILE))
+
+def restaurant_key(doc: Document) -> str:
+    """Stable key of the restaurant a document describes: its id, or its name when the id is missing."""
+    return doc.metadata.get("id") or f"name:{doc.metadata.get('name')}"
+
+def text_hash(doc: Document) -> str:
+    """Hash of the embedded text; a change means the restaurant must be re-embedded."""
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+def metadata_hash(doc: Document) -> str:
+    """Hash of the document metadata; a change only requires a docstore update."""
+    return hashlib.sha256(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def manifest_entry(docstore_id: str, doc: Document) -> Dict[str, str]:
+    """Manifest record for one indexed restaurant."""
+    return {"docstore_id": docstore_id, "text_hash": text_hash(doc), "metadata_hash": metadata_hash(doc)}
+
+def iter_unique_docs(docs: Iterable[Document]) -> Iterator[Tuple[str, Document]]:
+    """
+    Key documents by restaurant, skipping later documents with an already seen key.
+    
+    Args:
+        docs: Iterable of restaurant documents
+        
+    Yields:
+        (restaurant key, document) pairs
+    """
+    seen = set()
+    for doc in docs:
+        key = restaurant_key(doc)
+        if key in seen:
+            logger.warning(f"Duplicate restaurant key {key}, keeping the first record")
+            continue
+        seen.add(key)
+        yield key, doc
+
+def load_manifest(index_dir: str) -> Dict[str, Any]:
+    """
+    Load the manifest stored next to an index.
+    
+    Args:
+        index_dir: The FAISS index directory
+        
+    Returns:
+        The manifest, or None if missing or unreadable
+    """
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.warning(f"Ignoring manifest with unsupported version {manifest.get('version')}")
+            return None
+        return manifest
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read index manifest at {path}: {e}")
+        return None
+
+def save_manifest(index_dir: str, restaurants: Dict[str, Dict[str, str]]) -> None:
+    """
+    Atomically write the manifest for an index.
+    
+    Args:
+        index_dir: The FAISS index directory
+        restaurants: Dictionary of restaurant key -> manifest entry
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"version": MANIFEST_VERSION, "embedding_model": EMBEDDING_MODEL,
+                   "embedding_dimensions": EMBEDDING_DIMENSIONS, "restaurants": restaurants}, file)
+    os.replace(temp_path, path)
+
+def index_version(index_dir: str) -> Optional[str]:
+    """
+    Short hash of an index's manifest, which changes whenever a sync or build changes the index.
+    
+    Args:
+        index_dir: The FAISS index directory
+        
+    Returns:
+        The version, or None if the index has no manifest
+    """
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+def adopt_manifest(vector_store: FAISS) -> Dict[str, Dict[str, str]]:
+    """
+    Reconstruct manifest entries from an index built before manifests existed,
+    hashing the documents already in its docstore.
+    
+    Args:
+        vector_store: The loaded FAISS vector store
+        
+    Returns:
+        Dictionary of restaurant key -> manifest entry
+    """
+    restaurants = {}
+    for docstore_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(docstore_id)
+        if isinstance(doc, Document):
+            restaurants[restaurant_key(doc)] = manifest_entry(docstore_id, doc)
+    logger.info(f"Adopted {len(restaurants)} indexed restaurants into a new manifest")
+    return restaurants
+
+def catalog_changed(restaurants_json_path: str, index_dir: str) -> bool:
+    """
+    Cheap check for whether a sync could find changes: the catalog file is newer than
+    the manifest (syncs that find nothing touch the manifest), or there is no manifest.
+    
+    Args:
+        restaurants_json_path: Path to the JSON or JSON Lines catalog
+        index_dir: The FAISS index directory
+        
+    Returns:
+        True if the index should be synced
+    """
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return True
+    try:
+        return os.path.getmtime(restaurants_json_path) > os.path.getmtime(manifest_path)
+    except OSError:
+        return False
+
+def sync_index(vector_store: FAISS, restaurants_json_path: str, index_dir: str) -> Dict[str, int]:
+    """
+    Bring an index and its restaurant store in line with the catalog and persist them.
+    The catalog is consumed as a stream; only the changed documents are held in memory.
+    
+    Args:
+        vector_store: The loaded FAISS vector store (modified in place)
+        restaurants_json_path: Path to the JSON or JSON Lines catalog
+        index_dir: Directory the index, manifest and restaurant store are saved to
+        
+    Returns:
+        Counts of added, reembedded, metadata_updated, deleted and unchanged restaurants
+    """
+    # Imported here: vector_store.py calls into this module while setting up the retriever
+    from zeal.backend.database.vector_store import save_faiss_index, invalidate_restaurant_positions
+    from zeal.backend.database.index_builder import iter_batches, embed_batches, add_to_index, BuildProgress
+    
+    manifest = load_manifest(index_dir)
+    indexed = manifest["restaurants"] if manifest else adopt_manifest(vector_store)
+    if manifest and manifest.get("embedding_model") != EMBEDDING_MODEL:
+        raise ValueError(f"Index was built with {manifest.get('embedding_model')}, not {EMBEDDING_MODEL}; rebuild it from scratch")
+    if manifest and manifest.get("embedding_dimensions") != EMBEDDING_DIMENSIONS:
+        raise ValueError(f"Index was built with {manifest.get('embedding_dimensions')} embedding dimensions, "
+                         f"not {EMBEDDING_DIMENSIONS}; rebuild it from scratch")
+    
+    counts = {"added": 0, "reembedded": 0, "metadata_updated": 0, "deleted": 0, "unchanged": 0}
+    seen = set()
+    to_delete = []
+    to_embed = []
+    for key, doc in iter_unique_docs(iter_restaurant_docs(iter_restaurants(restaurants_json_path))):
+        seen.add(key)
+        entry = indexed.get(key)
+        if entry is None:
+            to_embed.append((key, doc))
+            counts["added"] += 1
+        elif entry["text_hash"] != text_hash(doc):
+            to_delete.append(key)
+            to_embed.append((key, doc))
+            counts["reembedded"] += 1
+        elif entry["metadata_hash"] != metadata_hash(doc):
+            # Same text, so the stored vector is still right: swap the document only
+            vector_store.docstore.delete([entry["docstore_id"]])
+            vector_store.docstore.add({entry["docstore_id"]: doc})
+            indexed[key] = manifest_entry(entry["docstore_id"], doc)
+            counts["metadata_updated"] += 1
+        else:
+            counts["unchanged"] += 1
+    removed = [key for key in indexed if key not in seen]
+    counts["deleted"] = len(removed)
+    to_delete.extend(removed)
+    
+    if to_delete:
+        remove_documents(vector_store, [indexed[key]["docstore_id"] for key in to_delete], load_index_config(index_dir))
+        for key in to_delete:
+            del indexed[key]
+    if to_embed:
+        logger.info(f"Embedding {len(to_embed)} new or changed restaurants")
+        progress = BuildProgress(len(to_embed))
+        for batch, vectors in embed_batches(iter_batches(to_embed), progress):
+            add_to_index(vector_store, batch, vectors)
+            for key, doc in batch:
+                indexed[key] = manifest_entry(key, doc)
+        logger.info(f"Embedded changed restaurants at {progress.summary()['docs_per_second']} docs/s")
+    
+    changed = to_delete or to_embed or counts["metadata_updated"] or manifest is None
+    if changed:
+        invalidate_restaurant_positions(vector_store)
+        # Raises if the index could not be saved, leaving the old manifest to trigger the next sync
+        save_faiss_index(vector_store, index_dir)
+        save_manifest(index_dir, indexed)
+    else:
+        # Record that the index is current with this catalog, for catalog_changed
+        os.utime(os.path.join(index_dir, MANIFEST_FILE))
+    store_path = restaurant_store_path(index_dir)
+    if changed or not os.path.exists(store_path):
+        refresh_restaurant_store(restaurants_json_path, store_path)
+    logger.info(f"Index sync finished: {counts}")
+    return counts
+
+def main():
+    """Sync the persisted index with the catalog file from the command line."""
+    from zeal.backend.database.vector_store import get_embeddings, load_faiss_index, create_and_save_index, index_exists
+    
+    restaurants_json_path = sys.argv[1] if len(sys.argv) > 1 else RESTAURANTS_JSON_PATH
+    index_dir = sys.argv[2] if len(sys.argv) > 2 else FAISS_INDEX_DIR
+    
+    with index_lock(index_dir):
+        # Syncing modifies the index, so it is read into memory rather than mapped
+        vector_store = load_faiss_index(index_dir, get_embeddings(), mmap=False) if index_exists(index_dir) else None
+        if vector_store is None:
+            create_and_save_index(restaurants_json_path, index_dir)
+            print("Built a new index")
+            return
+        counts = sync_index(vector_store, restaurants_json_path, index_dir)
+    print(json.dumps(counts, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Batched, concurrent and resumable embedding pipeline for FAISS index builds.
+
+The catalog is streamed through a generator pipeline: documents are grouped into
+token-bounded batches, embedded by a bounded thread pool with retry and exponential
+backoff, and every finished batch is checkpointed as a .npy file. A failed build
+rerun with the same catalog only embeds the batches that are still missing.
+
+    python -m zeal.backend.database.index_builder --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from zeal.backend.logger import logger
+from zeal.backend.config import (
+    EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, RESTAURANTS_JSON_PATH, FAISS_INDEX_DIR,
+    EMBED_BATCH_MAX_TOKENS, EMBED_BATCH_MAX_DOCS, EMBED_WORKERS, EMBED_MAX_RETRIES, FAISS_INDEX_TYPE
+)
+from zeal.backend.database.ann_index import index_config, convert_index
+from zeal.backend.database.restaurant_loader import iter_restaurants, iter_restaurant_docs
+from zeal.backend.database.incremental_index import iter_unique_docs, manifest_entry, save_manifest, index_lock
+from zeal.backend.database.restaurant_store import refresh_restaurant_store, restaurant_store_path
+from zeal.backend.database.vector_store import get_embeddings, save_faiss_index
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+except Exception:  # tiktoken missing or offline: fall back to a character estimate
+    _ENCODING = None
+
+def count_tokens(text: str) -> int:
+    """Count (or, without tiktoken, estimate) the tokens the embedding model will see."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def iter_batches(items: Iterable[Tuple[str, Document]], max_tokens: int = EMBED_BATCH_MAX_TOKENS,
+                 max_docs: int = EMBED_BATCH_MAX_DOCS) -> Iterator[List[Tuple[str, Document]]]:
+    """
+    Lazily group (key, document) pairs into consecutive batches bounded by token count and document count.
+    
+    Args:
+        items: Iterable of (restaurant key, document) pairs
+        max_tokens: Token budget per batch
+        max_docs: Maximum documents per batch
+        
+    Yields:
+        Lists of (restaurant key, document) pairs
+    """
+    current, current_tokens = [], 0
+    for key, doc in items:
+        tokens = count_tokens(doc.page_content)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_docs):
+            yield current
+            current, current_tokens = [], 0
+        current.append((key, doc))
+        current_tokens += tokens
+    if current:
+        yield current
+
+class BuildProgress:
+    """Thread-safe throughput reporting for an embedding run."""
+    def __init__(self, total_docs: Optional[int] = None):
+        self.total_docs = total_docs  # unknown while streaming a catalog
+        self.docs = 0
+        self.tokens = 0
+        self.batches = 0
+        self.reused_batches = 0
+        self.retries = 0
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, docs: int, tokens: int) -> None:
+        """Record a freshly embedded batch and log progress."""
+        with self.lock:
+            self.docs += docs
+            self.tokens += tokens
+            self.batches += 1
+            elapsed = max(time.time() - self.start_time, 1e-9)
+            total = f"/{self.total_docs}" if self.total_docs else ""
+            logger.info(f"Embedded batch {self.batches}: {self.docs}{total} docs, "
+                        f"{self.docs / elapsed:.1f} docs/s, {self.tokens / elapsed:.0f} tokens/s")
+
+    def summary(self) -> Dict[str, float]:
+        """Return totals and throughput for the run."""
+        elapsed = time.time() - self.start_time
+        return {
+            "docs_embedded": self.docs,
+            "tokens_embedded": self.tokens,
+            "batches_embedded": self.batches,
+            "batches_reused": self.reused_batches,
+            "retries": self.retries,
+            "seconds": round(elapsed, 2),
+            "docs_per_second": round(self.docs / elapsed, 2) if elapsed else None,
+            "tokens_per_second": round(self.tokens / elapsed, 1) if elapsed else None
+        }
+
+def _embed_with_retry(texts: List[str], progress: BuildProgress, max_retries: int = EMBED_MAX_RETRIES) -> np.ndarray:
+    """Embed one batch, retrying transient failures with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        try:
+            return np.asarray(get_embeddings().embed_documents(texts), dtype=np.float32)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+            with progress.lock:
+                progress.retries += 1
+            logger.warning(f"Embedding batch failed ({e}), retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+def _batch_fingerprint(texts: List[str]) -> str:
+    """Hash tying a checkpoint to the model, its output dimensions and the exact texts of its batch."""
+    digest = hashlib.sha256(f"{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}".encode("utf-8"))
+    for text in texts:
+        digest.update(b"\x00" + text.encode("utf-8"))
+    return digest.hexdigest()
+
+def _load_checkpoint(checkpoint_dir: str, number: int, fingerprint: str) -> Optional[np.ndarray]:
+    """Return the checkpointed vectors of a batch if they were computed for the same texts."""
+    path = os.path.join(checkpoint_dir, f"batch_{number:06d}")
+    try:
+        with open(path + ".sha256", "r", encoding="utf-8") as file:
+            if file.read() != fingerprint:
+                return None
+        return np.load(path + ".npy")
+    except (OSError, ValueError):
+        return None
+
+def _save_checkpoint(checkpoint_dir: str, number: int, fingerprint: str, vectors: np.ndarray) -> None:
+    """Write a batch checkpoint; vectors are renamed into place before the fingerprint is written."""
+    path = os.path.join(checkpoint_dir, f"batch_{number:06d}")
+    np.save(path + ".tmp.npy", vectors)
+    os.replace(path + ".tmp.npy", path + ".npy")
+    with open(path + ".sha256", "w", encoding="utf-8") as file:
+        file.write(fingerprint)
+
+def embed_batches(batches: Iterable[List[Tuple[str, Document]]], progress: BuildProgress,
+                  checkpoint_dir: Optional[str] = None, workers: int = EMBED_WORKERS):
+    """
+    Embed a stream of batches on a bounded worker pool. At most 2 * workers batches are
+    in flight, so memory stays flat however long the stream is.
+    
+    Args:
+        batches: Iterable of batches from iter_batches
+        progress: Progress tracker updated as batches finish
+        checkpoint_dir: Directory for per-batch checkpoints (None disables resuming)
+        workers: Number of concurrent embedding requests
+        
+    Yields:
+        (batch, float32 vectors of shape (len(batch), d)) in completion order
+    """
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    
+    def run_batch(number: int, batch: List[Tuple[str, Document]]):
+        texts = [doc.page_content for _, doc in batch]
+        fingerprint = _batch_fingerprint(texts) if checkpoint_dir else None
+        if checkpoint_dir:
+            vectors = _load_checkpoint(checkpoint_dir, number, fingerprint)
+            if vectors is not None:
+                with progress.lock:
+                    progress.reused_batches += 1
+                return batch, vectors
+        vectors = _embed_with_retry(texts, progress)
+        if checkpoint_dir:
+            _save_checkpoint(checkpoint_dir, number, fingerprint, vectors)
+        progress.record(len(texts), sum(count_tokens(text) for text in texts))
+        return batch, vectors
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed") as executor:
+        in_flight = set()
+        for number, batch in enumerate(batches):
+            in_flight.add(executor.submit(run_batch, number, batch))
+            if len(in_flight) >= 2 * max(1, workers):
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()  # re-raises a batch that exhausted its retries
+        for future in as_completed(in_flight):
+            yield future.result()
+
+def add_to_index(vector_store: Optional[FAISS], batch: List[Tuple[str, Document]], vectors: np.ndarray) -> FAISS:
+    """
+    Add an embedded batch to a vector store, creating the store for the first batch.
+    
+    Args:
+        vector_store: The FAISS vector store, or None before the first batch
+        batch: (restaurant key, document) pairs; keys become docstore ids
+        vectors: Embeddings of the batch documents
+        
+    Returns:
+        The vector store
+    """
+    text_embeddings = [(doc.page_content, vector) for (_, doc), vector in zip(batch, vectors.tolist())]
+    metadatas = [doc.metadata for _, doc in batch]
+    ids = [key for key, _ in batch]
+    if vector_store is None:
+        return FAISS.from_embeddings(text_embeddings=text_embeddings, embedding=get_embeddings(), metadatas=metadatas, ids=ids)
+    vector_store.add_embeddings(text_embeddings=text_embeddings, metadatas=metadatas, ids=ids)
+    return vector_store
+
+def build_index(restaurants_json_path: str = RESTAURANTS_JSON_PATH, index_dir: str = FAISS_INDEX_DIR,
+                workers: int = EMBED_WORKERS, max_tokens: int = EMBED_BATCH_MAX_TOKENS,
+                max_docs: int = EMBED_BATCH_MAX_DOCS, resume: bool = True,
+                index_type: str = FAISS_INDEX_TYPE, index_params: Optional[Dict] = None):
+    """
+    Build and save a FAISS index (with its manifest and restaurant store) from the restaurant catalog. The
+    catalog is streamed: records -> documents -> batches -> embeddings -> index, so
+    only the in-flight batches and the index itself are held in memory. Vectors are
+    collected in a flat index, which is converted to the requested type and vector
+    storage (see FAISS_INDEX_COMPRESSION) at the end.
+    
+    Args:
+        restaurants_json_path: Path to the JSON or JSON Lines catalog
+        index_dir: Directory to save the FAISS index
+        workers: Number of concurrent embedding requests
+        max_tokens: Token budget per batch
+        max_docs: Maximum documents per batch
+        resume: Whether to reuse checkpoints from an interrupted build
+        index_type: "flat", "ivf" or "hnsw"
+        index_params: Overrides of FAISS_INDEX_PARAMS for the type or of FAISS_INDEX_COMPRESSION
+            (e.g. {"nlist": 256, "storage": "sq8"})
+        
+    Returns:
+        Tuple of (FAISS vector store, throughput summary)
+    """
+    config = index_config(index_type, **(index_params or {}))
+    checkpoint_dir = os.path.normpath(index_dir) + ".build"
+    if not resume and os.path.isdir(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    
+    logger.info(f"Building {index_type} FAISS index from {restaurants_json_path} with {workers} workers")
+    docs = iter_unique_docs(iter_restaurant_docs(iter_restaurants(restaurants_json_path)))
+    progress = BuildProgress()
+    vector_store = None
+    manifest = {}
+    for batch, vectors in embed_batches(iter_batches(docs, max_tokens, max_docs), progress, checkpoint_dir, workers):
+        vector_store = add_to_index(vector_store, batch, vectors)
+        for key, doc in batch:
+            manifest[key] = manifest_entry(key, doc)
+    if vector_store is None:
+        raise ValueError(f"No restaurants found in {restaurants_json_path}")
+    
+    config = convert_index(vector_store, config)
+    # Raises if the index could not be saved, keeping the checkpoints for a resumed build
+    save_faiss_index(vector_store, index_dir, config)
+    save_manifest(index_dir, manifest)
+    refresh_restaurant_store(restaurants_json_path, restaurant_store_path(index_dir))
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    
+    summary = progress.summary()
+    logger.info(f"Index build finished: {summary}")
+    return vector_store, summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the restaurant FAISS index with batched, resumable embedding")
+    parser.add_argument("--restaurants", default=RESTAURANTS_JSON_PATH, help="Restaurant catalog JSON file")
+    parser.add_argument("--index-dir", default=FAISS_INDEX_DIR, help="Directory to save the index to")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS, help="Concurrent embedding requests")
+    parser.add_argument("--batch-tokens", type=int, default=EMBED_BATCH_MAX_TOKENS, help="Token budget per batch")
+    parser.add_argument("--batch-docs", type=int, default=EMBED_BATCH_MAX_DOCS, help="Maximum documents per batch")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore checkpoints from an interrupted build")
+    parser.add_argument("--index-type", default=FAISS_INDEX_TYPE, choices=("flat", "ivf", "hnsw"), help="Vector index type")
+    parser.add_argument("--nlist", type=int, help="IVF: number of inverted lists")
+    parser.add_argument("--nprobe", type=int, help="IVF: lists scanned per query")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW: graph neighbours per node")
+    parser.add_argument("--ef-construction", type=int, help="HNSW: candidate list size while building")
+    parser.add_argument("--ef-search", type=int, help="HNSW: candidate list size per query")
+    parser.add_argument("--storage", choices=("flat", "fp16", "sq8", "pq"), help="Vector storage: float32, fp16, int8 or product-quantized")
+    parser.add_argument("--pca-dimensions", type=int, help="Project vectors to this many dimensions with a fitted PCA")
+    parser.add_argument("--pq-m", type=int, help="PQ: bytes per vector (sub-quantizers)")
+    parser.add_argument("--rerank", action="store_true", default=None, help="Keep float32 vectors and re-rank candidates exactly")
+    parser.add_argument("--rerank-factor", type=int, help="Candidates re-ranked per result")
+    args = parser.parse_args()
+    
+    index_params = {"nlist": args.nlist, "nprobe": args.nprobe, "M": args.hnsw_m,
+                    "ef_construction": args.ef_construction, "ef_search": args.ef_search,
+                    "storage": args.storage, "pca_dimensions": args.pca_dimensions, "pq_m": args.pq_m,
+                    "rerank": args.rerank, "rerank_factor": args.rerank_factor}
+    with index_lock(args.index_dir):
+        _, summary = build_index(args.restaurants, args.index_dir, args.workers, args.batch_tokens, args.batch_docs,
+                                 not args.no_resume, args.index_type, index_params)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
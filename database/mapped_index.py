@@ -0,0 +1,216 @@
+"""
+Memory-mapped FAISS index loading for the restaurant agent.
+
+FAISS.load_local reads the vectors and unpickles the whole docstore into every
+process, so N workers hold N copies. In mapped mode the index file is opened with
+FAISS's mmap flags, so vector data stays read-only in the page cache shared by all
+workers. Documents are served from a compact side file of compressed blobs in the
+restaurant store format, decoded only when a search returns them.
+
+A mapped index is read-only: syncs and rebuilds work on a heap copy and save it,
+after which workers map the new files.
+
+A save renames several files into place one at a time, so every side file records
+the stamp (size and modification time) of the index file it belongs to. They are
+written before the index file is renamed, and a reader that finds a stamp that does
+not match the index falls back instead of pairing files from two saves. Each save
+writes its docstore under a new name, so the file a reader was about to open is
+not replaced underneath it.
+"""
+import json
+import os
+from typing import Dict, Iterator, Optional, Set, Union
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from zeal.backend.logger import logger
+from zeal.backend.config import FAISS_DOCSTORE_CACHE_SIZE
+from zeal.backend.database.restaurant_store import RestaurantStore, store_exists, write_restaurant_store
+from zeal.backend.database.ann_index import load_index_config, save_index_config
+
+INDEX_FILE = "index.faiss"  # written by FAISS.save_local with the default index name
+DOCSTORE_PREFIX = "docstore."
+DOCSTORE_SUFFIX = ".records"
+POSITIONS_FILE = "index_to_docstore_id.json"
+STAMP_KEY = "index_stamp"  # in the positions file and the index config
+READ_ONLY_MESSAGE = "A memory-mapped docstore is read-only; modify a heap-loaded index instead"
+
+# Map inverted lists (IO_FLAG_MMAP) and flat codes (IO_FLAG_MMAP_IFC, faiss >= 1.10) instead of reading them.
+# IVF lists can only be mapped through a plain file reader, which IO_FLAG_MMAP_IFC replaces.
+MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+IVF_MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+def index_stamp(index_path: str) -> str:
+    """Size and modification time of an index file, which a rename keeps; identifies one save."""
+    stat = os.stat(index_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def read_positions(index_dir: str) -> Optional[Dict]:
+    """
+    Read the positions file of an index directory.
+
+    Args:
+        index_dir: The FAISS index directory
+
+    Returns:
+        {"index_stamp", "docstore", "positions"}, or None if the file is missing or was
+        written before stamps (a bare list)
+    """
+    path = os.path.join(index_dir, POSITIONS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        positions = json.load(file)
+    return positions if isinstance(positions, dict) else None
+
+def has_mapped_docstore(index_dir: str) -> bool:
+    """Whether the docstore side files and index config of an index directory belong to its index file."""
+    try:
+        stamp = index_stamp(os.path.join(index_dir, INDEX_FILE))
+        positions = read_positions(index_dir)
+    except (OSError, ValueError):
+        return False
+    return (positions is not None and positions[STAMP_KEY] == stamp
+            and load_index_config(index_dir).get(STAMP_KEY, stamp) == stamp
+            and store_exists(os.path.join(index_dir, positions["docstore"])))
+
+def _remove_docstores(index_dir: str, keep: Set[str]) -> None:
+    """Remove docstore files of earlier saves, including the unstamped docstore.records."""
+    for name in os.listdir(index_dir):
+        if not name.startswith(DOCSTORE_PREFIX):
+            continue
+        docstore = name[:-len(".offsets.json")] if name.endswith(DOCSTORE_SUFFIX + ".offsets.json") else name
+        if docstore.endswith(DOCSTORE_SUFFIX) and docstore not in keep:
+            try:
+                os.remove(os.path.join(index_dir, name))
+            except OSError as e:
+                logger.warning(f"Could not remove old docstore file {name}: {e}")
+
+def _iter_docstore_records(vector_store: FAISS) -> Iterator[Dict]:
+    """Docstore documents as store records keyed by docstore id."""
+    for docstore_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(docstore_id)
+        if isinstance(doc, Document):
+            yield {"id": docstore_id, "page_content": doc.page_content, "metadata": doc.metadata}
+
+def write_mapped_docstore(vector_store: FAISS, index_dir: str, stamp: Optional[str] = None) -> None:
+    """
+    Write the docstore side files for a saved index: the documents as a compact
+    records file and the FAISS row -> docstore id list, stamped with the index file.
+
+    Args:
+        vector_store: The FAISS vector store that was saved to index_dir
+        index_dir: The FAISS index directory
+        stamp: Stamp of the index file about to be renamed into place (defaults to the current one)
+    """
+    if stamp is None:
+        stamp = index_stamp(os.path.join(index_dir, INDEX_FILE))
+    previous = read_positions(index_dir)
+    docstore = f"{DOCSTORE_PREFIX}{stamp}{DOCSTORE_SUFFIX}"
+    write_restaurant_store(_iter_docstore_records(vector_store), os.path.join(index_dir, docstore))
+    positions = [vector_store.index_to_docstore_id[position] for position in range(vector_store.index.ntotal)]
+    path = os.path.join(index_dir, POSITIONS_FILE)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({STAMP_KEY: stamp, "docstore": docstore, "positions": positions}, file, separators=(",", ":"))
+    os.replace(temp_path, path)
+    # A reader may have read the previous positions file and not yet opened its docstore
+    _remove_docstores(index_dir, {docstore, previous["docstore"] if previous else docstore})
+
+def restamp_side_files(vector_store: FAISS, index_dir: str) -> None:
+    """
+    Rewrite the side files of an index whose stamps do not match its index file: saved
+    before stamps, copied (which changes modification times) or left by an interrupted save.
+    Only call this with no save running, i.e. under the index lock.
+
+    Args:
+        vector_store: A heap-loaded copy of the saved index
+        index_dir: The FAISS index directory
+    """
+    stamp = index_stamp(os.path.join(index_dir, INDEX_FILE))
+    save_index_config(index_dir, {**load_index_config(index_dir), STAMP_KEY: stamp})
+    write_mapped_docstore(vector_store, index_dir, stamp)
+
+def check_loaded_index(vector_store: FAISS, index_dir: str, stamp: str) -> bool:
+    """
+    Check that a heap-loaded index and docstore (index.faiss and index.pkl, which a save
+    renames one after the other) come from the same save.
+
+    Args:
+        vector_store: The FAISS vector store loaded from index_dir
+        index_dir: The FAISS index directory
+        stamp: Stamp of the index file taken before loading
+
+    Returns:
+        False if the index file was replaced while loading, or the docstore rows differ
+        from the positions saved with this index file
+    """
+    if index_stamp(os.path.join(index_dir, INDEX_FILE)) != stamp:
+        return False
+    positions = read_positions(index_dir)
+    if positions is None or positions[STAMP_KEY] != stamp:
+        # Side files of a save that has not renamed the index yet, or of no save at all
+        return True
+    return positions["positions"] == [vector_store.index_to_docstore_id.get(position)
+                                      for position in range(vector_store.index.ntotal)]
+
+class MappedDocstore(Docstore):
+    """Read-only docstore over a memory-mapped records file."""
+    def __init__(self, path: str, cache_size: int = FAISS_DOCSTORE_CACHE_SIZE):
+        """
+        Open a records file written by write_mapped_docstore.
+
+        Args:
+            path: Records file
+            cache_size: Number of decoded documents kept in memory
+        """
+        self.records = RestaurantStore(path, cache_size)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Return the document with a docstore id, or an error string like InMemoryDocstore."""
+        record = self.records.get(search)
+        if record is None:
+            return f"ID {search} not found."
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Refuse writes: the records file is shared with other processes."""
+        raise RuntimeError(READ_ONLY_MESSAGE)
+
+    def delete(self, ids) -> None:
+        """Refuse writes: the records file is shared with other processes."""
+        raise RuntimeError(READ_ONLY_MESSAGE)
+
+def load_mapped_index(index_dir: str, embedding_model) -> Optional[FAISS]:
+    """
+    Open a persisted index in mapped mode.
+
+    Args:
+        index_dir: The FAISS index directory
+        embedding_model: The embedding model used for queries
+
+    Returns:
+        A read-only FAISS vector store, or None if the docstore side files are missing
+        or do not belong to the index file
+    """
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    stamp = index_stamp(index_path)
+    positions = read_positions(index_dir)
+    if positions is None:
+        logger.info(f"No mapped docstore in {index_dir}; it is written the next time the index is saved")
+        return None
+    config = load_index_config(index_dir)
+    if positions[STAMP_KEY] != stamp or config.get(STAMP_KEY, stamp) != stamp:
+        logger.info(f"Side files in {index_dir} do not belong to its index file (save in progress or copied index)")
+        return None
+    flags = IVF_MMAP_IO_FLAGS if config["type"] == "ivf" else MMAP_IO_FLAGS
+    index = faiss.read_index(index_path, flags)
+    if index_stamp(index_path) != stamp:
+        logger.info(f"Index in {index_dir} was replaced while it was being mapped")
+        return None
+    index_to_docstore_id = dict(enumerate(positions["positions"]))
+    if len(index_to_docstore_id) != index.ntotal:
+        raise ValueError(f"Mapped docstore has {len(index_to_docstore_id)} rows, index has {index.ntotal}")
+    docstore = MappedDocstore(os.path.join(index_dir, positions["docstore"]))
+    return FAISS(embedding_model, index, docstore, index_to_docstore_id)
@@ -0,0 +1,147 @@
+"""
+Exact and fuzzy restaurant-name index for the restaurant agent.
+"""
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from zeal.backend.logger import logger
+from zeal.backend.config import RESTAURANTS_JSON_PATH, NAME_MATCH_MIN_CONFIDENCE
+from zeal.backend.database.restaurant_loader import iter_restaurants
+from zeal.backend.database.text_utils import normalize_term, trigrams, edit_distance
+
+# Words that carry no identifying information in a restaurant name
+NAME_STOPWORDS = {"the", "a", "an", "and", "&", "of", "restaurant", "cafe", "bar", "grill", "kitchen"}
+
+# Trigram candidates are verified with edit distance only for the best few, to bound the cost
+MAX_FUZZY_CANDIDATES = 20
+
+def _strip_name(name: str) -> str:
+    """Normalize a name, drop apostrophes and a leading article, so "The Smith's" and "smiths" collide."""
+    normalized = normalize_term(name.replace("'", "").replace("\u2019", ""))
+    return normalized[4:] if normalized.startswith("the ") else normalized
+
+class RestaurantNameIndex:
+    """
+    Resolves restaurant names to ids without an embedding call. Lookups try, in order:
+    a normalized exact map, a token index (all significant tokens present), a trigram
+    index (Dice similarity), and an edit-distance check on the best trigram candidates.
+    """
+    def __init__(self):
+        """Initialize an empty index."""
+        self.names = {}  # restaurant id -> stripped name
+        self.exact = defaultdict(set)
+        self.token_index = defaultdict(set)
+        self.trigram_index = defaultdict(set)
+    
+    def add(self, restaurant_id: str, name: str) -> None:
+        """
+        Add one restaurant name to the index.
+        
+        Args:
+            restaurant_id: The restaurant's id
+            name: The restaurant's display name
+        """
+        stripped = _strip_name(name)
+        if not restaurant_id or not stripped:
+            return
+        self.names[restaurant_id] = stripped
+        self.exact[stripped].add(restaurant_id)
+        for token in stripped.split():
+            if token not in NAME_STOPWORDS:
+                self.token_index[token].add(restaurant_id)
+        for gram in trigrams(stripped):
+            self.trigram_index[gram].add(restaurant_id)
+    
+    def resolve(self, name: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """
+        Resolve a user-supplied name to restaurant ids with a confidence score.
+        
+        Args:
+            name: Restaurant name as written by the user
+            limit: Maximum number of candidates to return
+            
+        Returns:
+            List of (restaurant_id, confidence) sorted by confidence, best first
+        """
+        query = _strip_name(name)
+        if not query:
+            return []
+        
+        # 1. Exact normalized match
+        if query in self.exact:
+            return [(restaurant_id, 1.0) for restaurant_id in sorted(self.exact[query])][:limit]
+        
+        # 2. Every significant token appears in a single name and covers at least half of it
+        #    ("joe's pizza" -> "joes pizza broadway", but not "pizza" alone)
+        tokens = [token for token in query.split() if token not in NAME_STOPWORDS]
+        if tokens and all(token in self.token_index for token in tokens):
+            token_hits = set.intersection(*(self.token_index[token] for token in tokens))
+            if len(token_hits) == 1:
+                restaurant_id = next(iter(token_hits))
+                name_tokens = [token for token in self.names[restaurant_id].split() if token not in NAME_STOPWORDS]
+                if 2 * len(tokens) >= len(name_tokens):
+                    return [(restaurant_id, 0.95)]
+        
+        # 3. Trigram Dice similarity to shortlist candidates
+        query_grams = trigrams(query)
+        shared_counts = defaultdict(int)
+        for gram in query_grams:
+            for restaurant_id in self.trigram_index.get(gram, ()):
+                shared_counts[restaurant_id] += 1
+        shortlist = sorted(shared_counts.items(), key=lambda item: item[1], reverse=True)[:MAX_FUZZY_CANDIDATES]
+        
+        # 4. Edit distance on the shortlist; keep the better of the two similarities
+        scored = []
+        for restaurant_id, shared in shortlist:
+            candidate = self.names[restaurant_id]
+            dice = 2 * shared / (len(query_grams) + len(trigrams(candidate)))
+            longest = max(len(query), len(candidate))
+            max_distance = longest // 3
+            distance = edit_distance(query, candidate, max_distance)
+            edit_similarity = 1 - distance / longest if distance <= max_distance else 0.0
+            scored.append((restaurant_id, round(max(dice, edit_similarity), 3)))
+        
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+    
+    def resolve_confident(self, name: str, min_confidence: float = NAME_MATCH_MIN_CONFIDENCE) -> List[str]:
+        """
+        Resolve a name, keeping only hits at or above the confidence threshold.
+        
+        Args:
+            name: Restaurant name as written by the user
+            min_confidence: Minimum confidence for a hit to count
+            
+        Returns:
+            List of restaurant ids (empty if there is no confident hit)
+        """
+        return [restaurant_id for restaurant_id, confidence in self.resolve(name) if confidence >= min_confidence]
+
+def build_name_index(restaurants) -> RestaurantNameIndex:
+    """
+    Build the name index from restaurant records.
+    
+    Args:
+        restaurants: Iterable of restaurant dictionaries
+        
+    Returns:
+        The populated RestaurantNameIndex
+    """
+    index = RestaurantNameIndex()
+    for restaurant in restaurants:
+        index.add(restaurant.get("id"), restaurant.get("name") or "")
+    logger.info(f"Built name index over {len(index.names)} restaurants")
+    return index
+
+@lru_cache(maxsize=1)
+def get_name_index(json_file_path: str = RESTAURANTS_JSON_PATH) -> RestaurantNameIndex:
+    """
+    Get the process-wide name index, building it from the restaurant data on first use.
+    
+    Args:
+        json_file_path: Path to the JSON file containing restaurant data
+        
+    Returns:
+        The RestaurantNameIndex
+    """
+    return build_name_index(iter_restaurants(json_file_path))
@@ -2,27 +2,90 @@
 Restaurant data loading and preprocessing for the restaurant agent.
 """
 import json
+from collections import defaultdict
 from functools import lru_cache
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set
 from langchain.schema import Document
 from zeal.backend.logger import logger
-from zeal.backend.config import RESTAURANTS_JSON_PATH
+from zeal.backend.config import RESTAURANTS_JSON_PATH, INDEX_SHARD_METROS
+from zeal.backend.database.text_utils import normalize_term
+
+def _is_json_lines(json_file_path: str, file) -> bool:
+    """Detect JSON Lines by extension, or by the first non-whitespace character not opening an array."""
+    if json_file_path.endswith((".jsonl", ".ndjson")):
+        return True
+    while True:
+        char = file.read(1)
+        if not char or not char.isspace():
+            file.seek(0)
+            return char != "["
+
+def iter_restaurants(json_file_path: str = RESTAURANTS_JSON_PATH, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Stream restaurant records from a JSON array or JSON Lines file without loading the
+    whole file: array elements are decoded one at a time from a sliding read buffer.
+    
+    Args:
+        json_file_path: Path to the JSON or JSON Lines file containing restaurant data
+        chunk_size: Number of characters read from the file at a time
+        
+    Yields:
+        Restaurant dictionaries, in file order
+    """
+    logger.info(f"Streaming restaurant data from {json_file_path}")
+    count = 0
+    with open(json_file_path, 'r', encoding='utf-8') as file:
+        if _is_json_lines(json_file_path, file):
+            for line_number, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                        count += 1
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping malformed restaurant record on line {line_number}: {e}")
+        else:
+            decoder = json.JSONDecoder()
+            while file.read(1) != "[":  # skip whitespace up to the opening "["
+                pass
+            buffer = file.read(chunk_size)
+            position = 0
+            at_end = False
+            while True:
+                # Skip separators between elements
+                while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+                    position += 1
+                if position < len(buffer) and buffer[position] == "]":
+                    break
+                try:
+                    restaurant, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The element continues past the buffer: read more, or fail at end of file
+                    if at_end:
+                        raise
+                    chunk = file.read(chunk_size)
+                    at_end = not chunk
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    continue
+                yield restaurant
+                count += 1
+                if position > chunk_size:
+                    buffer = buffer[position:]
+                    position = 0
+    logger.info(f"Streamed {count} restaurants from {json_file_path}")
 
-@lru_cache(maxsize=1)  
 def load_restaurants(json_file_path: str = RESTAURANTS_JSON_PATH) -> List[Dict[str, Any]]:
     """
-    Load restaurant data from a JSON file.
+    Load all restaurant data into a list. Large catalogs should use iter_restaurants instead.
     
     Args:
-        json_file_path: Path to the JSON file containing restaurant data
+        json_file_path: Path to the JSON or JSON Lines file containing restaurant data
         
     Returns:
         List of restaurant dictionaries
     """
     try:
-        logger.info(f"Loading restaurant data from {json_file_path}")
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            restaurants = json.load(file)
+        restaurants = list(iter_restaurants(json_file_path))
         logger.info(f"Successfully loaded {len(restaurants)} restaurants from the database")
         return restaurants
     except Exception as e:
@@ -30,133 +93,359 @@ def load_restaurants(json_file_path: str = RESTAURANTS_JSON_PATH) -> List[Dict[s
         return []
 
 
-def prepare_restaurant_docs(restaurants: List[Dict[str, Any]]) -> List[Document]:
+def prepare_restaurant_docs(restaurants: Iterable[Dict[str, Any]]) -> List[Document]:
     """
     Convert restaurant data into document format for vector storage.
     
     Args:
-        restaurants: List of restaurant dictionaries
+        restaurants: Iterable of restaurant dictionaries
         
     Returns:
         List of Document objects
     """
-    logger.info(f"Preparing document representations for {len(restaurants)} restaurants")
-    docs = []
+    docs = list(iter_restaurant_docs(restaurants))
+    logger.info(f"Finished preparing {len(docs)} restaurant documents")
+    return docs
 
+def iter_restaurant_docs(restaurants: Iterable[Dict[str, Any]]) -> Iterator[Document]:
+    """
+    Lazily convert restaurant records into documents, one at a time.
+    
+    Args:
+        restaurants: Iterable of restaurant dictionaries (e.g. from iter_restaurants)
+        
+    Yields:
+        Document objects
+    """
     for i, restaurant in enumerate(restaurants):
         if i % 50 == 0 and i > 0:
             logger.debug(f"Processed {i} restaurants so far")
+        yield restaurant_to_doc(restaurant)
+
+def restaurant_to_doc(restaurant: Dict[str, Any]) -> Document:
+    """
+    Convert one restaurant record into its document for vector storage.
+    
+    Args:
+        restaurant: Restaurant dictionary
         
-        text_content = f"Restaurant Name: {restaurant.get('name', '')}\n"
-        
-        # Location information
-        city = restaurant.get('city', '')
-        state = restaurant.get('state', '')
-        neighborhood = restaurant.get('neighborhood', '')
-        address = restaurant.get('street_address', '')
-        zipcode = restaurant.get('zipcode', '')
-        country = restaurant.get('country', '')
-        cross_street = restaurant.get('cross_street', '')
-        
-        location_parts = []
-        if address:
-            location_parts.append(address)
-        if neighborhood:
-            location_parts.append(f"Neighborhood: {neighborhood}")
-        if cross_street:
-            location_parts.append(f"Cross Street: {cross_street}")
-        if city:
-            location_parts.append(city)
-        if state:
-            location_parts.append(state)
-        if country:
-            location_parts.append(country)
-        if zipcode:
-            location_parts.append(zipcode)
-        
-        location_str = ", ".join(location_parts)
-        text_content += f"Location: {location_str}\n"
-        
-        # Rating and reviews
-        rating = restaurant.get('rating')
-        review_count = restaurant.get('review_count')
-        if rating is not None:
-            text_content += f"Rating: {rating}"
-        if review_count is not None:
-            text_content += f" (from {review_count} reviews)"
-            text_content += "\n"
-        
-        # Price information
-        price = restaurant.get('price')
-        payment_options = restaurant.get('payment_options', [])
-        if price is not None:
-            text_content += f"Price Level: {price}\n"
-        if payment_options:
-            text_content += f"Payment Options: {', '.join(payment_options)}\n"
-        
-        # Cuisines
-        cuisines = restaurant.get('cuisines', [])
-        if cuisines:
-            text_content += f"Cuisines: {', '.join(cuisines)}\n"
-        
-        # Tags (for additional food types, ambiance, etc.)
-        tags = restaurant.get('tags', [])
-        if tags:
-            text_content += f"Tags: {', '.join(tags)}\n"
-        
-        # Popular dishes
-        popular_dishes = restaurant.get('popular_dishes', [])
-        if popular_dishes:
-            text_content += f"Popular Dishes: {', '.join(popular_dishes)}\n"
-        
-        # Description or endorsement
-        description = restaurant.get('description')
-        endorsement = restaurant.get('endorsement_copy')
-        if description:
-            text_content += f"Description: {description}\n"
-        elif endorsement:
-            text_content += f"Description: {endorsement}\n"
-        
-        # Featured in publications
-        featured_in = restaurant.get('featured_in')
-        if featured_in:
-            text_content += f"Featured in: {featured_in}\n"
-        
-        # Contact details
-        phone_number = restaurant.get('phone_number', '')
-        restaurant_url = restaurant.get('restaurant_url', '')
-        if phone_number and restaurant_url:
-            text_content += f"Phone number is {phone_number} and restaurant url is {restaurant_url}."
-        elif phone_number:
-            text_content += f"Phone number is {phone_number}."
-        elif restaurant_url:
-            text_content += f"The restaurant url is {restaurant_url}."
-        
-        # Additional amenities
-        if restaurant.get('reservations_required') is True:
-            text_content += "Reservations required.\n"
-        
-        if restaurant.get('dining_style'):
-            text_content += f"Dining style: {restaurant.get('dining_style')}\n"
-        
-        if restaurant.get('parking_details'):
-            text_content += f"Parking: {restaurant.get('parking_details')}\n"
-        
-        if restaurant.get('public_transport'):
-            text_content += f"Public transport: {restaurant.get('public_transport')}\n"
-        
-        # Create document for vectorstore with rich metadata
-        metadata = {
-            "id": restaurant.get("id") if restaurant.get("id") else None,
-            "name": restaurant.get("name") if restaurant.get("name") else None,
-            "location": location_str,
-            "price": restaurant.get("price") if restaurant.get("price") else None,
-            "restaurant_url": restaurant.get("restaurant_url") if restaurant.get("restaurant_url") else None,
-            "images_url": restaurant.get("images_url") if restaurant.get("images_url") else None,
-            "coordinates": restaurant.get("location_geom", {}).get("coordinates") if restaurant.get("location_geom") else None,
-            "original_data": restaurant
-        }
-        docs.append(Document(page_content=text_content, metadata=metadata))
+    Returns:
+        The Document
+    """
+    text_content = f"Restaurant Name: {restaurant.get('name', '')}\n"
     
-    logger.info(f"Finished preparing {len(docs)} restaurant documents")
-    return docs
\ No newline at end of file
+    # Location information
+    city = restaurant.get('city', '')
+    state = restaurant.get('state', '')
+    neighborhood = restaurant.get('neighborhood', '')
+    address = restaurant.get('street_address', '')
+    zipcode = restaurant.get('zipcode', '')
+    country = restaurant.get('country', '')
+    cross_street = restaurant.get('cross_street', '')
+    
+    location_parts = []
+    if address:
+        location_parts.append(address)
+    if neighborhood:
+        location_parts.append(f"Neighborhood: {neighborhood}")
+    if cross_street:
+        location_parts.append(f"Cross Street: {cross_street}")
+    if city:
+        location_parts.append(city)
+    if state:
+        location_parts.append(state)
+    if country:
+        location_parts.append(country)
+    if zipcode:
+        location_parts.append(zipcode)
+    
+    location_str = ", ".join(location_parts)
+    text_content += f"Location: {location_str}\n"
+    
+    # Rating and reviews
+    rating = restaurant.get('rating')
+    review_count = restaurant.get('review_count')
+    if rating is not None:
+        text_content += f"Rating: {rating}"
+    if review_count is not None:
+        text_content += f" (from {review_count} reviews)"
+        text_content += "\n"
+    
+    # Price information
+    price = restaurant.get('price')
+    payment_options = restaurant.get('payment_options', [])
+    if price is not None:
+        text_content += f"Price Level: {price}\n"
+    if payment_options:
+        text_content += f"Payment Options: {', '.join(payment_options)}\n"
+    
+    # Cuisines
+    cuisines = restaurant.get('cuisines', [])
+    if cuisines:
+        text_content += f"Cuisines: {', '.join(cuisines)}\n"
+    
+    # Tags (for additional food types, ambiance, etc.)
+    tags = restaurant.get('tags', [])
+    if tags:
+        text_content += f"Tags: {', '.join(tags)}\n"
+    
+    # Popular dishes
+    popular_dishes = restaurant.get('popular_dishes', [])
+    if popular_dishes:
+        text_content += f"Popular Dishes: {', '.join(popular_dishes)}\n"
+    
+    # Description or endorsement
+    description = restaurant.get('description')
+    endorsement = restaurant.get('endorsement_copy')
+    if description:
+        text_content += f"Description: {description}\n"
+    elif endorsement:
+        text_content += f"Description: {endorsement}\n"
+    
+    # Featured in publications
+    featured_in = restaurant.get('featured_in')
+    if featured_in:
+        text_content += f"Featured in: {featured_in}\n"
+    
+    # Contact details
+    phone_number = restaurant.get('phone_number', '')
+    restaurant_url = restaurant.get('restaurant_url', '')
+    if phone_number and restaurant_url:
+        text_content += f"Phone number is {phone_number} and restaurant url is {restaurant_url}."
+    elif phone_number:
+        text_content += f"Phone number is {phone_number}."
+    elif restaurant_url:
+        text_content += f"The restaurant url is {restaurant_url}."
+    
+    # Additional amenities
+    if restaurant.get('reservations_required') is True:
+        text_content += "Reservations required.\n"
+    
+    if restaurant.get('dining_style'):
+        text_content += f"Dining style: {restaurant.get('dining_style')}\n"
+    
+    if restaurant.get('parking_details'):
+        text_content += f"Parking: {restaurant.get('parking_details')}\n"
+    
+    if restaurant.get('public_transport'):
+        text_content += f"Public transport: {restaurant.get('public_transport')}\n"
+    
+    # Create document for vectorstore with rich metadata
+    metadata = {
+        "id": restaurant.get("id") if restaurant.get("id") else None,
+        "name": restaurant.get("name") if restaurant.get("name") else None,
+        "location": location_str,
+        "price": restaurant.get("price") if restaurant.get("price") else None,
+        "restaurant_url": restaurant.get("restaurant_url") if restaurant.get("restaurant_url") else None,
+        "images_url": restaurant.get("images_url") if restaurant.get("images_url") else None,
+        "coordinates": restaurant.get("location_geom", {}).get("coordinates") if restaurant.get("location_geom") else None
+    }  # the full record lives in the restaurant store, keyed by id
+    return Document(page_content=text_content, metadata=metadata)
+
+
+# Common location abbreviations users type, mapped to the dataset's city/state names
+LOCATION_ALIASES = {
+    "nyc": "new york",
+    "ny": "new york",
+    "manhattan": "new york",
+    "sf": "san francisco",
+    "la": "los angeles",
+    "philly": "philadelphia",
+    "dc": "washington",
+    "chi": "chicago",
+    "vegas": "las vegas",
+}
+
+# Words users use for price, mapped to the dataset's "$" price levels
+PRICE_ALIASES = {
+    "cheap": 1, "inexpensive": 1, "budget": 1, "affordable": 1,
+    "moderate": 2, "mid-range": 2, "midrange": 2, "reasonable": 2,
+    "expensive": 3, "pricey": 3, "upscale": 3,
+    "luxury": 4, "fine dining": 4, "very expensive": 4,
+}
+
+def normalize_price(value: Any) -> Optional[int]:
+    """
+    Normalize a price ("$$", 2, "2", "cheap") to an integer price level.
+    
+    Args:
+        value: The raw price value from the dataset or the user
+        
+    Returns:
+        Price level from 1 to 4, or None if it cannot be interpreted
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = normalize_term(value)
+    if text and set(text) == {"$"}:
+        return len(text)
+    if text.isdigit():
+        return int(text)
+    return PRICE_ALIASES.get(text)
+
+class RestaurantMetadataIndex:
+    """
+    Inverted index from metadata values (cuisine, tag, city, neighborhood, state, price,
+    payment option) to sets of restaurant ids, used to narrow the candidate set before
+    vector search so hard constraints are enforced instead of left to the LLM.
+    """
+    FIELDS = ("cuisine", "tag", "city", "state", "neighborhood", "price", "payment_option")
+    
+    def __init__(self):
+        """Initialize an empty index."""
+        self.postings = {field: defaultdict(set) for field in self.FIELDS}
+        self.all_ids = set()
+    
+    def add(self, restaurant: Dict[str, Any]) -> None:
+        """
+        Add one restaurant to the index.
+        
+        Args:
+            restaurant: Restaurant dictionary as loaded from the JSON file
+        """
+        restaurant_id = restaurant.get("id")
+        if not restaurant_id:
+            return
+        self.all_ids.add(restaurant_id)
+        
+        for cuisine in restaurant.get("cuisines") or []:
+            self.postings["cuisine"][normalize_term(cuisine)].add(restaurant_id)
+        for tag in restaurant.get("tags") or []:
+            self.postings["tag"][normalize_term(tag)].add(restaurant_id)
+        for payment_option in restaurant.get("payment_options") or []:
+            self.postings["payment_option"][normalize_term(payment_option)].add(restaurant_id)
+        for field in ("city", "state", "neighborhood"):
+            if restaurant.get(field):
+                self.postings[field][normalize_term(restaurant[field])].add(restaurant_id)
+        # Boroughs and other metro cities are also found under their metro, as in the index shards
+        metro = INDEX_SHARD_METROS.get(normalize_term(restaurant.get("city") or ""))
+        if metro:
+            self.postings["city"][metro].add(restaurant_id)
+        
+        price_level = normalize_price(restaurant.get("price"))
+        if price_level is not None:
+            self.postings["price"][price_level].add(restaurant_id)
+    
+    def lookup(self, field: str, value: Any) -> Set[str]:
+        """
+        Exact lookup of a single normalized value.
+        
+        Args:
+            field: One of FIELDS
+            value: The value to look up
+            
+        Returns:
+            Set of matching restaurant ids (empty if none)
+        """
+        key = normalize_price(value) if field == "price" else normalize_term(value)
+        return self.postings[field].get(key, set())
+    
+    def match_phrase(self, fields, text: str) -> Set[str]:
+        """
+        Find restaurants whose value for any of the given fields occurs as a whole
+        phrase in the text, e.g. "Italian food" matches the cuisine "italian".
+        States are also matched before LOCATION_ALIASES rewrite the text, so "NY"
+        finds the state "ny" as well as the city "new york".
+        
+        Args:
+            fields: Field names to search
+            text: Free text from the user's preferences
+            
+        Returns:
+            Union of the matching restaurant ids
+        """
+        tokens = normalize_term(text).split()
+        raw = f" {' '.join(tokens)} "
+        padded = f" {' '.join(LOCATION_ALIASES.get(token, token) for token in tokens)} "
+        matches = set()
+        for field in fields:
+            for key, ids in self.postings[field].items():
+                if key and (f" {key} " in padded or (field == "state" and f" {key} " in raw)):
+                    matches |= ids
+        return matches
+    
+    def candidate_ids(self, preferences: Dict[str, Any]) -> Optional[Set[str]]:
+        """
+        Compute the candidate restaurant ids satisfying the user's hard constraints.
+        
+        Values within a field are OR-ed, fields are AND-ed. Values that match nothing in
+        the vocabulary are ignored. If the constraints together match no restaurant, they
+        are relaxed in order (features, price, cuisine) and location is kept the longest.
+        
+        Args:
+            preferences: The user_preferences extracted from the query
+            
+        Returns:
+            Set of candidate ids, or None if no recognized constraint applies
+        """
+        constraints = []  # (name, ids) in relaxation order: last entries are dropped first
+        
+        location = preferences.get("location")
+        if location:
+            location_ids = self.match_phrase(("city", "neighborhood", "state"), location)
+            if location_ids:
+                constraints.append(("location", location_ids))
+        
+        cuisine_ids = set()
+        for cuisine in _as_list(preferences.get("cuisine_type")):
+            cuisine_ids |= self.lookup("cuisine", cuisine) or self.match_phrase(("cuisine", "tag"), cuisine)
+        if cuisine_ids:
+            constraints.append(("cuisine", cuisine_ids))
+        
+        price_level = normalize_price(preferences.get("price"))
+        if price_level is not None and self.postings["price"].get(price_level):
+            constraints.append(("price", self.postings["price"][price_level]))
+        
+        for feature in _as_list(preferences.get("special_features")):
+            feature_ids = self.match_phrase(("tag", "payment_option"), feature)
+            if feature_ids:
+                constraints.append((f"feature:{feature}", feature_ids))
+        
+        if not constraints:
+            return None
+        
+        while constraints:
+            candidates = set.intersection(*(ids for _, ids in constraints))
+            if candidates:
+                logger.debug(f"Metadata pre-filter kept {len(candidates)} of {len(self.all_ids)} restaurants using {[name for name, _ in constraints]}")
+                return candidates
+            dropped, _ = constraints.pop()
+            logger.debug(f"No restaurant satisfies all constraints, relaxing '{dropped}'")
+        return None
+
+def _as_list(value) -> List[Any]:
+    """Wrap a scalar preference value in a list; None/empty becomes an empty list."""
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def build_metadata_index(restaurants) -> RestaurantMetadataIndex:
+    """
+    Build the metadata inverted index from restaurant records.
+    
+    Args:
+        restaurants: Iterable of restaurant dictionaries
+        
+    Returns:
+        The populated RestaurantMetadataIndex
+    """
+    index = RestaurantMetadataIndex()
+    for restaurant in restaurants:
+        index.add(restaurant)
+    logger.info(f"Built metadata index over {len(index.all_ids)} restaurants")
+    return index
+
+@lru_cache(maxsize=1)
+def get_metadata_index(json_file_path: str = RESTAURANTS_JSON_PATH) -> RestaurantMetadataIndex:
+    """
+    Get the process-wide metadata index, building it from the restaurant data on first use.
+    
+    Args:
+        json_file_path: Path to the JSON file containing restaurant data
+        
+    Returns:
+        The RestaurantMetadataIndex
+    """
+    return build_metadata_index(iter_restaurants(json_file_path))
@@ -0,0 +1,150 @@
+"""
+Compact, id-keyed store of full restaurant records for the restaurant agent.
+
+The FAISS docstore only keeps ids and a small display payload. Full records live in
+a records file of individually zlib-compressed JSON blobs, with a side index of
+id -> (offset, length). The records file is memory-mapped and a record is only
+decoded when a handler asks for it, so workers share the page cache instead of
+each unpickling every record.
+"""
+import json
+import mmap
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from zeal.backend.logger import logger
+from zeal.backend.config import RESTAURANTS_JSON_PATH, RESTAURANT_STORE_PATH, RESTAURANT_RECORD_CACHE_SIZE
+from zeal.backend.database.restaurant_loader import iter_restaurants
+from zeal.backend.database.file_lock import file_lock
+
+def restaurant_store_path(index_dir: str) -> str:
+    """Records file that belongs to a FAISS index directory."""
+    return os.path.join(index_dir, os.path.basename(RESTAURANT_STORE_PATH))
+
+def _offsets_path(path: str) -> str:
+    """Path of the id -> (offset, length) index that belongs to a records file."""
+    return path + ".offsets.json"
+
+def store_exists(path: str) -> bool:
+    """Whether both files of a store exist."""
+    return os.path.exists(path) and os.path.exists(_offsets_path(path))
+
+def write_restaurant_store(restaurants: Iterable[Dict[str, Any]], path: str = RESTAURANT_STORE_PATH) -> int:
+    """
+    Write restaurant records to a compact store, streaming them one at a time.
+    Both files are written next to their final names and renamed into place, so
+    readers never see a half-written store.
+    
+    Args:
+        restaurants: Iterable of restaurant dictionaries
+        path: Records file to write
+        
+    Returns:
+        Number of records written
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_suffix = f".{os.getpid()}.tmp"
+    offsets = {}
+    offset = 0
+    with open(path + temp_suffix, "wb") as file:
+        for restaurant in restaurants:
+            restaurant_id = restaurant.get("id")
+            if not restaurant_id or restaurant_id in offsets:
+                continue
+            blob = zlib.compress(json.dumps(restaurant, separators=(",", ":")).encode("utf-8"))
+            file.write(blob)
+            offsets[restaurant_id] = (offset, len(blob))
+            offset += len(blob)
+    with open(_offsets_path(path) + temp_suffix, "w", encoding="utf-8") as file:
+        json.dump(offsets, file, separators=(",", ":"))
+    os.replace(path + temp_suffix, path)
+    os.replace(_offsets_path(path) + temp_suffix, _offsets_path(path))
+    logger.info(f"Wrote {len(offsets)} restaurant records ({offset} bytes) to {path}")
+    return len(offsets)
+
+class RestaurantStore:
+    """Read-only, memory-mapped view of a records file with a small LRU of decoded records."""
+    def __init__(self, path: str = RESTAURANT_STORE_PATH, cache_size: int = RESTAURANT_RECORD_CACHE_SIZE):
+        """
+        Open a store written by write_restaurant_store.
+        
+        Args:
+            path: Records file
+            cache_size: Number of decoded records kept in memory
+        """
+        self.path = path
+        with open(_offsets_path(path), "r", encoding="utf-8") as file:
+            self.offsets = json.load(file)
+        self._file = open(path, "rb")
+        size = os.path.getsize(path)
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, restaurant_id: str) -> bool:
+        return restaurant_id in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def get(self, restaurant_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the full record of a restaurant.
+        
+        Args:
+            restaurant_id: The restaurant id
+            
+        Returns:
+            The restaurant dictionary, or None if the id is unknown
+        """
+        with self._lock:
+            record = self._cache.get(restaurant_id)
+            if record is not None:
+                self._cache.move_to_end(restaurant_id)
+                return record
+        
+        location = self.offsets.get(restaurant_id)
+        if location is None:
+            return None
+        offset, length = location
+        record = json.loads(zlib.decompress(self._data[offset:offset + length]).decode("utf-8"))
+        
+        with self._lock:
+            self._cache[restaurant_id] = record
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def get_many(self, restaurant_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Get the records of several restaurants, skipping unknown ids."""
+        records = (self.get(restaurant_id) for restaurant_id in restaurant_ids)
+        return [record for record in records if record is not None]
+
+@lru_cache(maxsize=1)
+def get_restaurant_store(path: str = RESTAURANT_STORE_PATH, json_file_path: str = RESTAURANTS_JSON_PATH) -> RestaurantStore:
+    """
+    Get the process-wide restaurant store, writing it from the catalog if it does not exist yet.
+    One process writes a missing store; the others wait for it and open the result.
+    
+    Args:
+        path: Records file
+        json_file_path: Catalog used when the store has to be written
+        
+    Returns:
+        The RestaurantStore
+    """
+    if not store_exists(path):
+        with file_lock(path + ".lock"):
+            if not store_exists(path):
+                logger.info(f"No restaurant store at {path}, writing it from {json_file_path}")
+                write_restaurant_store(iter_restaurants(json_file_path), path)
+    return RestaurantStore(path)
+
+def refresh_restaurant_store(json_file_path: str = RESTAURANTS_JSON_PATH, path: str = RESTAURANT_STORE_PATH) -> None:
+    """Rewrite the store from the catalog and make this process reopen it."""
+    write_restaurant_store(iter_restaurants(json_file_path), path)
+    get_restaurant_store.cache_clear()
@@ -0,0 +1,326 @@
+"""
+Per-city index shards for the restaurant agent's recommendation search.
+
+The global index is split into one FAISS index per city (cities listed in
+INDEX_SHARD_METROS join their metro's shard; cities with fewer than
+INDEX_SHARD_MIN_RESTAURANTS restaurants share one shard per state). Shards are cut
+from the vectors already in the global index, so nothing is re-embedded, and are
+rebuilt whenever the global index file changes.
+
+A query's location is routed to the shards whose city, metro, neighborhood or state
+names it mentions; several matching shards are searched in parallel and the results
+merged by score. Without a location, or when it matches no shard, the global index
+(which every process keeps loaded anyway) is searched instead of every shard. Shards
+are loaded on first use and at most INDEX_SHARD_MAX_RESIDENT stay loaded per process.
+Workers build stale shards one at a time, under the index directory lock.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from zeal.backend.logger import logger
+from zeal.backend.config import (
+    RESTAURANTS_JSON_PATH, FAISS_INDEX_DIR, FAISS_INDEX_MMAP, FAISS_SEARCH_PARAMS, INDEX_SHARDING,
+    INDEX_SHARD_METROS, INDEX_SHARD_MIN_RESTAURANTS, INDEX_SHARD_MAX_RESIDENT, INDEX_SHARD_WORKERS
+)
+from zeal.backend.database.ann_index import create_index, load_index_config
+from zeal.backend.database.mapped_index import INDEX_FILE
+from zeal.backend.database.incremental_index import index_lock
+from zeal.backend.database.restaurant_loader import iter_restaurants, LOCATION_ALIASES
+from zeal.backend.database.text_utils import normalize_term
+from zeal.backend.database.vector_store import (
+    setup_retriever_with_persistence, load_faiss_index, save_faiss_index, get_restaurant_positions,
+    search_restaurants_by_vector_with_scores
+)
+
+SHARDS_DIR = "shards"  # inside the global index directory
+SHARDS_MANIFEST = "shards.json"
+
+def _slug(text: str) -> str:
+    """File-system safe shard name."""
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-") or "unknown"
+
+def _source_stamp(index_dir: str) -> List[int]:
+    """Size and modification time of the global index file, identifying the index shards were cut from."""
+    stat = os.stat(os.path.join(index_dir, INDEX_FILE))
+    return [stat.st_size, stat.st_mtime_ns]
+
+def assign_shards(restaurants) -> Tuple[Dict[str, str], Dict[str, Set[str]]]:
+    """
+    Decide the shard of every restaurant from its city and state.
+
+    Args:
+        restaurants: Iterable of restaurant dictionaries
+
+    Returns:
+        Tuple of (restaurant id -> shard name, shard name -> normalized location names it covers)
+    """
+    places = {}  # restaurant id -> (metro, state, names)
+    metro_counts = defaultdict(int)
+    for restaurant in restaurants:
+        if not restaurant.get("id"):
+            continue
+        city = normalize_term(restaurant.get("city") or "")
+        state = normalize_term(restaurant.get("state") or "")
+        metro = INDEX_SHARD_METROS.get(city, city)
+        names = {name for name in (city, metro, state, normalize_term(restaurant.get("neighborhood") or "")) if name}
+        places[restaurant["id"]] = (metro, state, names)
+        metro_counts[(metro, state)] += 1
+
+    shard_of = {}
+    shard_names = defaultdict(set)
+    for restaurant_id, (metro, state, names) in places.items():
+        if metro and metro_counts[(metro, state)] >= INDEX_SHARD_MIN_RESTAURANTS:
+            shard = _slug(f"{metro} {state}")
+        else:
+            shard = _slug(f"other {state}")
+        shard_of[restaurant_id] = shard
+        shard_names[shard] |= names
+    return shard_of, shard_names
+
+def build_shards(vector_store: FAISS, restaurants_json_path: str, index_dir: str) -> None:
+    """
+    Cut per-city shards from a global index and save them, with their manifest, to
+    the shards directory of the index, replacing the previous shards.
+
+    Args:
+        vector_store: The global FAISS vector store (heap-loaded or mapped)
+        restaurants_json_path: The restaurant catalog, for each restaurant's city and state
+        index_dir: The global FAISS index directory
+    """
+    shard_of, shard_names = assign_shards(iter_restaurants(restaurants_json_path))
+    config = {name: value for name, value in load_index_config(index_dir).items() if name != "factory"}
+    shard_positions = defaultdict(list)
+    for restaurant_id, positions in get_restaurant_positions(vector_store).items():
+        if restaurant_id in shard_of:
+            shard_positions[shard_of[restaurant_id]].extend(positions)
+
+    shards_dir = os.path.join(index_dir, SHARDS_DIR)
+    build_dir = f"{shards_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    manifest = {"source": _source_stamp(index_dir), "shards": {}}
+    for shard, positions in sorted(shard_positions.items()):
+        positions.sort()
+        vectors = vector_store.index.reconstruct_batch(np.array(positions, dtype=np.int64))
+        docstore_ids = [vector_store.index_to_docstore_id[position] for position in positions]
+        docs = {docstore_id: vector_store.docstore.search(docstore_id) for docstore_id in docstore_ids}
+        shard_config = dict(config)
+        shard_store = FAISS(vector_store.embedding_function, create_index(shard_config, vectors),
+                            InMemoryDocstore(docs), dict(enumerate(docstore_ids)))
+        save_faiss_index(shard_store, os.path.join(build_dir, shard), shard_config)
+        manifest["shards"][shard] = {
+            "names": sorted(shard_names[shard]),
+            "ids": sorted({doc.metadata["id"] for doc in docs.values() if isinstance(doc, Document) and doc.metadata.get("id")}),
+        }
+    with open(os.path.join(build_dir, SHARDS_MANIFEST), "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+
+    # Swap directories; processes still mapping the old shard files keep their pages
+    old_dir = f"{shards_dir}.{os.getpid()}.old"
+    if os.path.isdir(shards_dir):
+        os.replace(shards_dir, old_dir)
+    os.replace(build_dir, shards_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logger.info(f"Built {len(manifest['shards'])} index shards from {vector_store.index.ntotal} vectors in {shards_dir}")
+
+def shards_current(index_dir: str) -> bool:
+    """Whether the saved shards were cut from the current global index file."""
+    try:
+        with open(os.path.join(index_dir, SHARDS_DIR, SHARDS_MANIFEST), "r", encoding="utf-8") as file:
+            return json.load(file)["source"] == _source_stamp(index_dir)
+    except (OSError, ValueError, KeyError):
+        return False
+
+class ShardedIndex:
+    """Location-routed search over per-city shards, loaded lazily and kept in an LRU."""
+    def __init__(self, shards_dir: str, global_store: FAISS, max_resident: int = INDEX_SHARD_MAX_RESIDENT,
+                 workers: int = INDEX_SHARD_WORKERS):
+        """
+        Open the shards written by build_shards. No shard is loaded until searched.
+
+        Args:
+            shards_dir: The shards directory
+            global_store: The global FAISS vector store, searched for unrouted queries
+            max_resident: Number of shards kept loaded
+            workers: Threads searching shards in parallel
+        """
+        self.shards_dir = shards_dir
+        self.global_store = global_store
+        self.embedding_model = global_store.embedding_function
+        self.max_resident = max_resident
+        with open(os.path.join(shards_dir, SHARDS_MANIFEST), "r", encoding="utf-8") as file:
+            manifest = json.load(file)["shards"]
+        self.shard_names = list(manifest)
+        self.routes = defaultdict(set)  # normalized location name -> shard names
+        self.shard_of = {}  # restaurant id -> shard name
+        for shard, entry in manifest.items():
+            for name in entry["names"]:
+                self.routes[name].add(shard)
+            for restaurant_id in entry["ids"]:
+                self.shard_of[restaurant_id] = shard
+        self.resident = OrderedDict()  # shard name -> FAISS vector store, least recently used first
+        self.load_locks = defaultdict(threading.Lock)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="index-shard")
+        self.loads = 0
+        self.evictions = 0
+        self.routed_searches = 0
+        self.global_searches = 0
+
+    def route(self, location: Optional[str]) -> Optional[Set[str]]:
+        """
+        Shards covering the places a location text mentions.
+
+        Args:
+            location: Location from the user's preferences, e.g. "Brooklyn" or "NYC, Boston"
+
+        Returns:
+            The matching shard names, or None if the location is empty or matches no shard
+        """
+        if not location:
+            return None
+        tokens = [LOCATION_ALIASES.get(token, token) for token in normalize_term(location).split()]
+        padded = f" {' '.join(tokens)} "
+        shards = set()
+        for name, name_shards in self.routes.items():
+            if f" {name} " in padded:
+                shards |= name_shards
+        return shards or None
+
+    def get_shard(self, shard: str) -> FAISS:
+        """
+        Return a loaded shard, loading it (mapped when FAISS_INDEX_MMAP is set) on first
+        use and evicting the least recently used shard beyond max_resident.
+        """
+        with self.lock:
+            if shard in self.resident:
+                self.resident.move_to_end(shard)
+                return self.resident[shard]
+            load_lock = self.load_locks[shard]
+        with load_lock:
+            with self.lock:
+                if shard in self.resident:
+                    return self.resident[shard]
+            shard_dir = os.path.join(self.shards_dir, shard)
+            vector_store = None
+            if FAISS_INDEX_MMAP:
+                vector_store = load_faiss_index(shard_dir, self.embedding_model, mmap=True, search_params=FAISS_SEARCH_PARAMS)
+            if vector_store is None:
+                vector_store = load_faiss_index(shard_dir, self.embedding_model, search_params=FAISS_SEARCH_PARAMS)
+            if vector_store is None:
+                raise RuntimeError(f"Could not load index shard {shard}")
+            with self.lock:
+                self.resident[shard] = vector_store
+                self.loads += 1
+                while len(self.resident) > self.max_resident:
+                    evicted, _ = self.resident.popitem(last=False)
+                    self.evictions += 1
+                    logger.debug(f"Evicted index shard {evicted}")
+            return vector_store
+
+    def _search_shard(self, shard: str, embedding: List[float], k: int,
+                      candidate_ids: Optional[set]) -> List[Tuple[Document, float]]:
+        """Search one shard, returning (document, score) pairs."""
+        return search_restaurants_by_vector_with_scores(self.get_shard(shard), embedding, k, candidate_ids)
+
+    def search_with_scores(self, embedding: List[float], k: int = 5, candidate_ids: Optional[set] = None,
+                           location: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """
+        Search the shards a location routes to and merge the results, or the global
+        index when the location routes to no shard.
+
+        Args:
+            embedding: Query embedding
+            k: Number of documents to return
+            candidate_ids: Restaurant ids allowed in the results (None means all); of the
+                routed shards, only those holding a candidate are searched
+            location: Location from the user's preferences
+
+        Returns:
+            (document, score) pairs ordered by similarity
+        """
+        routed = self.route(location)
+        if routed is None:
+            # Every shard would be searched (and loaded), while the global index is resident
+            with self.lock:
+                self.global_searches += 1
+            return search_restaurants_by_vector_with_scores(self.global_store, embedding, k, candidate_ids)
+
+        targets = {shard: None for shard in routed}
+        if candidate_ids is not None:
+            by_shard = defaultdict(set)
+            for restaurant_id in candidate_ids:
+                shard = self.shard_of.get(restaurant_id)
+                if shard is not None:
+                    by_shard[shard].add(restaurant_id)
+            # Candidates outside the routed shards (relaxed constraints) are searched where they are
+            targets = {shard: ids for shard, ids in by_shard.items() if shard in routed} or dict(by_shard) or targets
+
+        with self.lock:
+            self.routed_searches += 1
+        if len(targets) == 1:
+            shard, ids = next(iter(targets.items()))
+            return self._search_shard(shard, embedding, k, ids)[:k]
+
+        futures = [self.executor.submit(self._search_shard, shard, embedding, k, ids) for shard, ids in targets.items()]
+        results = [result for future in futures for result in future.result()]
+        # Shards share the global index's metric: smaller L2 distances, larger inner products are better
+        descending = self.get_shard(next(iter(targets))).index.metric_type == faiss.METRIC_INNER_PRODUCT
+        results.sort(key=lambda result: result[1], reverse=descending)
+        return results[:k]
+
+    def search(self, embedding: List[float], k: int = 5, candidate_ids: Optional[set] = None,
+               location: Optional[str] = None) -> List[Document]:
+        """Like search_with_scores, returning only the documents."""
+        return [doc for doc, _ in self.search_with_scores(embedding, k, candidate_ids, location)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return shard counts, resident shards, loads, evictions and routed vs. global searches."""
+        with self.lock:
+            return {
+                "shards": len(self.shard_names),
+                "resident": list(self.resident),
+                "max_resident": self.max_resident,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "routed_searches": self.routed_searches,
+                "global_searches": self.global_searches,
+            }
+
+@lru_cache(maxsize=1)
+def get_sharded_index(restaurants_json_path: str = RESTAURANTS_JSON_PATH,
+                      index_dir: str = FAISS_INDEX_DIR) -> Optional[ShardedIndex]:
+    """
+    Get the process-wide sharded index, cutting the shards from the global index
+    first if they are missing or stale.
+
+    Args:
+        restaurants_json_path: Path to the JSON file containing restaurant data
+        index_dir: The global FAISS index directory
+
+    Returns:
+        The ShardedIndex, or None if sharding is disabled or the shards could not be built
+    """
+    if not INDEX_SHARDING:
+        return None
+    vector_store = setup_retriever_with_persistence(restaurants_json_path, index_dir).vectorstore
+    try:
+        if not shards_current(index_dir):
+            with index_lock(index_dir):
+                # Another worker may have built them while this one waited
+                if not shards_current(index_dir):
+                    build_shards(vector_store, restaurants_json_path, index_dir)
+        return ShardedIndex(os.path.join(index_dir, SHARDS_DIR), vector_store)
+    except Exception as e:
+        logger.error(f"Index shards unavailable, searching the global index: {e}", exc_info=True)
+        return None
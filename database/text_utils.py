@@ -0,0 +1,68 @@
+"""
+Text normalization and fuzzy matching helpers for the restaurant agent.
+"""
+import re
+from typing import Any, Optional, Set
+
+def normalize_term(value: Any) -> str:
+    """
+    Normalize a vocabulary term or user phrase for index lookups.
+    
+    Args:
+        value: The raw value
+        
+    Returns:
+        Lowercased text with punctuation collapsed to single spaces
+    """
+    return re.sub(r"[^a-z0-9$&]+", " ", str(value).lower()).strip()
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Character trigrams of a normalized string, padded so short words still produce grams.
+    
+    Args:
+        text: Normalized text
+        
+    Returns:
+        Set of 3-character substrings
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Edit distance between two strings, counting an adjacent transposition ("sqaure" ->
+    "square") as one edit (optimal string alignment), with an optional early-exit bound.
+    
+    Args:
+        a: First string
+        b: Second string
+        max_distance: Stop and return max_distance + 1 once the distance is known to exceed it
+        
+    Returns:
+        The number of single-character edits needed to turn a into b
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            distance = min(
+                previous[j] + 1,                        # deletion
+                current[j - 1] + 1,                     # insertion
+                previous[j - 1] + (char_a != char_b)    # substitution
+            )
+            if before_previous is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before_previous[j - 2] + 1)  # transposition
+            current.append(distance)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return previous[-1]
@@ -2,50 +2,168 @@
 FAISS indexing and retrieval functions for the restaurant agent.
 """
 import os
+import weakref
 from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
 from langchain_community.vectorstores import FAISS
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain_openai import OpenAIEmbeddings
 from zeal.backend.logger import logger
-from zeal.backend.config import EMBEDDING_MODEL, RESTAURANTS_JSON_PATH, FAISS_INDEX_DIR
-from zeal.backend.database.restaurant_loader import load_restaurants, prepare_restaurant_docs
+from zeal.backend.config import (
+    EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, RESTAURANTS_JSON_PATH, FAISS_INDEX_DIR, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_PATH,
+    INDEX_SYNC_ON_STARTUP, FAISS_INDEX_MMAP, FAISS_SEARCH_PARAMS, USE_FAKE_LLM
+)
+from zeal.backend.database.ann_index import configure_loaded_index, search_parameters, load_index_config, save_index_config
+from zeal.backend.database.embedding_cache import CachedEmbeddings
+from zeal.backend.memory.cache import set_cache_version
+from zeal.backend.database.incremental_index import sync_index, catalog_changed, index_lock, index_version
+from zeal.backend.database.mapped_index import (
+    load_mapped_index, write_mapped_docstore, has_mapped_docstore, restamp_side_files, check_loaded_index,
+    index_stamp, STAMP_KEY
+)
 
 from dotenv import load_dotenv
 load_dotenv(".env")
 
-def save_faiss_index(vector_store, directory_path: str) -> None:
+# Files written by FAISS.save_local: {INDEX_NAME}.faiss (vectors) and {INDEX_NAME}.pkl (docstore),
+# renamed into place in this order (see check_loaded_index)
+INDEX_NAME = "index"
+INDEX_EXTENSIONS = ("faiss", "pkl")
+
+FAKE_EMBEDDING_DIMENSIONS = 1536  # text-embedding-3-small without shortening, so fake queries fit a real index
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Get the process-wide embedding client shared by indexing, retrieval and the semantic cache.
+    Query embeddings are cached, so a text embedded by the analyzer is free for retrieval.
+    With EMBEDDING_DIMENSIONS set, the API returns shortened vectors. With USE_FAKE_LLM,
+    deterministic offline vectors are returned instead, and nothing is spilled to disk.
+    
+    Returns:
+        The embedding model instance
+    """
+    if USE_FAKE_LLM:
+        logger.info("Using offline fake embeddings")
+        return CachedEmbeddings(DeterministicFakeEmbedding(size=EMBEDDING_DIMENSIONS or FAKE_EMBEDDING_DIMENSIONS),
+                                model="fake", max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+    logger.debug("Created new embedding model instance")
+    return CachedEmbeddings(
+        OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS),
+        model=f"{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL,
+        max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        path=EMBEDDING_CACHE_PATH
+    )
+
+def embed_text(text: str) -> Optional[List[float]]:
     """
-    Save a FAISS vector store to disk.
+    Embed a query text, returning None instead of raising so callers can skip
+    embedding-based features (like the semantic cache) when the API is unavailable.
+    
+    Args:
+        text: Text to embed
+        
+    Returns:
+        The embedding, or None on error
+    """
+    try:
+        return get_embeddings().embed_query(text)
+    except Exception as e:
+        logger.warning(f"Error embedding text: {e}")
+        return None
+
+async def aembed_text(text: str) -> Optional[List[float]]:
+    """
+    Async version of embed_text.
+    
+    Args:
+        text: Text to embed
+        
+    Returns:
+        The embedding, or None on error
+    """
+    try:
+        return await get_embeddings().aembed_query(text)
+    except Exception as e:
+        logger.warning(f"Error embedding text: {e}")
+        return None
+
+def save_faiss_index(vector_store, directory_path: str, config: Optional[dict] = None) -> None:
+    """
+    Save a FAISS vector store to disk, with its index config and the docstore side files
+    used in mapped mode. The files are written under temporary names and renamed into
+    place: rewriting index.faiss in place would crash (SIGBUS) every process that has it
+    mapped, while a rename leaves them reading the old file until they reload.
+    The config and side files are stamped with the new index file and written before it
+    is renamed, so readers can tell when the files on disk come from two saves.
+    A failed save removes the temporary files and re-raises, so callers never record
+    an index as saved (manifest, build checkpoints) that is not on disk.
     
     Args:
         vector_store: The FAISS vector store to save
         directory_path: The directory path where the index will be saved
+        config: Index configuration (ann_index.index_config); defaults to the saved one
     """
+    temp_name = f"{INDEX_NAME}.{os.getpid()}.tmp"
+    previous_config = load_index_config(directory_path)
+    config_written = index_replaced = False
     try:
         logger.info(f"Saving FAISS index to {directory_path}")
-        vector_store.save_local(directory_path)
+        vector_store.save_local(directory_path, index_name=temp_name)
+        stamp = index_stamp(os.path.join(directory_path, f"{temp_name}.faiss"))
+        save_index_config(directory_path, {**(previous_config if config is None else config), STAMP_KEY: stamp})
+        config_written = True
+        write_mapped_docstore(vector_store, directory_path, stamp)
+        for extension in INDEX_EXTENSIONS:
+            os.replace(os.path.join(directory_path, f"{temp_name}.{extension}"),
+                       os.path.join(directory_path, f"{INDEX_NAME}.{extension}"))
+            index_replaced = True
         logger.info(f"Successfully saved FAISS index to {directory_path}")
     except Exception as e:
         logger.error(f"Error saving FAISS index: {e}", exc_info=True)
+        if config_written and not index_replaced:
+            # The old index file stays in place, so does the config describing it
+            save_index_config(directory_path, previous_config)
+        for extension in INDEX_EXTENSIONS:
+            temp_path = os.path.join(directory_path, f"{temp_name}.{extension}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
 
-def load_faiss_index(directory_path: str, embedding_model=None) -> FAISS:
+def load_faiss_index(directory_path: str, embedding_model=None, mmap: bool = False, search_params=None) -> FAISS:
     """
     Load a FAISS vector store from disk.
     
     Args:
         directory_path: The directory path where the index is stored
         embedding_model: The embedding model to use (optional if saved with the index)
+        mmap: Map the index read-only and serve documents from the side file instead of
+            reading everything into this process; a mapped store must not be modified
+        search_params: Overrides of the search parameters persisted with the index (nprobe, ef_search)
     
     Returns:
         A FAISS vector store
     """
     try:
-        logger.info(f"Loading FAISS index from {directory_path}")
+        logger.info(f"Loading FAISS index from {directory_path}{' (memory-mapped)' if mmap else ''}")
         if embedding_model is None:
-            embedding_model = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-            logger.debug("Created new embedding model instance")
+            embedding_model = get_embeddings()
         
-        vector_store = FAISS.load_local(directory_path, embedding_model, allow_dangerous_deserialization=True)
+        if mmap:
+            vector_store = load_mapped_index(directory_path, embedding_model)
+            if vector_store is None:
+                return None
+        else:
+            stamp = index_stamp(os.path.join(directory_path, f"{INDEX_NAME}.faiss"))
+            vector_store = FAISS.load_local(directory_path, embedding_model, allow_dangerous_deserialization=True)
+            if not check_loaded_index(vector_store, directory_path, stamp):
+                logger.warning(f"Index files in {directory_path} changed while loading (save in progress)")
+                return None
+        configure_loaded_index(vector_store, directory_path, search_params)
         logger.info(f"Successfully loaded FAISS index from {directory_path}")
         return vector_store
     except Exception as e:
@@ -63,32 +181,79 @@ def create_and_save_index(restaurants_json_path: str, index_dir: str) -> FAISS:
     Returns:
         A FAISS vector store
     """
-    logger.info(f"Creating new FAISS index from {restaurants_json_path}")
-    restaurants = load_restaurants(restaurants_json_path)
-    logger.debug(f"Loaded {len(restaurants)} restaurants")
+    # Imported here: the index builder itself builds on this module
+    from zeal.backend.database.index_builder import build_index
     
-    docs = prepare_restaurant_docs(restaurants)
-    logger.debug(f"Prepared {len(docs)} documents")
-    
-    logger.info("Creating embedding model and vector store")
+    logger.info(f"Creating new FAISS index from {restaurants_json_path}")
     try:
-        embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-        vector_store = FAISS.from_documents(docs, embeddings)
-        logger.info("Successfully created FAISS vector store")
-        
-        # Save the index
-        save_faiss_index(vector_store, index_dir)
-        
+        # Batched, concurrent embedding that resumes from checkpoints after a failed build
+        vector_store, summary = build_index(restaurants_json_path, index_dir)
+        logger.info(f"Successfully created FAISS vector store ({summary['docs_per_second']} docs/s)")
         return vector_store
     except Exception as e:
         logger.error(f"Error creating vector store: {e}", exc_info=True)
         raise
 
+def _map_index(vector_store: FAISS, index_dir: str, embeddings) -> FAISS:
+    """
+    In mapped mode, swap a heap-loaded index that matches the saved files (just built,
+    synced or loaded) for the memory-mapped copy, so this process does not keep its own copy.
+    Indexes saved before mapped mode, or whose side files carry another stamp, get their
+    side files (re)written here.
+    """
+    if not FAISS_INDEX_MMAP:
+        return vector_store
+    try:
+        if not has_mapped_docstore(index_dir):
+            restamp_side_files(vector_store, index_dir)
+    except OSError as e:
+        logger.error(f"Could not write the mapped docstore, keeping the index in memory: {e}")
+        return vector_store
+    return load_faiss_index(index_dir, embeddings, mmap=True, search_params=FAISS_SEARCH_PARAMS) or vector_store
+
+def index_exists(index_dir: str) -> bool:
+    """Whether an index has been saved to a directory."""
+    return os.path.isfile(os.path.join(index_dir, f"{INDEX_NAME}.faiss"))
+
+def _sync_or_build_index(restaurants_json_path: str, index_dir: str, embeddings) -> FAISS:
+    """
+    Load, sync or build the persisted index. Called under index_lock, since all but
+    the first step write to the index directory.
+    """
+    if index_exists(index_dir):
+        logger.info(f"Found existing FAISS index at {index_dir}")
+        vector_store = None
+        if FAISS_INDEX_MMAP and not (INDEX_SYNC_ON_STARTUP and catalog_changed(restaurants_json_path, index_dir)):
+            # Another process may have synced the index while this one waited for the lock
+            vector_store = load_faiss_index(index_dir, embeddings, mmap=True, search_params=FAISS_SEARCH_PARAMS)
+        if vector_store is not None:
+            return vector_store
+        
+        vector_store = load_faiss_index(index_dir, embeddings, search_params=FAISS_SEARCH_PARAMS)
+        
+        # If loading failed, create a new index
+        if vector_store is None:
+            logger.warning("Failed to load existing index. Creating a new one...")
+            return _map_index(create_and_save_index(restaurants_json_path, index_dir), index_dir, embeddings)
+        if INDEX_SYNC_ON_STARTUP:
+            # Embed only restaurants added or changed since the index was saved
+            try:
+                sync_index(vector_store, restaurants_json_path, index_dir)
+            except Exception as e:
+                # The in-memory copy may be partly synced, so it is not swapped for the saved files
+                logger.error(f"Incremental index sync failed, serving the persisted index: {e}", exc_info=True)
+                return vector_store
+        return _map_index(vector_store, index_dir, embeddings)
+    
+    logger.info(f"No existing index found at {index_dir}. Creating a new one...")
+    return _map_index(create_and_save_index(restaurants_json_path, index_dir), index_dir, embeddings)
+
 @lru_cache(maxsize=1)
 def setup_retriever_with_persistence(restaurants_json_path: str = RESTAURANTS_JSON_PATH, 
                                     index_dir: str = FAISS_INDEX_DIR) -> VectorStoreRetriever:
     """
     Sets up a retriever using a persisted FAISS index if available, otherwise creates and saves a new index.
+    Only one process at a time syncs or builds the index; the others wait for it and map the result.
     
     Args:
         restaurants_json_path: Path to the JSON file containing restaurant data
@@ -97,19 +262,16 @@ def setup_retriever_with_persistence(restaurants_json_path: str = RESTAURANTS_JS
     Returns:
         A VectorStoreRetriever
     """
-    # Check if index exists
-    if os.path.exists(index_dir) and os.path.isdir(index_dir):
-        logger.info(f"Found existing FAISS index at {index_dir}")
-        embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
-        vector_store = load_faiss_index(index_dir, embeddings)
-        
-        # If loading failed, create a new index
-        if vector_store is None:
-            logger.warning("Failed to load existing index. Creating a new one...")
-            vector_store = create_and_save_index(restaurants_json_path, index_dir)
-    else:
-        logger.info(f"No existing index found at {index_dir}. Creating a new one...")
-        vector_store = create_and_save_index(restaurants_json_path, index_dir)
+    embeddings = get_embeddings()
+    vector_store = None
+    if index_exists(index_dir) and not (INDEX_SYNC_ON_STARTUP and catalog_changed(restaurants_json_path, index_dir)):
+        # Nothing to sync: map (or load) the persisted index without taking the lock
+        vector_store = load_faiss_index(index_dir, embeddings, mmap=FAISS_INDEX_MMAP, search_params=FAISS_SEARCH_PARAMS)
+    if vector_store is None:
+        with index_lock(index_dir):
+            vector_store = _sync_or_build_index(restaurants_json_path, index_dir, embeddings)
+    # Cached results are only reused while this version of the index is served
+    set_cache_version(index_version(index_dir))
     
     # Create and return the retriever
     retriever = vector_store.as_retriever(
@@ -119,3 +281,165 @@ def setup_retriever_with_persistence(restaurants_json_path: str = RESTAURANTS_JS
 
     logger.info("Created and configured vector store retriever")
     return retriever
+
+# Candidate sets smaller than this fraction of the index are searched with an id restriction;
+# larger ones are cheaper to search globally and post-filter
+PREFILTER_MAX_FRACTION = 0.5
+
+# Per-vector-store map of restaurant id -> FAISS row positions (built lazily, freed with the store)
+_RESTAURANT_POSITIONS = weakref.WeakKeyDictionary()
+
+def get_restaurant_positions(vector_store: FAISS) -> dict:
+    """
+    Map restaurant ids to the FAISS row positions of their documents.
+    
+    Args:
+        vector_store: The FAISS vector store
+        
+    Returns:
+        Dictionary of restaurant id -> list of row positions
+    """
+    positions = _RESTAURANT_POSITIONS.get(vector_store)
+    if positions is None:
+        positions = {}
+        for position, docstore_id in vector_store.index_to_docstore_id.items():
+            doc = vector_store.docstore.search(docstore_id)
+            if isinstance(doc, Document) and doc.metadata.get("id"):
+                positions.setdefault(doc.metadata["id"], []).append(position)
+        _RESTAURANT_POSITIONS[vector_store] = positions
+        logger.debug(f"Mapped {len(positions)} restaurant ids to FAISS positions")
+    return positions
+
+def invalidate_restaurant_positions(vector_store: FAISS) -> None:
+    """Forget the id -> position map of a vector store whose rows were added or deleted."""
+    _RESTAURANT_POSITIONS.pop(vector_store, None)
+
+def get_restaurant_documents(vector_store: FAISS, restaurant_ids: Iterable[str]) -> List[Document]:
+    """
+    Fetch the indexed documents for known restaurant ids, without any search.
+    
+    Args:
+        vector_store: The FAISS vector store
+        restaurant_ids: Restaurant ids, in the order the documents should be returned
+        
+    Returns:
+        One document per restaurant id found in the index
+    """
+    restaurant_positions = get_restaurant_positions(vector_store)
+    positions = [restaurant_positions[restaurant_id][0] for restaurant_id in restaurant_ids if restaurant_id in restaurant_positions]
+    return _documents_for_positions(vector_store, positions)
+
+def _prepare_query_vector(vector_store: FAISS, embedding: List[float]) -> np.ndarray:
+    """Convert a query embedding into the (1, d) float32 array FAISS expects."""
+    vector = np.array([embedding], dtype=np.float32)
+    if getattr(vector_store, "_normalize_L2", False):
+        vector /= np.linalg.norm(vector, axis=1, keepdims=True)
+    return vector
+
+def _documents_for_positions(vector_store: FAISS, positions: Iterable[int]) -> List[Document]:
+    """Resolve FAISS row positions to their documents, skipping padding (-1) results."""
+    docs = []
+    for position in positions:
+        if position < 0:
+            continue
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(position)])
+        if isinstance(doc, Document):
+            docs.append(doc)
+    return docs
+
+def _scored_documents(vector_store: FAISS, scored_positions: Iterable[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+    """Resolve (FAISS row position, distance) pairs to (document, distance) pairs."""
+    results = []
+    for position, score in scored_positions:
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(position)])
+        if isinstance(doc, Document):
+            results.append((doc, float(score)))
+    return results
+
+def _search_subset(vector_store: FAISS, query_vector: np.ndarray, positions: List[int], k: int) -> List[Tuple[int, float]]:
+    """
+    Search only the given FAISS rows. Uses an IDSelector when the index supports
+    search parameters, otherwise scores the reconstructed subset vectors by brute force.
+    Approximate indexes can return fewer than k rows from a restricted search (the
+    candidates sit in unprobed IVF lists or unvisited graph regions); the subset is
+    then scored exactly as well.
+    
+    Args:
+        vector_store: The FAISS vector store
+        query_vector: Query array of shape (1, d)
+        positions: FAISS row positions to restrict the search to
+        k: Number of results
+        
+    Returns:
+        (row position, distance) pairs ordered from best to worst
+    """
+    index = vector_store.index
+    k = min(k, len(positions))
+    try:
+        selector = faiss.IDSelectorBatch(np.array(positions, dtype=np.int64))
+        distances, result_positions = index.search(query_vector, k, params=search_parameters(index, selector))
+        found = [(int(position), float(distance)) for position, distance in zip(result_positions[0], distances[0]) if position >= 0]
+        if len(found) == k:
+            return found
+        logger.debug(f"Restricted search found {len(found)} of {k} rows, scoring candidate subset directly")
+    except (TypeError, RuntimeError, AttributeError) as e:
+        logger.debug(f"IDSelector search unavailable ({e}), scoring candidate subset directly")
+    
+    vectors = np.vstack([index.reconstruct(int(position)) for position in positions])
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        scores = vectors @ query_vector[0]
+        order = np.argsort(-scores)
+    else:
+        scores = ((vectors - query_vector[0]) ** 2).sum(axis=1)
+        order = np.argsort(scores)
+    return [(positions[i], float(scores[i])) for i in order[:k]]
+
+def search_restaurants_by_vector_with_scores(vector_store: FAISS, embedding: List[float], k: int = 5,
+                                             candidate_ids: Optional[set] = None) -> List[Tuple[Document, float]]:
+    """
+    Vector search for restaurants with their index scores (L2 distances, or inner
+    products for inner-product indexes), optionally restricted to a candidate id set.
+    
+    Args:
+        vector_store: The FAISS vector store
+        embedding: Query embedding
+        k: Number of documents to return
+        candidate_ids: Restaurant ids allowed in the results (None means all)
+        
+    Returns:
+        (document, score) pairs ordered by similarity
+    """
+    if candidate_ids is None:
+        return vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+    
+    restaurant_positions = get_restaurant_positions(vector_store)
+    positions = [position for restaurant_id in candidate_ids for position in restaurant_positions.get(restaurant_id, [])]
+    if not positions:
+        logger.debug("No indexed documents for the candidate restaurants, searching the full index")
+        return vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+    
+    if len(positions) > PREFILTER_MAX_FRACTION * vector_store.index.ntotal:
+        # Large candidate set: over-fetch from the full index and post-filter
+        results = vector_store.similarity_search_with_score_by_vector(embedding, k=k, fetch_k=max(4 * k, 20),
+                                                                      filter=lambda metadata: metadata.get("id") in candidate_ids)
+        if results:
+            return results
+    
+    query_vector = _prepare_query_vector(vector_store, embedding)
+    return _scored_documents(vector_store, _search_subset(vector_store, query_vector, positions, k))
+
+def search_restaurants_by_vector(vector_store: FAISS, embedding: List[float], k: int = 5,
+                                 candidate_ids: Optional[set] = None) -> List[Document]:
+    """
+    Vector search for restaurants, optionally restricted to a candidate id set.
+    
+    Args:
+        vector_store: The FAISS vector store
+        embedding: Query embedding
+        k: Number of documents to return
+        candidate_ids: Restaurant ids allowed in the results (None means all)
+        
+    Returns:
+        Matching documents ordered by similarity
+    """
+    return [doc for doc, _ in search_restaurants_by_vector_with_scores(vector_store, embedding, k, candidate_ids)]
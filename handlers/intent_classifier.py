@@ -0,0 +1,230 @@
+"""
+Local fast-path intent classification for the restaurant agent.
+
+A tiered classifier that runs before the LLM query analyzer:
+1. Keyword/regex rules for unambiguous messages (greetings, thanks, farewells)
+2. A multinomial Naive Bayes model over word unigrams and bigrams, trained at
+   startup on a small labeled set
+
+A prediction is only used when its confidence reaches LOCAL_INTENT_MIN_CONFIDENCE;
+otherwise the LLM analyzer decides.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from zeal.backend.logger import logger
+from zeal.backend.config import LOCAL_INTENT_MIN_CONFIDENCE
+from zeal.backend.database.text_utils import normalize_term
+
+INTENT_TRAINING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_train.jsonl")
+
+INTENTS = ("restaurant_recommendation", "specific_restaurant_info", "casual_conversation")
+
+# Whole-message patterns that are casual conversation with near certainty
+CASUAL_PATTERNS = [
+    re.compile(r"^(hi|hello|hey|hiya|yo|howdy|greetings)( there| again)?[\s!.]*$"),
+    re.compile(r"^good (morning|afternoon|evening|night)[\s!.]*$"),
+    re.compile(r"^(thanks|thank you|thx|ty|cheers|much appreciated|appreciate it)( so much| a lot| again)?[\s!.]*$"),
+    re.compile(r"^(bye|goodbye|see you|see ya|later|take care)( later| soon| for now)?[\s!.]*$"),
+    re.compile(r"^(ok|okay|cool|nice|great|awesome|alright|sure|got it|sounds good)[\s!.]*$"),
+]
+
+def tokenize(text: str) -> List[str]:
+    """Split a message into normalized word tokens."""
+    return normalize_term(text.replace("'", "")).split()
+
+def extract_features(text: str) -> List[str]:
+    """
+    Word unigram and bigram features for the linear model.
+    
+    Args:
+        text: The user message
+        
+    Returns:
+        List of feature strings (bigrams are joined with "__")
+    """
+    tokens = tokenize(text)
+    bigrams = [f"{first}__{second}" for first, second in zip(tokens, tokens[1:])]
+    return tokens + bigrams
+
+class NaiveBayesIntentModel:
+    """Multinomial Naive Bayes with Laplace smoothing over n-gram features."""
+    def __init__(self, alpha: float = 1.0):
+        """
+        Initialize an untrained model.
+        
+        Args:
+            alpha: Additive smoothing parameter
+        """
+        self.alpha = alpha
+        self.log_priors = {}
+        self.log_likelihoods = {}
+        self.log_unseen = {}
+        self.vocabulary = set()
+    
+    def fit(self, texts: Iterable[str], labels: Iterable[str]) -> "NaiveBayesIntentModel":
+        """
+        Train the model.
+        
+        Args:
+            texts: Training messages
+            labels: Intent label for each message
+            
+        Returns:
+            The trained model
+        """
+        feature_counts = defaultdict(Counter)
+        label_counts = Counter()
+        for text, label in zip(texts, labels):
+            label_counts[label] += 1
+            feature_counts[label].update(extract_features(text))
+            self.vocabulary.update(extract_features(text))
+        
+        total = sum(label_counts.values())
+        vocabulary_size = len(self.vocabulary)
+        for label, count in label_counts.items():
+            self.log_priors[label] = math.log(count / total)
+            denominator = sum(feature_counts[label].values()) + self.alpha * vocabulary_size
+            self.log_likelihoods[label] = {
+                feature: math.log((feature_count + self.alpha) / denominator)
+                for feature, feature_count in feature_counts[label].items()
+            }
+            self.log_unseen[label] = math.log(self.alpha / denominator)
+        return self
+    
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """
+        Posterior probability of each intent.
+        
+        Args:
+            text: The user message
+            
+        Returns:
+            Dictionary of intent -> probability
+        """
+        features = [feature for feature in extract_features(text) if feature in self.vocabulary]
+        scores = {}
+        for label, log_prior in self.log_priors.items():
+            likelihoods = self.log_likelihoods[label]
+            scores[label] = log_prior + sum(likelihoods.get(feature, self.log_unseen[label]) for feature in features)
+        
+        max_score = max(scores.values())
+        exp_scores = {label: math.exp(score - max_score) for label, score in scores.items()}
+        total = sum(exp_scores.values())
+        return {label: value / total for label, value in exp_scores.items()}
+
+class LocalIntentClassifier:
+    """Rules first, then the Naive Bayes model; tracks how often it can skip the LLM."""
+    def __init__(self, model: NaiveBayesIntentModel, min_confidence: float = LOCAL_INTENT_MIN_CONFIDENCE):
+        """
+        Initialize the classifier.
+        
+        Args:
+            model: A trained NaiveBayesIntentModel
+            min_confidence: Minimum confidence for a prediction to be used
+        """
+        self.model = model
+        self.min_confidence = min_confidence
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+    
+    def predict(self, text: str) -> Tuple[str, float, str]:
+        """
+        Predict the intent without applying the confidence threshold.
+        
+        Args:
+            text: The user message
+            
+        Returns:
+            Tuple of (intent, confidence, source) where source is "rule" or "model"
+        """
+        normalized = " ".join(tokenize(text))
+        if any(pattern.match(normalized) for pattern in CASUAL_PATTERNS):
+            return "casual_conversation", 0.99, "rule"
+        
+        probabilities = self.model.predict_proba(text)
+        intent = max(probabilities, key=probabilities.get)
+        return intent, probabilities[intent], "model"
+    
+    def classify(self, text: str) -> Optional[Tuple[str, float, str]]:
+        """
+        Predict the intent and count the outcome as a hit or an LLM fallback.
+        
+        Args:
+            text: The user message
+            
+        Returns:
+            (intent, confidence, source) when confident enough, otherwise None
+        """
+        intent, confidence, source = self.predict(text)
+        confident = confidence >= self.min_confidence
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            if confident:
+                self._stats["hits"] += 1
+                self._stats[f"hits_{source}"] += 1
+                self._stats[f"hits_{intent}"] += 1
+            else:
+                self._stats["fallbacks"] += 1
+        
+        if confident:
+            logger.debug(f"Local intent classifier: {intent} ({confidence:.2f}, {source})")
+            return intent, confidence, source
+        logger.debug(f"Local intent classifier unsure ({intent} at {confidence:.2f}), falling back to LLM")
+        return None
+    
+    def is_casual(self, text: str) -> bool:
+        """Whether a message is confidently casual conversation, without counting it in the stats."""
+        intent, confidence, _ = self.predict(text)
+        return intent == "casual_conversation" and confidence >= self.min_confidence
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/fallback counters and rates since startup.
+        
+        Returns:
+            Dictionary of counters plus hit_rate and fallback_rate
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        requests = stats.get("requests", 0)
+        stats["hit_rate"] = stats.get("hits", 0) / requests if requests else 0.0
+        stats["fallback_rate"] = stats.get("fallbacks", 0) / requests if requests else 0.0
+        return stats
+
+def load_labeled_examples(path: str) -> List[Dict[str, str]]:
+    """
+    Load labeled intent examples from a JSON Lines file.
+    
+    Args:
+        path: Path to a file of {"text": ..., "intent": ...} lines
+        
+    Returns:
+        List of example dictionaries
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+@lru_cache(maxsize=1)
+def get_intent_classifier(training_path: str = INTENT_TRAINING_PATH) -> LocalIntentClassifier:
+    """
+    Get the process-wide local intent classifier, training it on first use.
+    
+    Args:
+        training_path: Path to the labeled training examples
+        
+    Returns:
+        The trained LocalIntentClassifier
+    """
+    examples = load_labeled_examples(training_path)
+    model = NaiveBayesIntentModel().fit(
+        [example["text"] for example in examples],
+        [example["intent"] for example in examples]
+    )
+    logger.info(f"Trained local intent classifier on {len(examples)} examples ({len(model.vocabulary)} features)")
+    return LocalIntentClassifier(model)
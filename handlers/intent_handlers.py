@@ -1,47 +1,212 @@
 from zeal.backend.logger import logger
 from zeal.backend.models.data_models import ChatState
+from zeal.backend.config import CONVERSATION_HISTORY_TOKEN_BUDGETS
 from zeal.backend.memory.cache import get_cached_response, set_cached_response
+from zeal.backend.memory.semantic_cache import get_semantic_cached_response, set_semantic_cached_response
 from zeal.backend.memory.conversation import CONVERSATION_MEMORY
-from zeal.backend.database.vector_store import setup_retriever_with_persistence
-from zeal.backend.llm.llm_interface import get_llm
+from zeal.backend.memory.history_window import window_messages
+from zeal.backend.database.vector_store import setup_retriever_with_persistence, search_restaurants_by_vector, get_restaurant_documents
+from zeal.backend.database.restaurant_loader import get_metadata_index
+from zeal.backend.database.sharded_index import get_sharded_index
+from zeal.backend.database.geo_index import get_geo_index, format_distance
+from zeal.backend.database.name_index import get_name_index
+from zeal.backend.database.restaurant_store import get_restaurant_store
+from zeal.backend.llm.llm_interface import get_llm, is_streaming_request, response_config
+from zeal.backend.llm.prompt_context import build_match_context
+from zeal.backend.llm.prompts import RECOMMENDATION_PROMPT, RESTAURANT_INFO_PROMPT, CASUAL_CONVERSATION_PROMPT
 
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
+from typing import List
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 # filter on the basis of the id of the restaurant
 
-from zeal.backend.logger import logger
-from zeal.backend.models.data_models import ChatState
-from zeal.backend.memory.cache import get_cached_response, set_cached_response
-from zeal.backend.memory.conversation import CONVERSATION_MEMORY
-from zeal.backend.database.vector_store import setup_retriever_with_persistence
-from zeal.backend.llm.llm_interface import get_llm
+RECOMMENDATION_ERROR_MESSAGE = "I'm sorry, I'm having trouble finding restaurant recommendations right now. Could you please try again or provide more details about what you're looking for?"
 
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
 
-def handle_restaurant_recommendation(state: ChatState) -> ChatState:
+def _get_chat_history(state: ChatState):
     """
-    Handles restaurant recommendation queries by searching the vector database
-    and returning matching restaurants, with filtering based on extended criteria
-    
+    Get the token-budgeted chat history for the session as LangChain messages
+
     Args:
         state: The current chat state
-        
+
     Returns:
-        Updated state with restaurant recommendations
+        An optional summary SystemMessage, then alternating HumanMessage/AIMessage objects
+    """
+    if not state.get("session_id"):
+        return []
+    return window_messages(*CONVERSATION_MEMORY.get_window(state["session_id"], CONVERSATION_HISTORY_TOKEN_BUDGETS["response"]))
+
+def _unique_matches(results):
+    """
+    Convert vector search results into unique restaurant matches
+
+    Args:
+        results: Documents returned by the retriever
+
+    Returns:
+        List of at most 3 restaurant match dictionaries, one per restaurant id
+    """
+    # Tracking unique restaurant IDs to avoid duplicates using set data structure
+    seen_restaurant_ids = set()
+    unique_matches = []
+
+    for doc in results:
+        metadata = doc.metadata
+        restaurant_id = metadata.get("id", "")
+
+        # Only add this restaurant if we haven't seen it before
+        if restaurant_id and restaurant_id not in seen_restaurant_ids:
+            seen_restaurant_ids.add(restaurant_id)
+            unique_matches.append({
+                "name": metadata.get("name", "Unknown Restaurant"),
+                "id": restaurant_id,
+                "content": doc.page_content,
+                "price": metadata.get("price"),
+                "restaurant_url": metadata.get("restaurant_url"),
+                "images_url": metadata.get("images_url"),
+                "coordinates": metadata.get("coordinates")
+            })
+
+            # Stop after finding 3 unique restaurants
+            if len(unique_matches) >= 3:
+                break
+
+    return unique_matches
+
+def _match_context(matches, kind: str) -> str:
+    """
+    Render matches as compact, token-budgeted prompt context. Cached matches only carry
+    the display payload; full records are read from the restaurant store on demand.
+
+    Args:
+        matches: Unique restaurant matches
+        kind: "recommendation" or "info"
+
+    Returns:
+        The rendered match context
+    """
+    store = get_restaurant_store()
+    records = {match["id"]: store.get(match["id"]) for match in matches}
+    return build_match_context(matches, records, kind)
+
+def _retrieval_scope(cache_key: str, candidate_ids=None) -> str:
+    """
+    Scope for semantic retrieval cache entries: the handler kind plus the candidate set,
+    so a similar query with different hard constraints never reuses a result
+
+    Args:
+        cache_key: The exact cache key, prefixed with the handler kind
+        candidate_ids: Optional set of candidate restaurant ids
+
+    Returns:
+        The scope string
+    """
+    kind = cache_key.split("_", 1)[0]
+    if candidate_ids is None:
+        return kind
+    return f"{kind}:{hash(frozenset(candidate_ids))}"
+
+def _search_with_embedding(vector_store, search_query: str, embedding, cache_key: str, candidate_ids=None, location=None):
+    """
+    Search by a precomputed query embedding, consulting the semantic cache first
+
+    Args:
+        vector_store: The FAISS vector store
+        search_query: Text that was embedded
+        embedding: Embedding of search_query
+        cache_key: Key under which the matches are cached
+        candidate_ids: Optional set of restaurant ids to restrict the vector search to
+        location: The requested location; when given, the per-city shards it routes to are
+            searched (an empty or unknown location searches the global index)
+
+    Returns:
+        List of unique restaurant matches
+    """
+    scope = _retrieval_scope(cache_key, candidate_ids)
+    semantic_matches = get_semantic_cached_response("retrieval", embedding, scope)
+    if semantic_matches is not None:
+        logger.info("Using semantically cached restaurant matches")
+        return semantic_matches
+
+    # Retrieve 5 results from vector search
+    sharded_index = get_sharded_index() if location is not None else None
+    if sharded_index is not None:
+        results = sharded_index.search(embedding, k=5, candidate_ids=candidate_ids, location=location)
+    else:
+        results = search_restaurants_by_vector(vector_store, embedding, k=5, candidate_ids=candidate_ids)
+    logger.debug(f"Retrieved {len(results)} results from vector search")
+
+    # Cache and use the unique matches
+    matches = _unique_matches(results)
+    set_cached_response(cache_key, matches, namespace=cache_key.split("_", 1)[0])
+    set_semantic_cached_response("retrieval", search_query, embedding, matches, scope)
+    return matches
+
+def _search_restaurants(search_query: str, cache_key: str, candidate_ids=None, location=None):
+    """
+    Search the vector store for restaurants, using the query cache when possible
+
+    Args:
+        search_query: Text to search for
+        cache_key: Key under which the matches are cached
+        candidate_ids: Optional set of restaurant ids to restrict the vector search to
+        location: The requested location, routing the search to per-city shards (None searches the global index)
+
+    Returns:
+        List of unique restaurant matches
+    """
+    cached_matches = get_cached_response(cache_key, namespace=cache_key.split("_", 1)[0])
+    if cached_matches:
+        logger.info("Using cached restaurant matches")
+        return cached_matches
+
+    retriever = setup_retriever_with_persistence()
+    logger.info("Performing vector search for restaurants")
+    embedding = retriever.vectorstore.embedding_function.embed_query(search_query)
+    return _search_with_embedding(retriever.vectorstore, search_query, embedding, cache_key, candidate_ids, location)
+
+async def _asearch_restaurants(search_query: str, cache_key: str, candidate_ids=None, location=None):
+    """
+    Async version of _search_restaurants: the query embedding call does not block the event loop
+
+    Args:
+        search_query: Text to search for
+        cache_key: Key under which the matches are cached
+        candidate_ids: Optional set of restaurant ids to restrict the vector search to
+        location: The requested location, routing the search to per-city shards (None searches the global index)
+
+    Returns:
+        List of unique restaurant matches
+    """
+    cached_matches = get_cached_response(cache_key, namespace=cache_key.split("_", 1)[0])
+    if cached_matches:
+        logger.info("Using cached restaurant matches")
+        return cached_matches
+
+    retriever = setup_retriever_with_persistence()
+    logger.info("Performing async vector search for restaurants")
+    embedding = await retriever.vectorstore.embedding_function.aembed_query(search_query)
+    return _search_with_embedding(retriever.vectorstore, search_query, embedding, cache_key, candidate_ids, location)
+
+def _build_recommendation_query(state: ChatState):
+    """
+    Build a rich search query from the latest message and the extracted search criteria
+
+    Args:
+        state: The current chat state
+
+    Returns:
+        Tuple of (search_query, search_criteria)
     """
-    
-    session_id = state.get("session_id", "unknown_session")
-    logger.info(f"Processing restaurant recommendation for session {session_id}")
-    
     search_criteria = state.get("user_preferences", {})
     logger.debug(f"Search criteria: {search_criteria}")
-    
+
     # Build a rich query from the search criteria
     query_parts = []
     last_message = state["messages"][-1].content if state["messages"] else ""
     query_parts.append(last_message)
-    
+
     # Add specific criteria
     if search_criteria.get("cuisine_type"):
         cuisines = search_criteria["cuisine_type"]
@@ -49,167 +214,119 @@ def handle_restaurant_recommendation(state: ChatState) -> ChatState:
             query_parts.append(f"Cuisine types: {', '.join(cuisines)}")
         else:
             query_parts.append(f"Cuisine type: {cuisines}")
-    
+
     if search_criteria.get("food_type"):
         food_types = search_criteria["food_type"]
         if isinstance(food_types, list):
             query_parts.append(f"Food types: {', '.join(food_types)}")
         else:
             query_parts.append(f"Food type: {food_types}")
-    
+
     if search_criteria.get("location"):
         query_parts.append(f"Location: {search_criteria['location']}")
-    
+
+    if search_criteria.get("price"):
+        query_parts.append(f"Price level: {search_criteria['price']}")
+
     if search_criteria.get("special_features"):
         special_features = search_criteria["special_features"]
         if isinstance(special_features, list):
             query_parts.append(f"Special features: {', '.join(special_features)}")
         else:
             query_parts.append(f"Special feature: {special_features}")
-    
+
     search_query = " ".join(query_parts) # Builds the complete query
     logger.info(f"Built search query: {search_query[:100]}...")
-    
-    retriever = setup_retriever_with_persistence(r"C:\Users\Rithwik Khera\OneDrive - iitr.ac.in\Desktop\assignment\zeal\100_restaurant_data.json", r"C:\Users\Rithwik Khera\OneDrive - iitr.ac.in\Desktop\assignment\zeal\restaurant_idx")
-    logger.debug("Retriever setup complete")
-
-    # Search for matching restaurants
-    # Check cache first
-    cache_key = f"recommendation_{search_query}"
-    cached_matches = get_cached_response(cache_key)
-    
-    if cached_matches:
-        logger.info("Using cached restaurant matches")
-        all_matches = cached_matches
-    else:
-        # Perform the search
-        logger.info("Performing vector search for restaurants")
-        try:
-            # Retrieve 5 results from vector search
-            results = retriever.invoke(search_query, top_k=5)
-            logger.debug(f"Retrieved {len(results)} results from vector search")
-
-            # Tracking unique restaurant IDs to avoid duplicates using set data structure
-            seen_restaurant_ids = set()
-            unique_matches = []
-
-            for doc in results:
-                metadata = doc.metadata
-                restaurant_id = metadata.get("id", "")
-                
-                # Only add this restaurant if we haven't seen it before
-                if restaurant_id and restaurant_id not in seen_restaurant_ids:
-                    seen_restaurant_ids.add(restaurant_id)
-                    unique_matches.append({
-                        "name": metadata.get("name", "Unknown Restaurant"),
-                        "id": restaurant_id,
-                        "content": doc.page_content,
-                        "price": metadata.get("price"),
-                        "restaurant_url": metadata.get("restaurant_url"),
-                        "images_url": metadata.get("images_url"),
-                        "coordinates": metadata.get("coordinates"),
-                        "original_data": metadata.get("original_data", {})
-                    })
-                    
-                    # Stop after finding 3 unique restaurants
-                    if len(unique_matches) >= 3:
-                        break
-            
-            # Cache and use the unique matches
-            all_matches = unique_matches
-            set_cached_response(cache_key, all_matches)
-        except Exception as e:
-            logger.error(f"Error during restaurant search: {e}", exc_info=True)
-            all_matches = []
-    
-    # Updates the state with the matches
-    state["restaurant_matches"] = all_matches
+    return search_query, search_criteria
+
+def _recommendation_candidates(state: ChatState, search_criteria):
+    """
+    Candidate restaurant ids for a recommendation search. Proximity requests ("near
+    Union Square", "within 1 mile of SoHo") are answered from coordinates: the place
+    is matched by distance instead of by name, within the other hard constraints
 
-    # Get chat history
-    chat_history = []
-    if "session_id" in state and state["session_id"]:
-        history = CONVERSATION_MEMORY.get_history(state["session_id"], limit=3)
-        for item in history:
-            chat_history.append(HumanMessage(content=item["user_message"]))
-            chat_history.append(AIMessage(content=item["bot_response"]))
+    Args:
+        state: The current chat state
+        search_criteria: The user's extracted preferences
+
+    Returns:
+        Tuple of (candidate ids or None, proximity request or None); the proximity
+        request carries the candidates' distances in meters under "distances"
+    """
+    last_message = state["messages"][-1].content if state["messages"] else ""
+    proximity = get_geo_index().parse_proximity(last_message, search_criteria.get("location") or "")
+    if proximity is None:
+        return get_metadata_index().candidate_ids(search_criteria), None
 
+    candidate_ids = get_metadata_index().candidate_ids({**search_criteria, "location": ""})
+    proximity["distances"] = get_geo_index().proximity_candidates(proximity, candidate_ids)
+    logger.info(f"Proximity search around {proximity['place']} ({proximity['radius']:.0f} m): {len(proximity['distances'])} candidates")
+    return set(proximity["distances"]) or candidate_ids, proximity
+
+def _with_distances(matches, proximity):
+    """
+    Add the distance from the requested place to each match, ordering matches by it
+    for "closest" requests
+
+    Args:
+        matches: Unique restaurant matches
+        proximity: Proximity request from _recommendation_candidates, or None
+
+    Returns:
+        The matches, as new dictionaries when distances were added
+    """
+    if not proximity:
+        return matches
+    distances = proximity["distances"]
+    matches = [
+        {**match, "distance": f"{format_distance(distances[match['id']])} from {proximity['place'].title()}"}
+        if match.get("id") in distances else match
+        for match in matches
+    ]
+    if proximity["nearest"]:
+        matches.sort(key=lambda match: distances.get(match.get("id"), float("inf")))
+    return matches
+
+def _build_recommendation_prompt(state: ChatState, search_query: str, search_criteria, all_matches) -> List[BaseMessage]:
+    """
+    Build the LLM prompt for a restaurant recommendation response
+
+    Args:
+        state: The current chat state
+        search_query: The search query used for retrieval
+        search_criteria: The user's extracted preferences
+        all_matches: Unique restaurant matches
+
+    Returns:
+        The messages to send to the LLM
+    """
     user_context = f"""
         User query: {search_query}
-        
+
         User's search criteria:
         {search_criteria}
-        
+
         Available restaurant matches:
-        {all_matches}  # Only using unique restaurant matches (maximum 3)
+        {_match_context(all_matches, "recommendation")}
     """
-    
-    # Generate a response using an LLM
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(
-            content="""
-                You are a restaurant recommendation assistant. Your task is to recommend restaurants based on the user's preferences and the retrieved restaurant data.
-                
-                Format your response precisely as follows:
-                1. Begin with a brief, friendly introduction (1-2 sentences only)
-                2. Present each restaurant recommendation as a numbered point
-                3. For each restaurant point, use this exact structure:
-                
-                🍽️ [RESTAURANT NAME]
-                • Cuisine: [cuisine type]
-                • Price: [price range]
-                • Notable features: [key features that match user preferences]
-                • Why it matches: [brief explanation of how it meets the user's criteria]
-                
-                4. End with a single, brief follow-up question about whether these recommendations are helpful.
-                
-                IMPORTANT: Do not recommend the same restaurant more than once, even if it appears multiple times in the data. Check restaurant "id" carefully and ensure each recommendation is for a unique restaurant. If you've already suggested a restaurant with a particular "id", do not suggest it again even if it has different details.
-
-                Keep your response concise and well-structured with clear formatting for easy readability.
-            """
-        ),
-        *chat_history,
-        HumanMessage(content=user_context)
-    ])
-    
-    try:
-        llm = get_llm(temperature=0.2)
-        chain = prompt | llm
-        
-        logger.info("Sending recommendation request to LLM")
-        response = chain.invoke({})
-        logger.debug(f"Received LLM response of length {len(response.content)}")
-        
-        # Add the response to the messages
-        state["messages"].append(AIMessage(content=response.content))
-        logger.info("Added restaurant recommendation response to state")
-        
-    except Exception as e:
-        logger.error(f"Error generating restaurant recommendation: {e}", exc_info=True)
-        error_msg = "I'm sorry, I'm having trouble finding restaurant recommendations right now. Could you please try again or provide more details about what you're looking for?"
-        state["messages"].append(AIMessage(content=error_msg))
-    
-    return state 
 
-def handle_restaurant_info(state: ChatState) -> ChatState:
+    return RECOMMENDATION_PROMPT.assemble(_get_chat_history(state), [HumanMessage(content=user_context)], state.get("session_id"))
+
+def _build_restaurant_info_query(state: ChatState) -> str:
     """
-    Handles queries about specific restaurants by searching for that restaurant
-    and providing detailed information
-    
+    Build a query focused on the restaurant name
+
     Args:
         state: The current chat state
-        
+
     Returns:
-        Updated state with specific restaurant information
+        The complete search query
     """
-    
-    session_id = state.get("session_id", "unknown_session")
-    logger.info(f"Processing specific restaurant info for session {session_id}")
-
     last_message = state["messages"][-1].content if state["messages"] else ""
-    
+
     # Build a query focused on the restaurant name
     query_parts = [last_message]
-    
+
     if state.get("specific_restaurant"):
         restaurant_names = state["specific_restaurant"]
         if isinstance(restaurant_names, list):
@@ -218,172 +335,284 @@ def handle_restaurant_info(state: ChatState) -> ChatState:
         else:
             query_parts.append(f"Restaurant name: {restaurant_names}")
             logger.debug(f"Looking for specific restaurant: {restaurant_names}")
-    
+
     # Build the complete query
     search_query = " ".join(query_parts)
     logger.info(f"Built restaurant info query: {search_query[:100]}...")
-    
-    # Set up retriever if not already done
-    retriever = setup_retriever_with_persistence(r"C:\Users\Rithwik Khera\OneDrive - iitr.ac.in\Desktop\assignment\zeal\100_restaurant_data.json", r"C:\Users\Rithwik Khera\OneDrive - iitr.ac.in\Desktop\assignment\zeal\restaurant_idx")  # Assuming the file path
-    
-    # Search for the restaurant
-    # Check cache first
-    cache_key = f"info_{search_query}"
-    cached_matches = get_cached_response(cache_key)
-    
-    if cached_matches:
-        logger.info("Using cached restaurant info matches")
-        matches = cached_matches
-    else:
-        # Perform the search
-        logger.info("Performing vector search for specific restaurant info")
-        # Retrieve more results initially to ensure we can find at least 3 unique restaurants
-        results = retriever.invoke(search_query, top_k=5)
-        logger.debug(f"Retrieved {len(results)} results from vector search")
-
-        # Tracking unique restaurant IDs to avoid duplicates using set data structure
-        seen_restaurant_ids = set()
-        unique_matches = []
-        
-        # Process the results
-        for doc in results:
-            metadata = doc.metadata
-            restaurant_id = metadata.get("id", "")
-            
-            # Only add this restaurant if we haven't seen it before
-            if restaurant_id and restaurant_id not in seen_restaurant_ids:
-                seen_restaurant_ids.add(restaurant_id)
-                unique_matches.append({
-                    "name": metadata.get("name", "Unknown Restaurant"),
-                    "id": restaurant_id,
-                    "content": doc.page_content,
-                    "price": metadata.get("price"),
-                    "restaurant_url": metadata.get("restaurant_url"),
-                    "images_url": metadata.get("images_url"),
-                    "coordinates": metadata.get("coordinates"),
-                    "original_data": metadata.get("original_data", {})
-                })
-                
-                # Stop after finding 3 unique restaurants
-                if len(unique_matches) >= 3:
-                    break
-
-        # Cache and use the unique matches
-        matches = unique_matches
-        set_cached_response(cache_key, matches)
-            
-    # Update the state with the matches
-    state["restaurant_matches"] = matches
-    
-    # Get chat history
-    chat_history = []
-    if "session_id" in state and state["session_id"]:
-        history = CONVERSATION_MEMORY.get_history(state["session_id"], limit=3)
-        for item in history:
-            chat_history.append(HumanMessage(content=item["user_message"]))
-            chat_history.append(AIMessage(content=item["bot_response"]))
-    
+    return search_query
+
+def _lookup_named_restaurants(state: ChatState):
+    """
+    Resolve the restaurant names extracted by the analyzer through the local name index
+
+    Args:
+        state: The current chat state
+
+    Returns:
+        List of unique restaurant matches, or None if any name has no confident hit
+        (the caller then falls back to vector search)
+    """
+    restaurant_names = state.get("specific_restaurant")
+    if not restaurant_names:
+        return None
+    if not isinstance(restaurant_names, list):
+        restaurant_names = [restaurant_names]
+
+    name_index = get_name_index()
+    restaurant_ids = []
+    for name in restaurant_names:
+        resolved_ids = name_index.resolve_confident(name)
+        if not resolved_ids:
+            logger.debug(f"No confident name index hit for '{name}'")
+            return None
+        restaurant_ids.extend(resolved_ids)
+
+    retriever = setup_retriever_with_persistence()
+    docs = get_restaurant_documents(retriever.vectorstore, dict.fromkeys(restaurant_ids))
+    if not docs:
+        return None
+
+    logger.info(f"Resolved {len(restaurant_names)} restaurant name(s) through the name index")
+    return _unique_matches(docs)
+
+def _build_restaurant_info_prompt(state: ChatState, search_query: str, matches) -> List[BaseMessage]:
+    """
+    Build the LLM prompt for a specific restaurant information response
+
+    Args:
+        state: The current chat state
+        search_query: The search query used for retrieval
+        matches: Unique restaurant matches
+
+    Returns:
+        The messages to send to the LLM
+    """
     user_context = f"""
         User query: {search_query}
-        
+
         Search criteria: {state.get("specific_restaurant", [])}
-        
-        Restaurant matches: {matches}  # Using all unique matches (maximum 3)
+
+        Restaurant matches:
+        {_match_context(matches, "info")}
+    """
+
+    return RESTAURANT_INFO_PROMPT.assemble(_get_chat_history(state), [HumanMessage(content=user_context)], state.get("session_id"))
+
+def _build_casual_conversation_prompt(state: ChatState) -> List[BaseMessage]:
+    """
+    Build the LLM prompt for a casual conversation response
+
+    Args:
+        state: The current chat state
+
+    Returns:
+        The messages to send to the LLM
+    """
+    last_message = state["messages"][-1].content if state["messages"] else ""
+
+    return CASUAL_CONVERSATION_PROMPT.assemble(_get_chat_history(state), [HumanMessage(content=last_message)], state.get("session_id"))
+
+def handle_restaurant_recommendation(state: ChatState, config: RunnableConfig = None) -> ChatState:
+    """
+    Handles restaurant recommendation queries by searching the vector database
+    and returning matching restaurants, with filtering based on extended criteria
+
+    Args:
+        state: The current chat state
+        config: Per-request runnable config (callbacks, streaming flag)
+
+    Returns:
+        Updated state with restaurant recommendations
+    """
+
+    session_id = state.get("session_id", "unknown_session")
+    logger.info(f"Processing restaurant recommendation for session {session_id}")
+
+    search_query, search_criteria = _build_recommendation_query(state)
+
+    # Search for matching restaurants, narrowed to those satisfying the hard constraints
+    try:
+        candidate_ids, proximity = _recommendation_candidates(state, search_criteria)
+        # Proximity candidates may cross city lines, so they pick their shards themselves
+        location = "" if proximity else search_criteria.get("location") or ""
+        all_matches = _search_restaurants(search_query, f"recommendation_{search_query}", candidate_ids, location)
+        all_matches = _with_distances(all_matches, proximity)
+    except Exception as e:
+        logger.error(f"Error during restaurant search: {e}", exc_info=True)
+        all_matches = []
+
+    # Updates the state with the matches
+    state["restaurant_matches"] = all_matches
+
+    # Generate a response using an LLM
+    prompt = _build_recommendation_prompt(state, search_query, search_criteria, all_matches)
+
+    try:
+        llm = get_llm(temperature=0.2, streaming=is_streaming_request(config))
+
+        logger.info("Sending recommendation request to LLM")
+        response = llm.invoke(prompt, config=response_config(config))
+        logger.debug(f"Received LLM response of length {len(response.content)}")
+
+        # Add the response to the messages
+        state["messages"].append(AIMessage(content=response.content))
+        logger.info("Added restaurant recommendation response to state")
+
+    except Exception as e:
+        logger.error(f"Error generating restaurant recommendation: {e}", exc_info=True)
+        state["messages"].append(AIMessage(content=RECOMMENDATION_ERROR_MESSAGE))
+
+    return state
+
+async def ahandle_restaurant_recommendation(state: ChatState, config: RunnableConfig = None) -> ChatState:
+    """
+    Async version of handle_restaurant_recommendation for the asyncio serving path
+
+    Args:
+        state: The current chat state
+        config: Per-request runnable config (callbacks, streaming flag)
+
+    Returns:
+        Updated state with restaurant recommendations
+    """
+    session_id = state.get("session_id", "unknown_session")
+    logger.info(f"Processing restaurant recommendation for session {session_id}")
+
+    search_query, search_criteria = _build_recommendation_query(state)
+
+    try:
+        candidate_ids, proximity = _recommendation_candidates(state, search_criteria)
+        # Proximity candidates may cross city lines, so they pick their shards themselves
+        location = "" if proximity else search_criteria.get("location") or ""
+        all_matches = await _asearch_restaurants(search_query, f"recommendation_{search_query}", candidate_ids, location)
+        all_matches = _with_distances(all_matches, proximity)
+    except Exception as e:
+        logger.error(f"Error during restaurant search: {e}", exc_info=True)
+        all_matches = []
+
+    state["restaurant_matches"] = all_matches
+
+    prompt = _build_recommendation_prompt(state, search_query, search_criteria, all_matches)
+
+    try:
+        llm = get_llm(temperature=0.2, streaming=is_streaming_request(config))
+
+        logger.info("Sending recommendation request to LLM")
+        response = await llm.ainvoke(prompt, config=response_config(config))
+        logger.debug(f"Received LLM response of length {len(response.content)}")
+
+        state["messages"].append(AIMessage(content=response.content))
+        logger.info("Added restaurant recommendation response to state")
+
+    except Exception as e:
+        logger.error(f"Error generating restaurant recommendation: {e}", exc_info=True)
+        state["messages"].append(AIMessage(content=RECOMMENDATION_ERROR_MESSAGE))
+
+    return state
+
+def handle_restaurant_info(state: ChatState, config: RunnableConfig = None) -> ChatState:
     """
+    Handles queries about specific restaurants by searching for that restaurant
+    and providing detailed information
+
+    Args:
+        state: The current chat state
+        config: Per-request runnable config (callbacks, streaming flag)
+
+    Returns:
+        Updated state with specific restaurant information
+    """
+
+    session_id = state.get("session_id", "unknown_session")
+    logger.info(f"Processing specific restaurant info for session {session_id}")
+
+    search_query = _build_restaurant_info_query(state)
+
+    # Resolve named restaurants locally; only search the vector store without a confident name hit
+    matches = _lookup_named_restaurants(state)
+    if matches is None:
+        matches = _search_restaurants(search_query, f"info_{search_query}")
+
+    # Update the state with the matches
+    state["restaurant_matches"] = matches
 
     # Generate a response using an LLM
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(
-            content="""
-                You are a restaurant information assistant. Based on the user's query about a specific restaurant,
-                provide detailed information in a structured, point-by-point format.
-                
-                Format your response precisely as follows:
-                
-                If you can identify ONE specific restaurant the user is asking about:
-                
-                🍽️ [RESTAURANT NAME]
-                • Cuisine: [cuisine type]
-                • Price: [price range]
-                • Location: [location details]
-                • Highlights: [key features, specialties, or popular dishes]
-                • Hours: [if available]
-                • Contact: [if available]
-                • [Any other specific information the user requested]
-                
-                If MULTIPLE restaurants match and you're unsure which one:
-                1. Start with a brief note mentioning you found multiple matches
-                2. For each restaurant, provide a brief summary using the format above
-                3. Ask which specific restaurant they'd like more details about
-                
-                Keep your response concise with clear, consistent formatting and structure.
-            """
-        ),
-        *chat_history,
-        HumanMessage(content=user_context)
-    ])
-    
-    
-    llm = get_llm(temperature=0.2)
-    chain = prompt | llm
-    response = chain.invoke({})
-    
+    prompt = _build_restaurant_info_prompt(state, search_query, matches)
+
+    llm = get_llm(temperature=0.2, streaming=is_streaming_request(config))
+    response = llm.invoke(prompt, config=response_config(config))
+
     # Adding the response to the messages
     state["messages"].append(AIMessage(content=response.content))
     return state
 
-def handle_casual_conversation(state: ChatState) -> ChatState:
+async def ahandle_restaurant_info(state: ChatState, config: RunnableConfig = None) -> ChatState:
+    """
+    Async version of handle_restaurant_info for the asyncio serving path
+
+    Args:
+        state: The current chat state
+        config: Per-request runnable config (callbacks, streaming flag)
+
+    Returns:
+        Updated state with specific restaurant information
+    """
+    session_id = state.get("session_id", "unknown_session")
+    logger.info(f"Processing specific restaurant info for session {session_id}")
+
+    search_query = _build_restaurant_info_query(state)
+    matches = _lookup_named_restaurants(state)
+    if matches is None:
+        matches = await _asearch_restaurants(search_query, f"info_{search_query}")
+    state["restaurant_matches"] = matches
+
+    prompt = _build_restaurant_info_prompt(state, search_query, matches)
+
+    llm = get_llm(temperature=0.2, streaming=is_streaming_request(config))
+    response = await llm.ainvoke(prompt, config=response_config(config))
+
+    state["messages"].append(AIMessage(content=response.content))
+    return state
+
+def handle_casual_conversation(state: ChatState, config: RunnableConfig = None) -> ChatState:
     """
     Handles casual conversation with the user
-    
+
     Args:
         state: The current chat state
-        
+        config: Per-request runnable config (callbacks, streaming flag)
+
     Returns:
         Updated state with a casual response
     """
-    last_message = state["messages"][-1].content if state["messages"] else ""
-
-    # Get chat history
-    chat_history = []
-    if "session_id" in state and state["session_id"]:
-        history = CONVERSATION_MEMORY.get_history(state["session_id"], limit=3)
-        for item in history:
-            chat_history.append(HumanMessage(content=item["user_message"]))
-            chat_history.append(AIMessage(content=item["bot_response"]))
-    
     # Generate a casual response using an LLM
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(
-            content="""
-                You are a friendly restaurant assistant chatbot. Respond naturally to casual conversation,
-                greetings, thanks, or general questions. Be friendly, helpful, and conversational.
-                
-                If the conversation shifts to restaurants, pivot to offering structured help:
-                
-                "I can help you find restaurants based on:
-                • Cuisine type
-                • Location
-                • Price range
-                • Special features (outdoor seating, vegan options, etc.)
-                
-                Just let me know what you're looking for!"
-                
-                Keep casual responses brief and engaging. If the user is asking a non-restaurant question,
-                still be helpful but gently remind them that you specialize in restaurant recommendations
-                and information.
-            """
-        ),
-        *chat_history,
-        HumanMessage(content=last_message)
-    ])
-    
+    prompt = _build_casual_conversation_prompt(state)
+
     # Use the LLM to generate a response
-    llm = get_llm(temperature=0.2)
-    chain = prompt | llm
-    
-    response = chain.invoke({})
-    
+    llm = get_llm(temperature=0.2, streaming=is_streaming_request(config))
+
+    response = llm.invoke(prompt, config=response_config(config))
+
     # Add the response to the messages
     state["messages"].append(AIMessage(content=response.content))
-    return state
\ No newline at end of file
+    return state
+
+async def ahandle_casual_conversation(state: ChatState, config: RunnableConfig = None) -> ChatState:
+    """
+    Async version of handle_casual_conversation for the asyncio serving path
+
+    Args:
+        state: The current chat state
+        config: Per-request runnable config (callbacks, streaming flag)
+
+    Returns:
+        Updated state with a casual response
+    """
+    prompt = _build_casual_conversation_prompt(state)
+
+    llm = get_llm(temperature=0.2, streaming=is_streaming_request(config))
+
+    response = await llm.ainvoke(prompt, config=response_config(config))
+
+    state["messages"].append(AIMessage(content=response.content))
+    return state
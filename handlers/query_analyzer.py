@@ -1,15 +1,213 @@
 """
 Intent classification and information extraction for the restaurant agent.
 """
-from langchain_core.prompts import ChatPromptTemplate
+import json
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.output_parsers import JsonOutputParser
 from zeal.backend.models.data_models import ChatState
 from zeal.backend.llm.llm_interface import get_llm
+from zeal.backend.llm.prompts import ANALYSIS_PROMPT
+from zeal.backend.config import CONVERSATION_HISTORY_TOKEN_BUDGETS
 from zeal.backend.memory.conversation import CONVERSATION_MEMORY
+from zeal.backend.memory.history_window import window_messages
 from zeal.backend.memory.cache import get_cached_response, set_cached_response
+from zeal.backend.memory.semantic_cache import get_semantic_cached_response, set_semantic_cached_response
+from zeal.backend.database.vector_store import embed_text, aembed_text
+from zeal.backend.handlers.intent_classifier import get_intent_classifier
+from zeal.backend.database.gazetteer import get_gazetteer
 from zeal.backend.logger import logger
 
+PREFERENCE_FIELDS = ("cuisine_type", "food_type", "location", "price", "special_features")
+
+def _get_history_messages(state: ChatState):
+    """
+    Get the token-budgeted conversation history for the analysis prompt as LangChain messages
+    
+    Args:
+        state: The current chat state
+        
+    Returns:
+        An optional summary SystemMessage, then alternating HumanMessage/AIMessage objects, oldest first
+    """
+    if not state.get("session_id"):
+        return []
+    logger.debug(f"Retrieving conversation history for session {state['session_id']}")
+    return window_messages(*CONVERSATION_MEMORY.get_window(state["session_id"], CONVERSATION_HISTORY_TOKEN_BUDGETS["analysis"]))
+
+def _build_analysis_prompt(state: ChatState, last_message: str, local_preferences=None):
+    """
+    Assemble the messages for combined intent classification and information extraction:
+    the static analysis instructions, then the history, then the hints and the latest message
+    
+    Args:
+        state: The current chat state
+        last_message: The latest user message
+        local_preferences: Entities already extracted by the gazetteer, passed as hints
+        
+    Returns:
+        The messages to send to the LLM
+    """
+    local_entities = {field: value for field, value in (local_preferences or {}).items() if value}
+    content = []
+    if local_entities:
+        content.append(SystemMessage(content=f"Entities already recognized in the message: {json.dumps(local_entities)}"))
+    content.append(HumanMessage(content=last_message))
+    
+    logger.debug("Creating prompt for intent classification and info extraction")
+    return ANALYSIS_PROMPT.assemble(_get_history_messages(state), content, state.get("session_id"))
+
+def _get_last_message(state: ChatState) -> str:
+    """Return the latest user message, or an empty string if the last message is not from the user."""
+    messages = state["messages"]
+    return messages[-1].content if messages and isinstance(messages[-1], HumanMessage) else ""
+
+def _merge_preferences(state: ChatState, preferences) -> None:
+    """
+    Merge extracted preferences into the state. List fields are unioned; scalar fields
+    are only set when the state has no value yet.
+    
+    Args:
+        state: The current chat state
+        preferences: Extracted preferences using the user_preferences keys
+    """
+    user_preferences = state.setdefault("user_preferences", {
+        "cuisine_type": [],
+        "food_type": [],
+        "location": "",
+        "price": "",
+        "special_features": []
+    })
+    for field, value in preferences.items():
+        if not value:
+            continue
+        if isinstance(value, list):
+            existing = user_preferences.get(field) or []
+            seen = {str(item).lower() for item in existing}
+            user_preferences[field] = existing + [item for item in value if str(item).lower() not in seen]
+        elif not user_preferences.get(field):
+            user_preferences[field] = value
+
+def _analyze_locally(state: ChatState, last_message: str):
+    """
+    Run the local fast path before the LLM analyzer: the intent classifier plus the
+    gazetteer entity extractor
+    
+    Args:
+        state: The current chat state
+        last_message: The latest user message
+        
+    Returns:
+        Tuple of (handled, local_intent, local_preferences). handled is True when the LLM
+        call can be skipped entirely; local_intent is the confident local intent, if any.
+    """
+    prediction = get_intent_classifier().classify(last_message)
+    local_intent = prediction[0] if prediction else None
+    if local_intent == "casual_conversation":
+        # Nothing to extract from casual messages, so the LLM round trip is skipped
+        state["intent"] = local_intent
+        logger.info("Classified intent locally: casual_conversation, skipping LLM analysis")
+        return True, local_intent, {}
+    
+    local_preferences, leftovers = get_gazetteer().extract(last_message)
+    if local_intent == "restaurant_recommendation" and not leftovers and any(local_preferences.values()):
+        # Every meaningful word was recognized: the gazetteer result is complete
+        state["intent"] = local_intent
+        _merge_preferences(state, local_preferences)
+        if not state["user_preferences"].get("location"):
+            _carry_over_location(state)
+        logger.info(f"Analyzed query locally: {local_intent}, {local_preferences}, skipping LLM analysis")
+        return True, local_intent, local_preferences
+    
+    if leftovers:
+        logger.debug(f"Gazetteer leftovers for the LLM: {leftovers}")
+    return False, local_intent, local_preferences
+
+def _is_context_free(state: ChatState) -> bool:
+    """Whether the message opens its session. Only such turns read or write the analysis caches: later ones depend on history."""
+    return not state.get("session_id") or not CONVERSATION_MEMORY.get_history(state["session_id"], limit=1)
+
+def _apply_cached_analysis(state: ChatState, analysis) -> ChatState:
+    """
+    Apply a cached analysis of the same (or a paraphrased) message to the state
+    
+    Args:
+        state: The current chat state
+        analysis: Cached intent, the message's own preferences and the named restaurants
+        
+    Returns:
+        Updated state
+    """
+    state["intent"] = analysis["intent"]
+    _merge_preferences(state, analysis.get("preferences") or {})
+    if analysis.get("specific_restaurant"):
+        state["specific_restaurant"] = analysis["specific_restaurant"]
+    return state
+
+def _carry_over_location(state: ChatState) -> None:
+    """Reuse the location from the session's previous turn for a follow-up that names none."""
+    if not state.get("session_id"):
+        return
+    history = CONVERSATION_MEMORY.get_history(state["session_id"], limit=1)
+    if history:
+        previous_location = (history[-1].get("metadata", {}).get("preferences") or {}).get("location")
+        if previous_location:
+            state["user_preferences"]["location"] = previous_location
+            logger.debug(f"Carried over location from the previous turn: {previous_location}")
+
+def _apply_analysis_result(state: ChatState, result, cache_key: str, local_intent: str = None, local_preferences=None, embedding=None) -> ChatState:
+    """
+    Copy the LLM analysis into the state and cache it. The cached preferences are the
+    message's own, never the merged session preferences, so a hit cannot carry another
+    session's earlier turns over.
+    
+    Args:
+        state: The current chat state
+        result: Parsed JSON response from the LLM
+        cache_key: Key under which the analysis is cached, or None to skip caching
+        local_intent: Confident intent from the local classifier, which takes precedence
+        local_preferences: Gazetteer entities, which take precedence over the LLM's free-text values
+        embedding: Embedding of the message, used as the semantic cache key
+        
+    Returns:
+        Updated state with intent classification and extracted information
+    """
+    logger.debug(f"Received analysis result: {result}")
+    
+    state["intent"] = local_intent or result.get("intent", "casual_conversation")
+    logger.info(f"Classified intent: {state['intent']}")
+    
+    extracted_info = result.get("extracted_info", {})
+    logger.debug(f"Extracted information: {extracted_info}")
+    
+    # The message's own preferences: canonical vocabulary terms from the gazetteer go first
+    message_state = {}
+    _merge_preferences(message_state, local_preferences or {})
+    _merge_preferences(message_state, {field: extracted_info.get(field) for field in PREFERENCE_FIELDS})
+    preferences = message_state["user_preferences"]
+    
+    # Update user preferences with extracted information
+    _merge_preferences(state, preferences)
+    
+    # Handle restaurant names for specific_restaurant_info intent
+    if state["intent"] == "specific_restaurant_info" and "restaurant_names" in extracted_info:
+        state["specific_restaurant"] = extracted_info.get("restaurant_names", [])
+        logger.debug(f"Set specific restaurant: {state['specific_restaurant']}")
+    
+    if cache_key is None:
+        logger.info("Analysis complete")
+        return state
+    
+    # Cache the analysis for future use, exactly and semantically
+    analysis = {
+        "intent": state["intent"],
+        "preferences": preferences,
+        "specific_restaurant": state.get("specific_restaurant", None)
+    }
+    set_cached_response(cache_key, analysis, namespace="analysis")
+    set_semantic_cached_response("analysis", cache_key[len("analysis_"):], embedding, analysis)
+    logger.info("Analysis complete and cached")
+    return state
+
 def analyze_user_query(state: ChatState) -> ChatState:
     """
     Combined function to analyze the latest user query:
@@ -22,133 +220,95 @@ def analyze_user_query(state: ChatState) -> ChatState:
     Returns:
         Updated state with intent classification and extracted information
     """
-    messages = state["messages"]
-    last_message = messages[-1].content if messages and isinstance(messages[-1], HumanMessage) else ""
+    last_message = _get_last_message(state)
     session_id = state.get("session_id", "unknown_session")
     
     logger.info(f"Analyzing user query for session {session_id}")
     logger.debug(f"User query: {last_message[:100]}...")
     
     # Checks cache first for both intent and info extraction
+    context_free = _is_context_free(state)
     cache_key = f"analysis_{last_message}"
-    cached_analysis = get_cached_response(cache_key)
+    cached_analysis = get_cached_response(cache_key, namespace="analysis") if context_free else None
     if cached_analysis:
         logger.info("Using cached analysis result")
-        state.update(cached_analysis)
+        return _apply_cached_analysis(state, cached_analysis)
+    
+    handled, local_intent, local_preferences = _analyze_locally(state, last_message)
+    if handled:
         return state
     
-    # Get conversation history for context
-    conversation_history = []
-    if "session_id" in state and state["session_id"]:
-        logger.debug(f"Retrieving conversation history for session {session_id}")
-        history = CONVERSATION_MEMORY.get_history(state["session_id"], limit=5)
-        conversation_history = [
-            {"user": item["user_message"], "bot": item["bot_response"]} 
-            for item in history
-        ]
-    
-    history_context = "\n".join([
-        f"User: {item['user']}\nBot: {item['bot']}" 
-        for item in conversation_history
-    ])
-    
-    # Create a prompt for combined intent and information extraction
-    logger.debug("Creating prompt for intent classification and info extraction")
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=f"""
-        Analyze the user's message for a restaurant chatbot by:
-
-        1. CLASSIFYING THE INTENT into exactly one of these categories:
-           - restaurant_recommendation: User is looking for restaurant suggestions
-           - specific_restaurant_info: User is asking about a specific restaurant or set of restaurants
-           - casual_conversation: General greetings, farewells, or off-topic conversation
-
-        2. EXTRACTING INFORMATION relevant to their request (include only if mentioned or implied):
-           - cuisine_type: Type of cuisine (e.g., Chinese, Italian, Japanese)
-           - food_type: Specific food or dish (e.g., pasta, sushi, pizza)
-           - location: City, neighborhood, area, address, cross street, country etc.
-           - special_features: Any special requirements (e.g., outdoor dining/areaseating, payment options etc.)
-           - restaurant_name: List of "Names" of specific restaurants if mentioned, only implies when the INTENT of the query is specific_restaurant_info 
-
-        Be interpretive - if user says "nice Italian place in NYC", extract the cuisine_type(Italian), location(NYC) and a rating(nice).
-        
-        Recent conversation history (consider this for context):
-        {history_context}
-        
-        Respond with a JSON object containing both "intent" and "extracted_info" fields.
-        
-        Example response format:
-        {{
-            "intent": "restaurant_recommendation" OR "specific_restaurant_info" OR "casual_conversation",
-            "extracted_info": {{
-                "cuisine_type": ["list of cuisines mentioned or empty list"],
-                "food_type": ["list of food types mentioned or empty list"],
-                "location": "location mentioned or empty string if none",
-                "special_features": ["list of special features mentioned or empty list"],
-                "restaurant_names": ["list of restaurant names mentioned or empty list"],
-            }}
-        }}
-        
-        Only include fields that are explicitly mentioned or clearly implied in the user's message and return a strictly JSON response with no additional text as shown above in the response format.
-        """),
-        HumanMessage(content=last_message)
-    ])
+    # A paraphrase of an already analyzed opening message reuses that analysis
+    embedding = embed_text(last_message) if context_free else None
+    semantic_analysis = get_semantic_cached_response("analysis", embedding)
+    if semantic_analysis:
+        logger.info("Using semantically cached analysis result")
+        return _apply_cached_analysis(state, semantic_analysis)
+    
+    prompt = _build_analysis_prompt(state, last_message, local_preferences)
     
     # Using the LLM to analyze the query
     logger.info("Sending query to LLM for analysis")
     llm = get_llm(temperature=0)
     parser = JsonOutputParser()
-    chain = prompt | llm | parser
+    chain = llm | parser
     
     try:
-        result = chain.invoke({})
-        logger.debug(f"Received analysis result: {result}")
-        
-        state["intent"] = result.get("intent", "casual_conversation")
-        logger.info(f"Classified intent: {state['intent']}")
-        
-        extracted_info = result.get("extracted_info", {})
-        logger.debug(f"Extracted information: {extracted_info}")
-        
-        # Initialize or update user_preferences
-        if "user_preferences" not in state:
-            state["user_preferences"] = {
-                "cuisine_type": [],
-                "food_type": [],
-                "location": "",
-                "special_features": []
-            }
-        
-        # Update user preferences with extracted information
-        if "cuisine_type" in extracted_info and extracted_info["cuisine_type"]:
-            state["user_preferences"]["cuisine_type"] = extracted_info["cuisine_type"]
-        
-        if "food_type" in extracted_info and extracted_info["food_type"]:
-            state["user_preferences"]["food_type"] = extracted_info["food_type"]
-        
-        if "location" in extracted_info and extracted_info["location"]:
-            state["user_preferences"]["location"] = extracted_info["location"]
-        
-        if "special_features" in extracted_info and extracted_info["special_features"]:
-            state["user_preferences"]["special_features"] = extracted_info["special_features"]
-        
-        # Handle restaurant names for specific_restaurant_info intent
-        if state["intent"] == "specific_restaurant_info" and "restaurant_names" in extracted_info:
-            state["specific_restaurant"] = extracted_info.get("restaurant_names", [])
-            logger.debug(f"Set specific restaurant: {state['specific_restaurant']}")
-        
-        # Cache the analysis for future use
-        set_cached_response(cache_key, {
-            "intent": state["intent"],
-            "user_preferences": state["user_preferences"],
-            "specific_restaurant": state.get("specific_restaurant", None)
-        })
-        logger.info("Analysis complete and cached")
+        result = chain.invoke(prompt)
+        _apply_analysis_result(state, result, cache_key if context_free else None, local_intent, local_preferences, embedding)
+    except Exception as e:
+        # Logs error and continues with default values (or the local classifier's intent)
+        logger.error(f"Error parsing LLM response: {e}", exc_info=True)
+        state["intent"] = local_intent or "casual_conversation"
+        logger.info(f"Defaulting to {state['intent']} intent due to error")
+    
+    return state
+
+async def aanalyze_user_query(state: ChatState) -> ChatState:
+    """
+    Async version of analyze_user_query for the asyncio serving path
+    
+    Args:
+        state: The current chat state containing messages and other context
         
+    Returns:
+        Updated state with intent classification and extracted information
+    """
+    last_message = _get_last_message(state)
+    session_id = state.get("session_id", "unknown_session")
+    
+    logger.info(f"Analyzing user query for session {session_id}")
+    
+    context_free = _is_context_free(state)
+    cache_key = f"analysis_{last_message}"
+    cached_analysis = get_cached_response(cache_key, namespace="analysis") if context_free else None
+    if cached_analysis:
+        logger.info("Using cached analysis result")
+        return _apply_cached_analysis(state, cached_analysis)
+    
+    handled, local_intent, local_preferences = _analyze_locally(state, last_message)
+    if handled:
+        return state
+    
+    embedding = await aembed_text(last_message) if context_free else None
+    semantic_analysis = get_semantic_cached_response("analysis", embedding)
+    if semantic_analysis:
+        logger.info("Using semantically cached analysis result")
+        return _apply_cached_analysis(state, semantic_analysis)
+    
+    prompt = _build_analysis_prompt(state, last_message, local_preferences)
+    
+    logger.info("Sending query to LLM for analysis")
+    llm = get_llm(temperature=0)
+    parser = JsonOutputParser()
+    chain = llm | parser
+    
+    try:
+        result = await chain.ainvoke(prompt)
+        _apply_analysis_result(state, result, cache_key if context_free else None, local_intent, local_preferences, embedding)
     except Exception as e:
-        # Logs error and continues with default values
         logger.error(f"Error parsing LLM response: {e}", exc_info=True)
-        state["intent"] = "casual_conversation"
-        logger.info("Defaulting to casual_conversation intent due to error")
+        state["intent"] = local_intent or "casual_conversation"
+        logger.info(f"Defaulting to {state['intent']} intent due to error")
     
-    return state
\ No newline at end of file
+    return state
@@ -0,0 +1,65 @@
+"""
+Offline fake chat model for testing the restaurant agent without OpenAI calls.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Iterator, AsyncIterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Marker that identifies the query analyzer's system prompt
+ANALYSIS_PROMPT_MARKER = "CLASSIFYING THE INTENT"
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that sleeps for a fixed latency and returns canned responses.
+    
+    The sync path blocks the calling thread with time.sleep while the async path
+    awaits asyncio.sleep, so it reproduces the threading vs. event-loop behaviour
+    of a real network-bound LLM call.
+    """
+    latency: float = 0.5
+    streaming: bool = False
+    analysis_intent: str = "casual_conversation"
+    response_text: str = "Hello! I can help you find restaurants by cuisine, location, price range or special features."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-restaurant-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        """Return a JSON analysis for the analyzer prompt, otherwise the canned response text."""
+        if any(ANALYSIS_PROMPT_MARKER in str(message.content) for message in messages):
+            return json.dumps({"intent": self.analysis_intent, "extracted_info": {}})
+        return self.response_text
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for word in self._respond(messages).split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for word in self._respond(messages).split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -1,35 +1,57 @@
 """
 LLM initialization and management for the restaurant agent.
 """
-import queue
 from langchain_openai import ChatOpenAI
-from langchain_core.callbacks.base import BaseCallbackHandler
-from zeal.backend.config import OPENAI_API_KEY, LLM_MODEL
+from langchain_core.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from langchain_core.runnables.config import RunnableConfig, merge_configs
+from zeal.backend.config import OPENAI_API_KEY, LLM_MODEL, USE_FAKE_LLM, FAKE_LLM_LATENCY
+from zeal.backend.llm.fake_llm import FakeChatModel
 from zeal.backend.logger import logger
 
 # Global LLM cache
 LLM_CACHE = {}  # llm_cache is a dictionary that stores AI model instances
 
+# Tag attached to the LLM call that produces the user-facing answer, so only its tokens are streamed
+RESPONSE_TAG = "final_response"
+
 # Define custom callback handler for streaming
 class StreamingCallbackHandler(BaseCallbackHandler):
-    """Callback handler for streaming responses from the AI model."""
+    """Request-scoped callback handler that forwards user-facing tokens to a queue."""
     def __init__(self, queue):
         """Initialize the callback handler with a queue for storing tokens."""
         self.queue = queue  # queue is used to stream responses in real-time
+        self.token_count = 0
         
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        """Called whenever the AI generates a new token."""
-        self.queue.put(token)
+    def on_llm_new_token(self, token: str, *, tags=None, **kwargs) -> None:
+        """Called whenever the AI generates a new token. Tokens from internal calls (e.g. query analysis) are skipped."""
+        if token and RESPONSE_TAG in (tags or []):
+            self.token_count += 1
+            self.queue.put(token)
+
+class AsyncStreamingCallbackHandler(AsyncCallbackHandler):
+    """Request-scoped async callback handler that forwards user-facing tokens to an asyncio.Queue."""
+    def __init__(self, queue):
+        """Initialize the callback handler with an asyncio queue for storing tokens."""
+        self.queue = queue
+        self.token_count = 0
+
+    async def on_llm_new_token(self, token: str, *, tags=None, **kwargs) -> None:
+        """Called whenever the AI generates a new token. Tokens from internal calls are skipped."""
+        if token and RESPONSE_TAG in (tags or []):
+            self.token_count += 1
+            await self.queue.put(token)
 
 # Initializes and retrieves the AI language model
-def get_llm(temperature=0.2, streaming=False, queue=None):
+def get_llm(temperature=0.2, streaming=False):
     """
     Get an LLM instance, reusing cached instances when possible.
     
+    Cached instances never carry callbacks; per-request callbacks are passed at
+    invocation time through the RunnableConfig so concurrent requests stay isolated.
+    
     Args:
         temperature: Temperature parameter for the LLM
         streaming: Whether to enable token-by-token streaming
-        queue: Queue for streaming tokens (required if streaming=True)
         
     Returns:
         A configured LLM instance
@@ -38,18 +60,42 @@ def get_llm(temperature=0.2, streaming=False, queue=None):
     if cache_key in LLM_CACHE:
         return LLM_CACHE[cache_key]
     
-    callbacks = []
-    if streaming and queue:
-        callbacks.append(StreamingCallbackHandler(queue))
-    
-    llm = ChatOpenAI(
-        model=LLM_MODEL,
-        temperature=temperature,
-        api_key=OPENAI_API_KEY,
-        streaming=streaming,
-        callbacks=callbacks if callbacks else None
-    )
+    if USE_FAKE_LLM:
+        llm = FakeChatModel(latency=FAKE_LLM_LATENCY, streaming=streaming)
+    else:
+        llm = ChatOpenAI(
+            model=LLM_MODEL,
+            temperature=temperature,
+            api_key=OPENAI_API_KEY,
+            streaming=streaming
+        )
     
     LLM_CACHE[cache_key] = llm
     logger.info(f"Created new LLM instance with temperature={temperature}, streaming={streaming}")
     return llm
+
+def is_streaming_request(config: RunnableConfig = None) -> bool:
+    """
+    Check whether the current graph invocation asked for a streamed response.
+    
+    Args:
+        config: The RunnableConfig passed to the graph node
+        
+    Returns:
+        True if the response tokens should be streamed
+    """
+    if not config:
+        return False
+    return bool(config.get("configurable", {}).get("stream_response", False))
+
+def response_config(config: RunnableConfig = None) -> RunnableConfig:
+    """
+    Build the invocation config for the LLM call that produces the final answer.
+    
+    Args:
+        config: The RunnableConfig passed to the graph node
+        
+    Returns:
+        The config with request callbacks preserved and the response tag added
+    """
+    return merge_configs(config, {"tags": [RESPONSE_TAG]})
@@ -0,0 +1,142 @@
+"""
+Compact, token-budgeted rendering of restaurant matches for LLM prompts.
+
+Each match is rendered as a few "Field: value" lines holding only what the answer
+needs. If the rendered context is over budget, detail is removed in stages:
+descriptions are shortened first, then dropped, then secondary fields and long lists
+are trimmed, and only as a last resort are trailing matches left out.
+"""
+from typing import Any, Dict, List, Optional
+from zeal.backend.logger import logger
+from zeal.backend.config import LLM_MODEL, PROMPT_CONTEXT_TOKEN_BUDGETS
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.encoding_for_model(LLM_MODEL)
+except Exception:  # tiktoken missing or offline: fall back to a character estimate
+    _ENCODING = None
+
+# Fields that only help answer questions about a specific restaurant
+INFO_FIELDS = ("phone_number", "hours", "reservations_required", "dining_style", "parking_details", "public_transport", "payment_options")
+
+# Detail levels, from everything to essentials only
+DETAIL_LEVELS = (
+    {"description_chars": None, "list_items": 8, "info_fields": True},
+    {"description_chars": 240, "list_items": 6, "info_fields": True},
+    {"description_chars": 100, "list_items": 5, "info_fields": True},
+    {"description_chars": 0, "list_items": 4, "info_fields": True},
+    {"description_chars": 0, "list_items": 3, "info_fields": False},
+    {"description_chars": 0, "list_items": 0, "info_fields": False},
+)
+
+def count_tokens(text: str) -> int:
+    """Count (or, without tiktoken, estimate) the tokens the chat model will see."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def _shorten(text: str, max_chars: int) -> str:
+    """Cut text at a word boundary, marking the cut with an ellipsis."""
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0].rstrip(",;:") + "…"
+
+def _join(values, max_items: int) -> str:
+    """Join the first max_items list values."""
+    values = [str(value) for value in (values or []) if value]
+    return ", ".join(values[:max_items])
+
+def _location(record: Dict[str, Any], match: Dict[str, Any]) -> str:
+    """Short location: street, neighborhood and city, falling back to the indexed location string."""
+    parts = [record.get(field) for field in ("street_address", "neighborhood", "city")]
+    return ", ".join(part for part in parts if part) or match.get("location") or ""
+
+def render_match(match: Dict[str, Any], record: Optional[Dict[str, Any]], level: Dict[str, Any], number: int) -> str:
+    """
+    Render one restaurant match as compact "Field: value" lines.
+    
+    Args:
+        match: Match dictionary from the search (name, id, price, restaurant_url, content...)
+        record: Full restaurant record from the restaurant store, if available
+        level: Detail level from DETAIL_LEVELS
+        number: Position of the match in the list
+        
+    Returns:
+        The rendered text
+    """
+    if record is None:
+        # No stored record: fall back to the indexed document text, trimmed like a description
+        content = match.get("content", "")
+        if level["description_chars"] is not None:
+            content = _shorten(content, max(level["description_chars"], 200))
+        return f"{number}. {match.get('name')} (id: {match.get('id')})\n{content}"
+    
+    lines = [f"{number}. {record.get('name') or match.get('name')} (id: {match.get('id')})"]
+    
+    def add(label, value):
+        if value not in (None, "", []):
+            lines.append(f"{label}: {value}")
+    
+    add("Location", _location(record, match))
+    add("Distance", match.get("distance"))
+    add("Price", record.get("price") or match.get("price"))
+    if record.get("rating") is not None:
+        reviews = f" ({record['review_count']} reviews)" if record.get("review_count") is not None else ""
+        add("Rating", f"{record['rating']}{reviews}")
+    add("Cuisines", _join(record.get("cuisines"), max(level["list_items"], 3)))
+    if level["list_items"]:
+        add("Tags", _join(record.get("tags"), level["list_items"]))
+        add("Popular dishes", _join(record.get("popular_dishes"), level["list_items"]))
+    
+    description = record.get("description") or record.get("endorsement_copy")
+    if description and level["description_chars"] != 0:
+        add("Description", description if level["description_chars"] is None else _shorten(description, level["description_chars"]))
+    
+    if level["info_fields"]:
+        for field in INFO_FIELDS:
+            value = record.get(field)
+            if field == "reservations_required":
+                value = "required" if value is True else None
+            elif isinstance(value, list):
+                value = _join(value, level["list_items"] or 3)
+            add(field.replace("_", " ").capitalize(), value)
+    add("Website", record.get("restaurant_url") or match.get("restaurant_url"))
+    return "\n".join(lines)
+
+def build_match_context(matches: List[Dict[str, Any]], records: Dict[str, Dict[str, Any]], kind: str,
+                        budget: Optional[int] = None) -> str:
+    """
+    Render matches into prompt context that fits a token budget.
+    
+    Args:
+        matches: Unique restaurant matches, best first
+        records: Full restaurant records keyed by restaurant id
+        kind: "recommendation" or "info", which selects the default budget and fields
+        budget: Token budget overriding the configured one
+        
+    Returns:
+        The rendered context ("No matching restaurants found." when there are none)
+    """
+    if not matches:
+        return "No matching restaurants found."
+    budget = budget or PROMPT_CONTEXT_TOKEN_BUDGETS[kind]
+    
+    levels = DETAIL_LEVELS if kind == "info" else [dict(level, info_fields=False) for level in DETAIL_LEVELS]
+    for level in levels:
+        context = "\n\n".join(render_match(match, records.get(match.get("id")), level, number)
+                              for number, match in enumerate(matches, 1))
+        tokens = count_tokens(context)
+        if tokens <= budget:
+            logger.debug(f"Rendered {len(matches)} matches for {kind} in {tokens} tokens")
+            return context
+    
+    # Even essentials are over budget: keep as many leading matches as fit (always at least one)
+    rendered = [render_match(match, records.get(match.get("id")), levels[-1], number)
+                for number, match in enumerate(matches, 1)]
+    kept = [rendered[0]]
+    for block in rendered[1:]:
+        if count_tokens("\n\n".join(kept + [block])) > budget:
+            break
+        kept.append(block)
+    logger.info(f"Match context over its {budget}-token budget, kept {len(kept)} of {len(matches)} matches")
+    return "\n\n".join(kept)
@@ -0,0 +1,230 @@
+"""
+Stable-prefix prompt assembly for the restaurant agent's LLM calls.
+
+The system prompts are compiled once at import: dedented, wrapped in their
+SystemMessage and token-counted. Every call is assembled as the same static system
+message first, then the session's history, then the per-request content (retrieval
+context, hints and the latest message). Identical leading tokens across calls let
+the provider's prompt prefix cache apply. Each call reports how much of its prompt
+could be served from that cache: the static prefix plus the history messages that
+are unchanged since the session's previous call, and nothing when that is shorter
+than the provider's minimum cacheable prefix (the static prompts alone are not).
+"""
+import inspect
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from zeal.backend.logger import logger
+from zeal.backend.config import PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_TRACKED_SESSIONS
+from zeal.backend.llm.prompt_context import count_tokens
+
+# Approximate per-message framing overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+ANALYSIS_SYSTEM_PROMPT = """
+        Analyze the user's message for a restaurant chatbot by:
+
+        1. CLASSIFYING THE INTENT into exactly one of these categories:
+           - restaurant_recommendation: User is looking for restaurant suggestions
+           - specific_restaurant_info: User is asking about a specific restaurant or set of restaurants
+           - casual_conversation: General greetings, farewells, or off-topic conversation
+
+        2. EXTRACTING INFORMATION relevant to their request (include only if mentioned or implied):
+           - cuisine_type: Type of cuisine (e.g., Chinese, Italian, Japanese)
+           - food_type: Specific food or dish (e.g., pasta, sushi, pizza)
+           - location: City, neighborhood, area, address, cross street, country etc.
+           - special_features: Any special requirements (e.g., outdoor dining/areaseating, payment options etc.)
+           - price: Price level if mentioned, as "$" to "$$$$" (cheap = "$", moderate = "$$", expensive = "$$$", luxury = "$$$$")
+           - restaurant_name: List of "Names" of specific restaurants if mentioned, only implies when the INTENT of the query is specific_restaurant_info 
+
+        Be interpretive - if user says "nice Italian place in NYC", extract the cuisine_type(Italian), location(NYC) and a rating(nice).
+        
+        Earlier turns of the conversation, if any, come before the latest user message; consider them for context.
+        A note listing entities already recognized in the message may precede it: keep those entities and only add what they miss.
+        
+        Respond with a JSON object containing both "intent" and "extracted_info" fields.
+        
+        Example response format:
+        {
+            "intent": "restaurant_recommendation" OR "specific_restaurant_info" OR "casual_conversation",
+            "extracted_info": {
+                "cuisine_type": ["list of cuisines mentioned or empty list"],
+                "food_type": ["list of food types mentioned or empty list"],
+                "location": "location mentioned or empty string if none",
+                "special_features": ["list of special features mentioned or empty list"],
+                "price": "price level mentioned or empty string if none",
+                "restaurant_names": ["list of restaurant names mentioned or empty list"],
+            }
+        }
+        
+        Only include fields that are explicitly mentioned or clearly implied in the user's message and return a strictly JSON response with no additional text as shown above in the response format.
+        """
+
+RECOMMENDATION_SYSTEM_PROMPT = """
+                You are a restaurant recommendation assistant. Your task is to recommend restaurants based on the user's preferences and the retrieved restaurant data.
+
+                Format your response precisely as follows:
+                1. Begin with a brief, friendly introduction (1-2 sentences only)
+                2. Present each restaurant recommendation as a numbered point
+                3. For each restaurant point, use this exact structure:
+
+                🍽️ [RESTAURANT NAME]
+                • Cuisine: [cuisine type]
+                • Price: [price range]
+                • Notable features: [key features that match user preferences]
+                • Why it matches: [brief explanation of how it meets the user's criteria]
+
+                4. End with a single, brief follow-up question about whether these recommendations are helpful.
+
+                IMPORTANT: Do not recommend the same restaurant more than once, even if it appears multiple times in the data. Check restaurant "id" carefully and ensure each recommendation is for a unique restaurant. If you've already suggested a restaurant with a particular "id", do not suggest it again even if it has different details.
+
+                Keep your response concise and well-structured with clear formatting for easy readability.
+            """
+
+RESTAURANT_INFO_SYSTEM_PROMPT = """
+                You are a restaurant information assistant. Based on the user's query about a specific restaurant,
+                provide detailed information in a structured, point-by-point format.
+
+                Format your response precisely as follows:
+
+                If you can identify ONE specific restaurant the user is asking about:
+
+                🍽️ [RESTAURANT NAME]
+                • Cuisine: [cuisine type]
+                • Price: [price range]
+                • Location: [location details]
+                • Highlights: [key features, specialties, or popular dishes]
+                • Hours: [if available]
+                • Contact: [if available]
+                • [Any other specific information the user requested]
+
+                If MULTIPLE restaurants match and you're unsure which one:
+                1. Start with a brief note mentioning you found multiple matches
+                2. For each restaurant, provide a brief summary using the format above
+                3. Ask which specific restaurant they'd like more details about
+
+                Keep your response concise with clear, consistent formatting and structure.
+            """
+
+CASUAL_CONVERSATION_SYSTEM_PROMPT = """
+                You are a friendly restaurant assistant chatbot. Respond naturally to casual conversation,
+                greetings, thanks, or general questions. Be friendly, helpful, and conversational.
+
+                If the conversation shifts to restaurants, pivot to offering structured help:
+
+                "I can help you find restaurants based on:
+                • Cuisine type
+                • Location
+                • Price range
+                • Special features (outdoor seating, vegan options, etc.)
+
+                Just let me know what you're looking for!"
+
+                Keep casual responses brief and engaging. If the user is asking a non-restaurant question,
+                still be helpful but gently remind them that you specialize in restaurant recommendations
+                and information.
+            """
+
+HISTORY_SUMMARY_SYSTEM_PROMPT = """
+                Summarize the earlier part of a conversation between a user and a restaurant chatbot
+                so the chatbot can continue it without the full transcript.
+                
+                Keep what later turns depend on: the user's preferences (cuisine, food, location, price,
+                special features), the restaurants already recommended or discussed with their ids, and
+                any question left open. Drop greetings and filler.
+                
+                The input may start with the summary written so far; fold the new turns into it.
+                Respond with plain text of at most 100 words.
+            """
+
+def _message_tokens(message: BaseMessage) -> int:
+    """Tokens a message contributes to the prompt, including framing."""
+    return count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+def _shared_prefix_tokens(previous: Sequence[Tuple[int, int]], current: Sequence[Tuple[int, int]]) -> int:
+    """Tokens of the leading (fingerprint, tokens) messages two calls have in common."""
+    shared = 0
+    for (previous_fingerprint, _), (fingerprint, tokens) in zip(previous, current):
+        if fingerprint != previous_fingerprint:
+            break
+        shared += tokens
+    return shared
+
+class StablePrompt:
+    """A precompiled system prompt that assembles calls as static prefix + history + per-request content."""
+    def __init__(self, name: str, system_prompt: str):
+        """
+        Compile a system prompt.
+        
+        Args:
+            name: Prompt name used in logs and stats
+            system_prompt: The system prompt text; indentation is stripped once here
+        """
+        self.name = name
+        self.system_message = SystemMessage(content=inspect.cleandoc(system_prompt))
+        self.prefix_tokens = _message_tokens(self.system_message)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.total_tokens = 0
+        self.cacheable_tokens = 0
+        # session id -> (fingerprint, tokens) of each message after the system prompt in the session's last call
+        self.previous_calls = OrderedDict()
+
+    def assemble(self, history: Sequence[BaseMessage] = (), content: Sequence[BaseMessage] = (),
+                 session_id: Optional[str] = None) -> List[BaseMessage]:
+        """
+        Assemble the messages for one call.
+        
+        Args:
+            history: Earlier turns of the session, oldest first
+            content: Per-request messages, ending with the latest user message
+            session_id: The session the call belongs to; only its previous call can have
+                cached the history (summaries and trimming change it between calls)
+            
+        Returns:
+            The message list to send to the LLM
+        """
+        messages = [*history, *content]
+        counted = [(hash((message.type, str(message.content))), _message_tokens(message)) for message in messages]
+        total = self.prefix_tokens + sum(tokens for _, tokens in counted)
+        with self.lock:
+            previous = self.previous_calls.pop(session_id, ()) if session_id else ()
+            if session_id:
+                self.previous_calls[session_id] = counted
+                if len(self.previous_calls) > PROMPT_CACHE_TRACKED_SESSIONS:
+                    self.previous_calls.popitem(last=False)
+            history_tokens = _shared_prefix_tokens(previous, counted[:len(history)])
+            shared = self.prefix_tokens + history_tokens
+            cacheable = shared if shared >= PROMPT_CACHE_MIN_TOKENS else 0
+            self.calls += 1
+            self.total_tokens += total
+            self.cacheable_tokens += cacheable
+        logger.debug(f"Prompt '{self.name}': {total} tokens, cacheable prefix {cacheable} "
+                     f"({self.prefix_tokens} static + {history_tokens} history unchanged since the last call, "
+                     f"minimum {PROMPT_CACHE_MIN_TOKENS})")
+        return [self.system_message, *messages]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call count, static prefix size and the cacheable share of prompt tokens."""
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "static_prefix_tokens": self.prefix_tokens,
+                "cache_min_prefix_tokens": PROMPT_CACHE_MIN_TOKENS,
+                "mean_prompt_tokens": self.total_tokens / self.calls if self.calls else None,
+                "cacheable_fraction": self.cacheable_tokens / self.total_tokens if self.total_tokens else None
+            }
+
+# Compiled once per process
+ANALYSIS_PROMPT = StablePrompt("analysis", ANALYSIS_SYSTEM_PROMPT)
+RECOMMENDATION_PROMPT = StablePrompt("recommendation", RECOMMENDATION_SYSTEM_PROMPT)
+RESTAURANT_INFO_PROMPT = StablePrompt("restaurant_info", RESTAURANT_INFO_SYSTEM_PROMPT)
+CASUAL_CONVERSATION_PROMPT = StablePrompt("casual_conversation", CASUAL_CONVERSATION_SYSTEM_PROMPT)
+HISTORY_SUMMARY_PROMPT = StablePrompt("history_summary", HISTORY_SUMMARY_SYSTEM_PROMPT)
+
+PROMPTS = (ANALYSIS_PROMPT, RECOMMENDATION_PROMPT, RESTAURANT_INFO_PROMPT, CASUAL_CONVERSATION_PROMPT, HISTORY_SUMMARY_PROMPT)
+
+def get_prompt_stats() -> Dict[str, Dict[str, Any]]:
+    """Return prompt size and cacheable-prefix stats for every compiled prompt."""
+    return {prompt.name: prompt.stats() for prompt in PROMPTS}
@@ -1,45 +1,290 @@
 """
 Query caching for the restaurant agent.
+
+Each namespace (analysis, recommendation, info) is an LRU cache with its own entry
+budget, byte budget and TTL. A namespace is split into lock-striped segments, so
+concurrent lookups of different keys do not wait on one global mutex.
+
+Behind this in-process L1 sits an optional SQLite L2 (memory/disk_cache.py) with
+read-through and write-through, shared by every worker process on the host. Its keys
+carry the version of the index the process serves, so entries written for an older
+catalog are not read after a sync.
 """
+import sys
 import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
 from zeal.backend.logger import logger
-from zeal.backend.config import MAX_CACHE_ENTRIES
+from zeal.backend.config import (
+    MAX_CACHE_ENTRIES, CACHE_NAMESPACES, CACHE_SEGMENTS, DISK_CACHE_ENABLED, DISK_CACHE_NAMESPACES
+)
+from zeal.backend.memory.disk_cache import DiskCache
+
+def estimate_size(value, _seen=None) -> int:
+    """
+    Estimate the memory footprint of a cached value in bytes.
+    
+    Args:
+        value: The value to measure (dicts, lists, strings and scalars are traversed)
+        
+    Returns:
+        Approximate size in bytes
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key, _seen) + estimate_size(item, _seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    return size
+
+class _CacheSegment:
+    """One lock stripe of a namespace: an OrderedDict in LRU order plus its own counters."""
+    def __init__(self, max_entries: int, max_bytes: int, ttl: Optional[float]):
+        """
+        Initialize an empty segment.
+        
+        Args:
+            max_entries: Entry budget of this segment
+            max_bytes: Byte budget of this segment
+            ttl: Seconds an entry stays valid, or None for no expiry
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, size, expires_at)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the value for key and mark it most recently used, or None on a miss or expiry."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size: int) -> None:
+        """Insert or replace key, then evict least recently used entries until both budgets hold."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self.entries[key] = (value, size, expires_at)
+            self.bytes += size
+            
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                evicted_key, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+                logger.debug(f"Cache limit reached. Evicted least recently used entry: {str(evicted_key)[:50]}...")
+
+    def clear(self) -> None:
+        """Remove every entry, keeping the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+class NamespaceCache:
+    """A bounded LRU + TTL cache for one namespace, striped over several independently locked segments."""
+    def __init__(self, name: str, max_entries: int, max_bytes: int, ttl: Optional[float] = None, segments: int = CACHE_SEGMENTS):
+        """
+        Initialize an empty namespace cache.
+        
+        Args:
+            name: Namespace name used in logs and stats
+            max_entries: Entry budget for the whole namespace
+            max_bytes: Byte budget for the whole namespace
+            ttl: Seconds an entry stays valid, or None for no expiry
+            segments: Number of lock stripes the budgets are divided over
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        segments = max(1, min(segments, max_entries))
+        self.segments = [
+            _CacheSegment(max(1, max_entries // segments), max(1, max_bytes // segments), ttl)
+            for _ in range(segments)
+        ]
+
+    def _segment(self, key) -> _CacheSegment:
+        """Pick the segment responsible for key."""
+        return self.segments[hash(key) % len(self.segments)]
 
-# Query cache
-QUERY_CACHE = {}  # dictionary to store cached search results 
-QUERY_CACHE_LOCK = threading.Lock()  # A lock to prevent multiple users from modifying the cache at the same time
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        return self._segment(key).get(key)
 
-def get_cached_response(query_key):
+    def set(self, key, value) -> None:
+        """Cache value under key; values larger than a whole segment's byte budget are not cached."""
+        segment = self._segment(key)
+        size = estimate_size(value) + estimate_size(key)
+        if size > segment.max_bytes:
+            logger.debug(f"Not caching {size}-byte value in '{self.name}' (segment budget {segment.max_bytes} bytes)")
+            return
+        segment.set(key, value, size)
+
+    def clear(self) -> None:
+        """Remove every entry in the namespace."""
+        for segment in self.segments:
+            segment.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Aggregate the counters of all segments.
+        
+        Returns:
+            Dictionary with entries, bytes, budgets, hits, misses, evictions, expirations and hit_rate
+        """
+        totals = {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        for segment in self.segments:
+            with segment.lock:
+                totals["entries"] += len(segment.entries)
+                totals["bytes"] += segment.bytes
+                totals["hits"] += segment.hits
+                totals["misses"] += segment.misses
+                totals["evictions"] += segment.evictions
+                totals["expirations"] += segment.expirations
+        lookups = totals["hits"] + totals["misses"]
+        totals.update({
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hit_rate": totals["hits"] / lookups if lookups else 0.0
+        })
+        return totals
+
+# Query cache: one bounded namespace per kind of cached result
+QUERY_CACHE = {
+    name: NamespaceCache(name, **settings)
+    for name, settings in CACHE_NAMESPACES.items()
+}
+QUERY_CACHE_LOCK = threading.Lock()  # Only guards lazy creation of namespaces and of the disk tier
+DISK_CACHE = None  # L2, opened on first use
+DISK_KEY_FORMAT = 2  # part of every L2 key; bump when the shape of cached values changes
+CACHE_VERSION = None  # version of the served index, set by set_cache_version
+
+def set_cache_version(version: Optional[str]) -> None:
+    """
+    Scope cached results to the version of the index this process serves (its manifest
+    hash). Entries other processes wrote for another version are not read, and the
+    in-memory namespaces are cleared when the version changes.
+    
+    Args:
+        version: Index version, or None if unknown
+    """
+    global CACHE_VERSION
+    if version == CACHE_VERSION:
+        return
+    CACHE_VERSION = version
+    for cache in list(QUERY_CACHE.values()):
+        cache.clear()
+    logger.info(f"Query cache version set to {version}")
+
+def _disk_key(query_key: str) -> str:
+    """Key of an entry in the disk tier: the payload format and index version, then the query key."""
+    return f"{DISK_KEY_FORMAT}:{CACHE_VERSION or ''}\x1f{query_key}"
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """Return the shared on-disk cache tier, or None if it is disabled or cannot be opened."""
+    global DISK_CACHE, DISK_CACHE_ENABLED
+    if not DISK_CACHE_ENABLED:
+        return None
+    if DISK_CACHE is None:
+        with QUERY_CACHE_LOCK:
+            if DISK_CACHE is None:
+                try:
+                    DISK_CACHE = DiskCache()
+                    logger.info(f"Opened disk cache at {DISK_CACHE.path}")
+                except Exception as e:
+                    logger.error(f"Could not open disk cache, continuing with the in-memory cache only: {e}")
+                    DISK_CACHE_ENABLED = False
+                    return None
+    return DISK_CACHE
+
+def _get_namespace(namespace: str) -> NamespaceCache:
+    """Return the cache for a namespace, creating one with the default budget if it is not configured."""
+    cache = QUERY_CACHE.get(namespace)
+    if cache is None:
+        with QUERY_CACHE_LOCK:
+            cache = QUERY_CACHE.get(namespace)
+            if cache is None:
+                cache = NamespaceCache(namespace, MAX_CACHE_ENTRIES, MAX_CACHE_ENTRIES * 64 * 1024)
+                QUERY_CACHE[namespace] = cache
+    return cache
+
+def get_cached_response(query_key, namespace="default"):
     """
     Get a cached response for a query key.
     
     Args:
         query_key: The key for the cached response
+        namespace: The cache namespace ("analysis", "recommendation", "info")
         
     Returns:
-        The cached response, or None if not found
+        The cached response, or None if not found or expired
     """
-    with QUERY_CACHE_LOCK:
-        if query_key in QUERY_CACHE:
-            logger.debug(f"Cache hit for key: {query_key[:50]}...")
-            return QUERY_CACHE.get(query_key)
-        logger.debug(f"Cache miss for key: {query_key[:50]}...")
-        return None
+    cache = _get_namespace(namespace)
+    response = cache.get(query_key)
+    if response is not None:
+        logger.debug(f"Cache hit in '{namespace}' for key: {query_key[:50]}...")
+        return response
+    
+    # Read through to the disk tier and promote hits into memory
+    disk_cache = get_disk_cache() if namespace in DISK_CACHE_NAMESPACES else None
+    if disk_cache is not None:
+        response = disk_cache.get(namespace, _disk_key(query_key))
+        if response is not None:
+            logger.debug(f"Disk cache hit in '{namespace}' for key: {query_key[:50]}...")
+            cache.set(query_key, response)
+            return response
+    
+    logger.debug(f"Cache miss in '{namespace}' for key: {query_key[:50]}...")
+    return None
 
-def set_cached_response(query_key, response):
+def set_cached_response(query_key, response, namespace="default"):
     """
     Cache a response for a query key.
     
     Args:
         query_key: The key for the cached response
         response: The response to cache
+        namespace: The cache namespace ("analysis", "recommendation", "info")
     """
-    with QUERY_CACHE_LOCK:
-        QUERY_CACHE[query_key] = response
-        logger.debug(f"Cached response for key: {query_key[:50]}...")
+    cache = _get_namespace(namespace)
+    cache.set(query_key, response)
+    
+    # Write through so other workers and future processes see the entry
+    disk_cache = get_disk_cache() if namespace in DISK_CACHE_NAMESPACES else None
+    if disk_cache is not None:
+        disk_cache.set(namespace, _disk_key(query_key), response, ttl=cache.ttl)
+    logger.debug(f"Cached response in '{namespace}' for key: {query_key[:50]}...")
 
-        # Limit cache size
-        if len(QUERY_CACHE) > MAX_CACHE_ENTRIES:
-            oldest_key = next(iter(QUERY_CACHE))  # Removes oldest entry
-            logger.info(f"Cache limit reached. Removing oldest entry: {oldest_key[:50]}...")
-            del QUERY_CACHE[oldest_key]
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return hit, miss and eviction counters for every query cache namespace and the disk tier."""
+    stats = {name: cache.stats() for name, cache in list(QUERY_CACHE.items())}
+    if DISK_CACHE is not None:
+        stats["disk"] = DISK_CACHE.stats()
+    return stats
@@ -1,24 +1,213 @@
 """
 Conversation history management for the restaurant agent.
+
+Sessions live in lock-striped LRU maps: each stripe is an OrderedDict in least-to-most
+recently used order, so finding the session to evict is O(1). Each session's history
+is a bounded deque. Idle sessions expire after a TTL, and the total size of stored
+interactions is tracked against a byte budget.
+
+With a durable backend (see conversation_store.py) this store is a read-through cache:
+sessions missing in process are loaded from the backend, writes are handed to it
+asynchronously, and cached sessions are revalidated periodically so turns served by
+other workers become visible. Revalidation is a cheap version check against the
+backend; a session is only reloaded when another worker actually changed it.
+
+Prompts read a token-budgeted window of compact turns (see history_window.py). Turns
+that fall out of the verbatim window are folded into a per-session rolling summary
+by a background summarizer thread, off the request path, and the summary is stored
+with the backend so it outlives eviction, restarts and the trimmed turns it covers.
 """
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from zeal.backend.logger import logger
+from zeal.backend.config import (
+    CONVERSATION_MAX_SESSIONS, CONVERSATION_MAX_HISTORY, CONVERSATION_SESSION_TTL,
+    CONVERSATION_MAX_BYTES, CONVERSATION_LOCK_STRIPES, CONVERSATION_REVALIDATE_SECONDS,
+    CONVERSATION_SUMMARY_KEEP_TURNS, CONVERSATION_SUMMARY_BATCH
+)
+from zeal.backend.memory.cache import estimate_size
+from zeal.backend.memory.conversation_store import create_conversation_backend
+from zeal.backend.memory.history_window import compact_response, turn_tokens, select_window, summarize_turns
+
+class _Session:
+    """The history of one session plus its bookkeeping."""
+    __slots__ = ("history", "last_access", "synced", "version", "bytes", "summary", "summarized_upto")
+
+    def __init__(self, max_history, history=(), version=None):
+        self.history = deque(history, maxlen=max_history)
+        self.last_access = time.monotonic()
+        self.synced = self.last_access  # when the history was last known to match the backend
+        self.version = version  # backend version the history was loaded at
+        self.bytes = sum(estimate_size(interaction) for interaction in self.history)
+        self.summary = None  # rolling summary of turns up to summarized_upto
+        self.summarized_upto = 0.0
+
+class _SessionStripe:
+    """One lock stripe of the session store."""
+    def __init__(self, max_sessions, max_bytes):
+        self.sessions = OrderedDict()  # session_id -> _Session, least recently used first
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+        self.summarizing = set()  # sessions with a summarization job in flight
 
 class ConversationMemory:
     """Storage and management for chat history between a user and a chatbot."""
-    def __init__(self, max_sessions=50, max_history_per_session=15):
+    def __init__(self, max_sessions=CONVERSATION_MAX_SESSIONS, max_history_per_session=CONVERSATION_MAX_HISTORY,
+                 session_ttl=CONVERSATION_SESSION_TTL, max_bytes=CONVERSATION_MAX_BYTES, stripes=CONVERSATION_LOCK_STRIPES,
+                 backend=None, revalidate_seconds=CONVERSATION_REVALIDATE_SECONDS, summarizer=None):
         """
         Initialize the conversation memory.
         
         Args:
             max_sessions: Maximum number of sessions to store
             max_history_per_session: Maximum number of interactions per session
+            session_ttl: Seconds of inactivity after which a session expires (None = never)
+            max_bytes: Budget for the approximate size of all stored interactions
+            stripes: Number of independently locked partitions of the session map
+            backend: Optional ConversationBackend that persists history beyond this process
+            revalidate_seconds: Age after which a cached session is reloaded from the backend
+            summarizer: Optional callable (summary, turns) -> summary that folds older turns into a rolling summary
         """
-        self.sessions = {}  # stores conversations per session
         self.max_sessions = max_sessions
         self.max_history_per_session = max_history_per_session  # stores up to 15 messages per session
-        logger.info(f"Initialized ConversationMemory with max_sessions={max_sessions}, max_history={max_history_per_session}")
+        self.session_ttl = session_ttl
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.revalidate_seconds = revalidate_seconds
+        self.summarizer = summarizer
+        self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summarizer") if summarizer else None
+        stripes = max(1, min(stripes, max_sessions))
+        self.stripes = [
+            _SessionStripe(max(1, max_sessions // stripes), max(1, max_bytes // stripes))
+            for _ in range(stripes)
+        ]
+        logger.info(f"Initialized ConversationMemory with max_sessions={max_sessions}, max_history={max_history_per_session}, "
+                    f"ttl={session_ttl}s, stripes={stripes}, backend={type(backend).__name__ if backend else None}")
+
+    def _stripe(self, session_id) -> _SessionStripe:
+        """Pick the stripe responsible for a session."""
+        return self.stripes[hash(session_id) % len(self.stripes)]
+
+    def _expired(self, session, now) -> bool:
+        """Whether a session has been idle for longer than the TTL."""
+        return self.session_ttl is not None and now - session.last_access > self.session_ttl
+
+    def _due(self, session_id, session, now) -> bool:
+        """
+        Whether a cached session is due for revalidation against the backend. Sessions with
+        writes still queued are kept, since the backend does not have those writes yet.
+        """
+        return (self.backend is not None and now - session.synced > self.revalidate_seconds
+                and not self.backend.has_pending(session_id))
+
+    def _load(self, stripe, session_id, now):
+        """
+        Read a session and its rolling summary from the backend into its stripe,
+        replacing any cached copy. A cached summary covering more turns is kept.
         
+        Args:
+            stripe: The session's stripe (not locked by the caller)
+            session_id: Unique identifier for the chat session
+            now: Current monotonic time
+            
+        Returns:
+            Tuple of (interaction records, summary, summarized_upto)
+        """
+        min_timestamp = datetime.now().timestamp() - self.session_ttl if self.session_ttl is not None else None
+        version = self.backend.version(session_id)  # read first: a write in between only causes an extra reload
+        history = self.backend.load_history(session_id, self.max_history_per_session, min_timestamp)
+        stored_summary = self.backend.load_summary(session_id) if history else None
+        with stripe.lock:
+            cached = stripe.sessions.get(session_id)
+            if history is None:
+                # Backend unreadable: keep serving the cached copy rather than forgetting the session
+                if cached is None:
+                    return [], None, 0.0
+                cached.synced = now
+                return list(cached.history), cached.summary, cached.summarized_upto
+            if cached is not None:
+                self._remove(stripe, session_id)
+            stripe.loads += 1
+            if not history:
+                return [], None, 0.0
+            session = _Session(self.max_history_per_session, history, version)
+            if stored_summary is not None:
+                session.summary, session.summarized_upto = stored_summary
+            if cached is not None and cached.summarized_upto > session.summarized_upto:
+                session.summary, session.summarized_upto = cached.summary, cached.summarized_upto
+            stripe.sessions[session_id] = session
+            stripe.bytes += session.bytes
+            self._evict(stripe, now)
+            return history, session.summary, session.summarized_upto
+
+    def _remove(self, stripe, session_id) -> None:
+        """Drop a session from its stripe. Caller holds the stripe lock."""
+        session = stripe.sessions.pop(session_id)
+        stripe.bytes -= session.bytes
+
+    def _evict(self, stripe, now) -> None:
+        """
+        Expire idle sessions from the LRU end, then evict least recently used sessions
+        until the stripe is within its session and byte budgets. Caller holds the lock.
+        """
+        while stripe.sessions:
+            session_id, session = next(iter(stripe.sessions.items()))
+            if self._expired(session, now):
+                stripe.expirations += 1
+                logger.debug(f"Session {session_id} expired")
+            elif len(stripe.sessions) > stripe.max_sessions or stripe.bytes > stripe.max_bytes:
+                stripe.evictions += 1
+                logger.info(f"Session limit reached. Removing least recently used session: {session_id}")
+            else:
+                break
+            self._remove(stripe, session_id)
+
+    def _turns_to_fold(self, stripe, session_id, session):
+        """
+        Claim the older turns due for summarization: once CONVERSATION_SUMMARY_BATCH turns
+        beyond the newest CONVERSATION_SUMMARY_KEEP_TURNS are unsummarized, they are folded
+        in one call. Caller holds the stripe lock.
+        
+        Returns:
+            The turns to fold, oldest first, or None
+        """
+        if self.summarizer is None or session_id in stripe.summarizing:
+            return None
+        unsummarized = [interaction for interaction in session.history if interaction["timestamp"] > session.summarized_upto]
+        older = unsummarized[:-CONVERSATION_SUMMARY_KEEP_TURNS]
+        if len(older) < CONVERSATION_SUMMARY_BATCH:
+            return None
+        stripe.summarizing.add(session_id)
+        return older
+
+    def _summarize(self, stripe, session_id, summary, turns) -> None:
+        """Summarizer thread: fold turns into the session's rolling summary and persist it."""
+        try:
+            new_summary = self.summarizer(summary, turns)
+        except Exception as e:
+            new_summary = None
+            logger.error(f"Summarizing history of session {session_id} failed: {e}", exc_info=True)
+        updated = False
+        with stripe.lock:
+            stripe.summarizing.discard(session_id)
+            session = stripe.sessions.get(session_id)
+            if new_summary and session is not None and session.summarized_upto < turns[-1]["timestamp"]:
+                session.summary = new_summary
+                session.summarized_upto = turns[-1]["timestamp"]
+                updated = True
+                logger.debug(f"Folded {len(turns)} turns into the summary of session {session_id}")
+        if updated and self.backend is not None:
+            # Other workers and later loads pick it up; turns it covers are trimmed from the backend
+            self.backend.save_summary(session_id, new_summary, turns[-1]["timestamp"])
+
     def add_interaction(self, session_id, user_message, bot_response, metadata=None):
         """
         Add a new user-bot interaction to memory.
@@ -29,32 +218,88 @@ class ConversationMemory:
             bot_response: Response from the bot
             metadata: Optional additional data
         """
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
-            logger.info(f"Created new session: {session_id}")
-            
-        # Limit sessions
-        if len(self.sessions) > self.max_sessions:
-            oldest_session = min(self.sessions.keys(), key=lambda k: self.sessions[k][0]['timestamp'] if self.sessions[k] else datetime.now().timestamp())
-            logger.info(f"Session limit reached. Removing oldest session: {oldest_session}")
-            del self.sessions[oldest_session]
-        
-        # Add the new interaction
         interaction = {
             'timestamp': datetime.now().timestamp(),
             'user_message': user_message,
             'bot_response': bot_response,
+            'compact_response': compact_response(bot_response, metadata),
             'metadata': metadata or {}
         }
+        interaction['tokens'] = turn_tokens(interaction)
+        size = estimate_size(interaction)
+        now = time.monotonic()
         
-        self.sessions[session_id].append(interaction)
-        logger.debug(f"Added interaction to session {session_id}. Message length: User={len(user_message)}, Bot={len(bot_response)}")
+        stripe = self._stripe(session_id)
+        if self.backend is not None:
+            # Start from the persisted history when this process has not seen the session yet
+            with stripe.lock:
+                cached = session_id in stripe.sessions
+            if not cached:
+                self._load(stripe, session_id, now)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is None or self._expired(session, now):
+                if session is not None:
+                    self._remove(stripe, session_id)
+                session = _Session(self.max_history_per_session)
+                stripe.sessions[session_id] = session
+                logger.info(f"Created new session: {session_id}")
+            else:
+                stripe.sessions.move_to_end(session_id)
+            
+            # The deque drops the oldest interaction by itself; keep the byte count in step
+            if len(session.history) == session.history.maxlen:
+                dropped = estimate_size(session.history[0])
+                session.bytes -= dropped
+                stripe.bytes -= dropped
+            session.history.append(interaction)
+            session.bytes += size
+            stripe.bytes += size
+            session.last_access = now
+            to_fold = self._turns_to_fold(stripe, session_id, session)
+            
+            # Limit sessions (the session just written is most recently used, so it is evicted last)
+            self._evict(stripe, now)
         
-        # Trim history if needed
-        if len(self.sessions[session_id]) > self.max_history_per_session:
-            logger.debug(f"Trimming history for session {session_id}")
-            self.sessions[session_id] = self.sessions[session_id][-self.max_history_per_session:]
+        if self.backend is not None:
+            self.backend.append(session_id, interaction)
+        if to_fold:
+            self._summary_executor.submit(self._summarize, stripe, session_id, session.summary, to_fold)
+        logger.debug(f"Added interaction to session {session_id}. Message length: User={len(user_message)}, Bot={len(bot_response)}")
     
+    def _snapshot(self, session_id):
+        """
+        Copy a session's history and summary, loading it from the backend when it is not
+        cached or another worker changed it since it was loaded. A hit moves the session
+        to the MRU end.
+        
+        Returns:
+            Tuple of (interaction records, summary, summarized_upto)
+        """
+        now = time.monotonic()
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            session = stripe.sessions.get(session_id)
+            if session is not None and self._expired(session, now):
+                self._remove(stripe, session_id)
+                stripe.expirations += 1
+                session = None
+            if session is not None:
+                stripe.sessions.move_to_end(session_id)
+                session.last_access = now
+                if not self._due(session_id, session, now):
+                    return list(session.history), session.summary, session.summarized_upto
+                version = session.version
+        if self.backend is None:
+            return [], None, 0.0
+        # The version check runs outside the stripe lock, so it never holds up other sessions
+        if session is not None and not self.backend.changed_since(session_id, version):
+            with stripe.lock:
+                if stripe.sessions.get(session_id) is session:
+                    session.synced = now
+                    return list(session.history), session.summary, session.summarized_upto
+        return self._load(stripe, session_id, now)
+
     def get_history(self, session_id, limit=None):
         """
         Get past messages for a given session.
@@ -66,11 +311,11 @@ class ConversationMemory:
         Returns:
             List of interaction records
         """
-        if session_id not in self.sessions:
+        history = self._snapshot(session_id)[0]
+        if not history:
             logger.debug(f"No history found for session {session_id}")
             return []
         
-        history = self.sessions[session_id]
         if limit:
             logger.debug(f"Returning {min(limit, len(history))} history items for session {session_id}")
             return history[-limit:]
@@ -78,6 +323,53 @@ class ConversationMemory:
         logger.debug(f"Returning all {len(history)} history items for session {session_id}")
         return history
 
+    def get_window(self, session_id, max_tokens):
+        """
+        Get the history to put in a prompt: the rolling summary of older turns plus the
+        newest turns that fit the token budget.
+        
+        Args:
+            session_id: Unique identifier for the chat session
+            max_tokens: Token budget for the summary and turns together
+            
+        Returns:
+            Tuple of (summary or None, interaction records oldest first)
+        """
+        history, summary, summarized_upto = self._snapshot(session_id)
+        summary, turns = select_window(history, summary, summarized_upto, max_tokens)
+        logger.debug(f"History window for session {session_id}: {len(turns)} of {len(history)} turns"
+                     f"{', plus summary' if summary else ''}")
+        return summary, turns
+
+    def clear_session(self, session_id):
+        """Forget a session's history."""
+        stripe = self._stripe(session_id)
+        with stripe.lock:
+            if session_id in stripe.sessions:
+                self._remove(stripe, session_id)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+
+    def stats(self):
+        """
+        Session counts, memory accounting and eviction counters.
+        
+        Returns:
+            Dictionary with sessions, bytes, budgets, evictions, expirations and backend counters
+        """
+        totals = {"sessions": 0, "bytes": 0, "evictions": 0, "expirations": 0, "backend_loads": 0}
+        for stripe in self.stripes:
+            with stripe.lock:
+                totals["sessions"] += len(stripe.sessions)
+                totals["bytes"] += stripe.bytes
+                totals["evictions"] += stripe.evictions
+                totals["expirations"] += stripe.expirations
+                totals["backend_loads"] += stripe.loads
+        totals.update(max_sessions=self.max_sessions, max_bytes=self.max_bytes, session_ttl=self.session_ttl)
+        if self.backend is not None:
+            totals["backend"] = self.backend.stats()
+        return totals
+
 # Create global conversation memory
-CONVERSATION_MEMORY = ConversationMemory()
-logger.info("Global ConversationMemory initialized")
\ No newline at end of file
+CONVERSATION_MEMORY = ConversationMemory(backend=create_conversation_backend(), summarizer=summarize_turns)
+logger.info("Global ConversationMemory initialized")
@@ -0,0 +1,367 @@
+"""
+Durable backends for conversation memory.
+
+ConversationMemory keeps hot sessions in process and delegates persistence to a
+backend, so history survives restarts and is visible to every worker on the host.
+The SQLite backend writes in the background: interactions are queued and committed
+in batches by a writer thread, so add_interaction never waits on disk.
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from zeal.backend.logger import logger
+from zeal.backend.config import (
+    CONVERSATION_BACKEND, CONVERSATION_DB_PATH, CONVERSATION_MAX_HISTORY, CONVERSATION_MAX_SESSIONS, CONVERSATION_SESSION_TTL,
+    CONVERSATION_WRITE_BATCH, CONVERSATION_FLUSH_INTERVAL
+)
+
+class ConversationBackend:
+    """Interface for conversation persistence. The base class stores nothing."""
+    def load_history(self, session_id: str, limit: int, min_timestamp: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Load the most recent interactions of a session, oldest first.
+        
+        Args:
+            session_id: Unique identifier for the chat session
+            limit: Maximum number of interactions to return
+            min_timestamp: Ignore interactions older than this wall-clock time
+            
+        Returns:
+            List of interaction records (empty for an unknown session), or None if
+            the backend could not be read
+        """
+        return []
+
+    def version(self, session_id: str) -> Optional[int]:
+        """Version of a session's stored history, read before loading it (None if unknown)."""
+        return None
+
+    def changed_since(self, session_id: str, version: Optional[int]) -> bool:
+        """
+        Cheap check for whether other processes changed a session since it was loaded.
+        
+        Args:
+            session_id: Unique identifier for the chat session
+            version: The version read before the session was loaded
+            
+        Returns:
+            True if the session should be reloaded
+        """
+        return False
+
+    def load_summary(self, session_id: str) -> Optional[Tuple[str, float]]:
+        """
+        Load the rolling summary of a session's older turns.
+        
+        Args:
+            session_id: Unique identifier for the chat session
+            
+        Returns:
+            Tuple of (summary, timestamp of the newest turn it covers), or None
+        """
+        return None
+
+    def append(self, session_id: str, interaction: Dict[str, Any]) -> None:
+        """Persist a new interaction (may be asynchronous)."""
+
+    def save_summary(self, session_id: str, summary: str, summarized_upto: float) -> None:
+        """Persist a session's rolling summary unless a newer one is stored (may be asynchronous)."""
+
+    def delete(self, session_id: str) -> None:
+        """Forget a session."""
+
+    def has_pending(self, session_id: str) -> bool:
+        """Whether writes for the session are queued but not yet durable."""
+        return False
+
+    def flush(self) -> None:
+        """Block until every queued write is durable."""
+
+    def close(self) -> None:
+        """Flush and release resources."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend counters for /api/stats."""
+        return {}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interactions_session ON interactions (session_id, seq);
+CREATE INDEX IF NOT EXISTS interactions_timestamp ON interactions (timestamp);
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    summarized_upto REAL NOT NULL
+);
+"""
+
+class SQLiteConversationBackend(ConversationBackend):
+    """
+    Conversation persistence in a SQLite database in WAL mode, shared by all worker
+    processes on the host. Appends go through a queue to a single writer thread that
+    commits them in batches, trims each session to max_history rows and periodically
+    purges sessions idle for longer than the TTL. Rolling summaries are kept in their
+    own table, one row per session, so the context of trimmed turns is not lost.
+    """
+    def __init__(self, path: str = CONVERSATION_DB_PATH, max_history: int = CONVERSATION_MAX_HISTORY,
+                 session_ttl: Optional[float] = CONVERSATION_SESSION_TTL, batch_size: int = CONVERSATION_WRITE_BATCH,
+                 flush_interval: float = CONVERSATION_FLUSH_INTERVAL, purge_interval: float = 600):
+        """
+        Open (or create) the database and start the writer thread.
+        
+        Args:
+            path: SQLite database file
+            max_history: Interactions kept per session
+            session_ttl: Seconds of inactivity after which stored interactions are purged
+            batch_size: Maximum interactions committed per transaction
+            flush_interval: Seconds the writer waits to fill a batch
+            purge_interval: Seconds between TTL purges
+        """
+        self.path = path
+        self.max_history = max_history
+        self.session_ttl = session_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = Counter()
+        self._own_seqs = OrderedDict()  # session_id -> seqs of rows this process wrote, least recently written first
+        self._pending_lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        self.written = 0
+        self.errors = 0
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection; SQLite connections must not be shared across threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load_history(self, session_id, limit, min_timestamp=None):
+        try:
+            rows = self._connection().execute(
+                "SELECT payload FROM interactions WHERE session_id = ? AND timestamp > ? ORDER BY seq DESC LIMIT ?",
+                (session_id, min_timestamp or 0.0, limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not load history for session {session_id}: {e}")
+            return None
+        return [json.loads(payload) for (payload,) in reversed(rows)]
+
+    def version(self, session_id):
+        """The newest row seq of the session."""
+        try:
+            return self._connection().execute(
+                "SELECT MAX(seq) FROM interactions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not read the version of session {session_id}: {e}")
+            return None
+
+    def changed_since(self, session_id, version):
+        """
+        An index range scan over the session's rows from version on: the session changed
+        if the row at version is gone (deleted or trimmed) or a newer row was written by
+        another process.
+        """
+        try:
+            seqs = [seq for (seq,) in self._connection().execute(
+                "SELECT seq FROM interactions WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                (session_id, version or 0)
+            )]
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not revalidate session {session_id}: {e}")
+            return False
+        if version is not None and (not seqs or seqs[0] != version):
+            return True
+        with self._pending_lock:
+            own = set(self._own_seqs.get(session_id, ()))
+        return any(seq not in own for seq in seqs if seq != version)
+
+    def load_summary(self, session_id):
+        try:
+            return self._connection().execute(
+                "SELECT summary, summarized_upto FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Could not load the summary of session {session_id}: {e}")
+            return None
+
+    def append(self, session_id, interaction):
+        with self._pending_lock:
+            self._pending[session_id] += 1
+        self._queue.put((session_id, interaction))
+
+    def save_summary(self, session_id, summary, summarized_upto):
+        self._queue.put((session_id, _SummaryWrite(summary, summarized_upto)))
+
+    def delete(self, session_id):
+        self._queue.put((session_id, None))
+
+    def has_pending(self, session_id):
+        with self._pending_lock:
+            return self._pending[session_id] > 0
+
+    def _write_loop(self) -> None:
+        """Writer thread: collect queued appends into batches and commit each batch in one transaction."""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)  # handled after this batch is written
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if self.session_ttl and time.monotonic() - self._last_purge > self.purge_interval:
+                self._purge()
+
+    def _write_batch(self, batch) -> None:
+        """Commit one batch of appends, summaries and deletes, then trim the touched sessions."""
+        connection = self._connection()
+        sessions = {session_id for session_id, _ in batch}
+        written = []  # (session_id, seq), or (session_id, None) for a delete
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for session_id, interaction in batch:
+                if interaction is None:
+                    connection.execute("DELETE FROM interactions WHERE session_id = ?", (session_id,))
+                    connection.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+                    written.append((session_id, None))
+                elif isinstance(interaction, _SummaryWrite):
+                    # Another worker may have stored a summary covering more turns
+                    connection.execute(
+                        "INSERT INTO summaries (session_id, summary, summarized_upto) VALUES (?, ?, ?) "
+                        "ON CONFLICT (session_id) DO UPDATE SET summary = excluded.summary, summarized_upto = excluded.summarized_upto "
+                        "WHERE excluded.summarized_upto > summaries.summarized_upto",
+                        (session_id, interaction.summary, interaction.summarized_upto)
+                    )
+                else:
+                    cursor = connection.execute(
+                        "INSERT INTO interactions (session_id, timestamp, payload) VALUES (?, ?, ?)",
+                        (session_id, interaction.get("timestamp", time.time()), json.dumps(interaction, default=str))
+                    )
+                    written.append((session_id, cursor.lastrowid))
+            for session_id in sessions:
+                connection.execute(
+                    "DELETE FROM interactions WHERE session_id = ? AND seq <= "
+                    "(SELECT seq FROM interactions WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, self.max_history)
+                )
+            connection.execute("COMMIT")
+            self.written += len(batch)
+            with self._pending_lock:
+                for session_id, seq in written:
+                    if seq is None:
+                        self._own_seqs.pop(session_id, None)
+                    else:
+                        self._own_seqs.setdefault(session_id, deque(maxlen=self.max_history)).append(seq)
+                        self._own_seqs.move_to_end(session_id)
+                # Sessions forgotten here look changed on their next revalidation and are reloaded once
+                while len(self._own_seqs) > CONVERSATION_MAX_SESSIONS:
+                    self._own_seqs.popitem(last=False)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Failed to persist {len(batch)} conversation writes: {e}")
+            try:
+                connection.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+        finally:
+            with self._pending_lock:
+                for session_id, interaction in batch:
+                    if isinstance(interaction, dict):
+                        self._pending[session_id] -= 1
+                        if self._pending[session_id] <= 0:
+                            del self._pending[session_id]
+
+    def _purge(self) -> None:
+        """Delete interactions of sessions idle for longer than the TTL, and the summaries of sessions left empty."""
+        self._last_purge = time.monotonic()
+        try:
+            connection = self._connection()
+            deleted = connection.execute(
+                "DELETE FROM interactions WHERE timestamp < ?", (time.time() - self.session_ttl,)
+            ).rowcount
+            connection.execute(
+                "DELETE FROM summaries WHERE NOT EXISTS "
+                "(SELECT 1 FROM interactions WHERE interactions.session_id = summaries.session_id)"
+            )
+            if deleted:
+                logger.info(f"Purged {deleted} expired conversation interactions")
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Conversation purge failed: {e}")
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=5)
+
+    def stats(self):
+        """Return write counters and queue depth."""
+        return {"path": self.path, "written": self.written, "queued": self._queue.qsize(), "errors": self.errors}
+
+_STOP = object()  # writer thread shutdown sentinel
+
+class _SummaryWrite(NamedTuple):
+    """Queued summary write, told apart from interactions (dicts) and deletes (None) by its type."""
+    summary: str
+    summarized_upto: float
+
+def create_conversation_backend() -> Optional[ConversationBackend]:
+    """
+    Create the backend selected by CONVERSATION_BACKEND.
+    
+    Returns:
+        The backend, or None for purely in-process memory (also when the database cannot be opened)
+    """
+    if CONVERSATION_BACKEND != "sqlite":
+        return None
+    try:
+        backend = SQLiteConversationBackend()
+        logger.info(f"Conversation history persisted to {backend.path}")
+        return backend
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Could not open conversation database, keeping history in memory only: {e}")
+        return None
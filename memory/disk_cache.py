@@ -0,0 +1,207 @@
+"""
+Persistent on-disk cache tier for the restaurant agent.
+
+A single SQLite database in WAL mode holds compressed JSON entries, so cached analyses
+and retrieval results survive restarts and are shared by every worker process on the
+host. Readers never block each other; writers wait on SQLite's busy timeout. A hit
+only writes when the entry's access time is older than the touch interval, so the
+least-recently-used order is approximate and cache reads stay reads.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+from zeal.backend.logger import logger
+from zeal.backend.config import DISK_CACHE_PATH, DISK_CACHE_MAX_BYTES, DISK_CACHE_TOUCH_INTERVAL
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at);
+"""
+
+def serialize(value: Any) -> bytes:
+    """Encode a cached value as zlib-compressed compact JSON."""
+    return zlib.compress(json.dumps(value, separators=(",", ":"), default=str).encode("utf-8"))
+
+def deserialize(blob: bytes) -> Any:
+    """Decode a value written by serialize()."""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+class DiskCache:
+    """
+    A size-bounded, TTL-aware key/value store in SQLite. Expired rows are skipped on
+    read and purged during trimming; once the database exceeds its byte budget the
+    least recently accessed rows are deleted.
+    """
+    def __init__(self, path: str = DISK_CACHE_PATH, max_bytes: int = DISK_CACHE_MAX_BYTES, trim_every: int = 100,
+                 touch_interval: float = DISK_CACHE_TOUCH_INTERVAL):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path: SQLite database file
+            max_bytes: Budget for the sum of stored (compressed) value sizes
+            trim_every: Number of writes from this process between eviction passes
+            touch_interval: Seconds before a hit refreshes the entry's access time again
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.trim_every = trim_every
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection; SQLite connections must not be shared across threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Read a value, refreshing its access time if it is older than the touch interval.
+        
+        Args:
+            namespace: Cache namespace
+            key: Cache key
+            
+        Returns:
+            The cached value, or None on a miss, expiry or error
+        """
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value, accessed_at FROM cache_entries WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.touch_interval:
+                connection.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key)
+                )
+            self.hits += 1
+            return deserialize(row[0])
+        except (sqlite3.Error, ValueError, zlib.error) as e:
+            self.errors += 1
+            logger.warning(f"Disk cache read failed for key {key[:50]}...: {e}")
+            return None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Write a value, replacing any previous entry for the key.
+        
+        Args:
+            namespace: Cache namespace
+            key: Cache key
+            value: JSON-serializable value
+            ttl: Seconds the entry stays valid, or None for no expiry
+        """
+        now = time.time()
+        try:
+            blob = serialize(value)
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, blob, len(blob), now + ttl if ttl else None, now)
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self.errors += 1
+            logger.warning(f"Disk cache write failed for key {key[:50]}...: {e}")
+            return
+        
+        with self._writes_lock:
+            self._writes += 1
+            should_trim = self._writes % self.trim_every == 0
+        if should_trim:
+            self.trim()
+
+    def trim(self) -> int:
+        """
+        Delete expired rows, then the least recently accessed rows until the byte budget holds.
+        
+        Returns:
+            Number of rows deleted
+        """
+        try:
+            connection = self._connection()
+            deleted = connection.execute(
+                "DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+            if total > self.max_bytes:
+                # Free down to 90% of the budget so trimming does not run on every write
+                excess = total - int(self.max_bytes * 0.9)
+                rows = connection.execute("SELECT namespace, key, size FROM cache_entries ORDER BY accessed_at")
+                victims = []
+                for namespace, key, size in rows:
+                    if excess <= 0:
+                        break
+                    victims.append((namespace, key))
+                    excess -= size
+                connection.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", victims)
+                deleted += len(victims)
+            if deleted:
+                logger.info(f"Disk cache trimmed {deleted} entries")
+            return deleted
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Disk cache trim failed: {e}")
+            return 0
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Delete every entry, or every entry of one namespace."""
+        if namespace is None:
+            self._connection().execute("DELETE FROM cache_entries")
+        else:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters for this process plus the shared database size.
+        
+        Returns:
+            Dictionary with entries, bytes, max_bytes, hits, misses, errors and hit_rate
+        """
+        try:
+            entries, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, total = None, None
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
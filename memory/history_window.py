@@ -0,0 +1,154 @@
+"""
+Token-budgeted conversation history for the restaurant agent's prompts.
+
+Bot responses are stored with a compact form that keeps only the restaurants they
+mentioned, so recommendation cards are not re-sent on every turn. A window holds the
+newest turns that fit a token budget, preceded by a rolling summary of older turns
+that is written in the background (see ConversationMemory) rather than on the
+request path.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from zeal.backend.logger import logger
+from zeal.backend.config import CONVERSATION_COMPACT_RESPONSE_CHARS, CONVERSATION_SUMMARY_MAX_TOKENS
+from zeal.backend.llm.llm_interface import get_llm
+from zeal.backend.llm.prompt_context import count_tokens
+from zeal.backend.llm.prompts import HISTORY_SUMMARY_PROMPT, MESSAGE_OVERHEAD_TOKENS
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# How the compact form introduces the restaurants a response mentioned, by intent
+RESTAURANT_VERBS = {
+    "restaurant_recommendation": "Recommended",
+    "specific_restaurant_info": "Described",
+}
+
+def compact_response(bot_response: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Compact a bot response for later prompts: the ids and names of the restaurants it
+    mentioned, or the response text cut to CONVERSATION_COMPACT_RESPONSE_CHARS.
+
+    Args:
+        bot_response: The full response sent to the user
+        metadata: Interaction metadata; "restaurants" lists {"id", "name"} dicts and "intent" the handler
+
+    Returns:
+        The compact response text
+    """
+    metadata = metadata or {}
+    restaurants = metadata.get("restaurants") or []
+    if restaurants:
+        verb = RESTAURANT_VERBS.get(metadata.get("intent"), "Mentioned")
+        names = ", ".join(f"{restaurant.get('name')} (id {restaurant.get('id')})" for restaurant in restaurants)
+        return f"[{verb}: {names}]"
+    if len(bot_response) <= CONVERSATION_COMPACT_RESPONSE_CHARS:
+        return bot_response
+    return bot_response[:CONVERSATION_COMPACT_RESPONSE_CHARS].rsplit(" ", 1)[0] + "…"
+
+def turn_tokens(interaction: Dict[str, Any]) -> int:
+    """Prompt tokens of one turn in compact form, framing included."""
+    tokens = interaction.get("tokens")
+    if tokens is None:
+        compact = interaction.get("compact_response") or compact_response(interaction["bot_response"], interaction.get("metadata"))
+        tokens = count_tokens(interaction["user_message"]) + count_tokens(compact) + 2 * MESSAGE_OVERHEAD_TOKENS
+    return tokens
+
+def cap_summary(summary: Optional[str], max_tokens: int) -> Optional[str]:
+    """
+    Cut a summary to max_tokens, keeping its end: fallback summaries append the
+    newest turns there.
+
+    Args:
+        summary: Rolling summary, if any
+        max_tokens: Token cap
+
+    Returns:
+        The summary, cut and marked with a leading ellipsis if it was too long
+    """
+    if not summary:
+        return summary
+    tokens = count_tokens(summary)
+    while tokens > max_tokens:
+        keep = int(len(summary) * max_tokens / tokens * 0.9)
+        if keep <= 0:
+            return None
+        cut = summary[-keep:]
+        summary = "…" + (cut.split(" ", 1)[1] if " " in cut else cut)
+        tokens = count_tokens(summary)
+    return summary
+
+def select_window(history: Sequence[Dict[str, Any]], summary: Optional[str], summarized_upto: float,
+                  max_tokens: int) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Pick the newest turns that fit the token budget. The summary is capped at half
+    the budget; turns already covered by it are never included, and the newest turn
+    always is.
+
+    Args:
+        history: Interactions of the session, oldest first
+        summary: Rolling summary of older turns, if any
+        summarized_upto: Timestamp of the newest turn folded into the summary
+        max_tokens: Budget for the summary plus the selected turns
+
+    Returns:
+        Tuple of (capped summary or None, selected interactions oldest first)
+    """
+    summary = cap_summary(summary, max_tokens // 2)
+    budget = max_tokens - (count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0)
+    selected = []
+    for interaction in reversed(history):
+        if interaction["timestamp"] <= summarized_upto:
+            break
+        tokens = turn_tokens(interaction)
+        if selected and tokens > budget:
+            break
+        selected.append(interaction)
+        budget -= tokens
+    selected.reverse()
+    return summary, selected
+
+def window_messages(summary: Optional[str], turns: Sequence[Dict[str, Any]]) -> List[BaseMessage]:
+    """
+    Render a history window as LangChain messages.
+
+    Args:
+        summary: Rolling summary of older turns, if any
+        turns: Interactions of the window, oldest first
+
+    Returns:
+        An optional summary SystemMessage followed by alternating HumanMessage/AIMessage objects
+    """
+    messages = [SystemMessage(content=SUMMARY_PREFIX + summary)] if summary else []
+    for interaction in turns:
+        messages.append(HumanMessage(content=interaction["user_message"]))
+        messages.append(AIMessage(content=interaction.get("compact_response") or interaction["bot_response"]))
+    return messages
+
+def _transcript(turns: Sequence[Dict[str, Any]]) -> str:
+    """Plain-text transcript of turns in compact form."""
+    return "\n".join(
+        f"User: {interaction['user_message']}\nAssistant: {interaction.get('compact_response') or interaction['bot_response']}"
+        for interaction in turns
+    )
+
+def summarize_turns(summary: Optional[str], turns: Sequence[Dict[str, Any]]) -> str:
+    """
+    Fold turns into the rolling summary with the LLM. Runs on the summarizer thread.
+    Falls back to appending the compact transcript if the LLM call fails, keeping
+    the newest CONVERSATION_SUMMARY_MAX_TOKENS so repeated failures cannot grow it.
+
+    Args:
+        summary: The summary written so far, if any
+        turns: Interactions to fold in, oldest first
+
+    Returns:
+        The new summary
+    """
+    transcript = _transcript(turns)
+    content = f"Summary so far: {summary}\n\nNew turns:\n{transcript}" if summary else transcript
+    try:
+        result = get_llm(temperature=0).invoke(HISTORY_SUMMARY_PROMPT.assemble((), [HumanMessage(content=content)]))
+        return result.content.strip()
+    except Exception as e:
+        logger.warning(f"History summarization failed, keeping the compact transcript: {e}")
+        return cap_summary(f"{summary}\n{transcript}" if summary else transcript, CONVERSATION_SUMMARY_MAX_TOKENS)
@@ -0,0 +1,173 @@
+"""
+Semantic (embedding-similarity) caching for the restaurant agent.
+
+Entries are stored next to the embedding of the text that produced them, so
+"italian food in nyc" can be served from the entry for "Italian restaurants in NYC".
+Each namespace (analysis, retrieval, response) has its own similarity threshold.
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from zeal.backend.logger import logger
+from zeal.backend.config import SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLDS
+
+class SemanticCache:
+    """
+    A fixed-capacity ring buffer of (key text, scope, value) entries with a normalized
+    float32 embedding matrix as its vector index. A lookup is one matrix-vector product.
+    """
+    def __init__(self, namespace: str, threshold: float, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        """
+        Initialize an empty semantic cache.
+
+        Args:
+            namespace: Name used in logs and stats
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Capacity; the oldest entry is overwritten once full
+        """
+        self.namespace = namespace
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vectors = None  # (max_entries, dim) float32, allocated on first insert
+        self.keys = [None] * max_entries
+        self.scopes = [None] * max_entries
+        self.values = [None] * max_entries
+        self.size = 0
+        self.next_slot = 0
+        self.lock = threading.RLock()
+        self.lookups = 0
+        self.hits = 0
+        self.hit_similarity_total = 0.0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, embedding, scope: Optional[str] = None) -> Optional[Tuple[float, str, Any]]:
+        """
+        Find the most similar entry without applying the threshold or counting stats.
+
+        Args:
+            embedding: Query embedding
+            scope: Only entries stored with the same scope are considered
+
+        Returns:
+            (similarity, key, value) of the best entry, or None if the cache is empty
+        """
+        query = self._normalize(embedding)
+        with self.lock:
+            if self.size == 0:
+                return None
+            similarities = self.vectors[:self.size] @ query
+            if scope is not None:
+                scope_mask = np.array([entry_scope == scope for entry_scope in self.scopes[:self.size]])
+                similarities = np.where(scope_mask, similarities, -1.0)
+            best = int(np.argmax(similarities))
+            if similarities[best] < -0.5:
+                return None
+            return float(similarities[best]), self.keys[best], self.values[best]
+
+    def get(self, embedding, scope: Optional[str] = None) -> Optional[Any]:
+        """
+        Return the value of the most similar entry if it beats the threshold.
+
+        Args:
+            embedding: Query embedding
+            scope: Only entries stored with the same scope are considered
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        result = self.search(embedding, scope)
+        with self.lock:
+            self.lookups += 1
+            if result is None or result[0] < self.threshold:
+                logger.debug(f"Semantic cache miss in '{self.namespace}'")
+                return None
+            self.hits += 1
+            self.hit_similarity_total += result[0]
+        logger.debug(f"Semantic cache hit in '{self.namespace}' (similarity {result[0]:.3f}, key: {result[1][:50]}...)")
+        return result[2]
+
+    def set(self, key: str, embedding, value: Any, scope: Optional[str] = None) -> None:
+        """
+        Store a value under the embedding of its key text.
+
+        Args:
+            key: The text the value was computed for (kept for debugging and evaluation)
+            embedding: Embedding of the key text
+            value: The value to cache
+            scope: Optional scope that lookups must match (e.g. a candidate-set hash)
+        """
+        vector = self._normalize(embedding)
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self.next_slot
+            self.vectors[slot] = vector
+            self.keys[slot] = key
+            self.scopes[slot] = scope
+            self.values[slot] = value
+            self.next_slot = (slot + 1) % self.max_entries
+            self.size = min(self.size + 1, self.max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit-rate instrumentation for this namespace.
+
+        Returns:
+            Dictionary with entries, lookups, hits, hit_rate and mean hit similarity
+        """
+        with self.lock:
+            return {
+                "entries": self.size,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "mean_hit_similarity": self.hit_similarity_total / self.hits if self.hits else None
+            }
+
+# One semantic cache per namespace, each with its own threshold
+SEMANTIC_CACHES = {
+    namespace: SemanticCache(namespace, threshold)
+    for namespace, threshold in SEMANTIC_CACHE_THRESHOLDS.items()
+}
+
+def get_semantic_cached_response(namespace: str, embedding, scope: Optional[str] = None) -> Optional[Any]:
+    """
+    Get a semantically cached value.
+
+    Args:
+        namespace: "analysis", "retrieval" or "response"
+        embedding: Embedding of the current query text
+        scope: Optional scope that the cached entry must match
+
+    Returns:
+        The cached value, or None on a miss or when semantic caching is disabled
+    """
+    if not SEMANTIC_CACHE_ENABLED or embedding is None:
+        return None
+    return SEMANTIC_CACHES[namespace].get(embedding, scope)
+
+def set_semantic_cached_response(namespace: str, key: str, embedding, value: Any, scope: Optional[str] = None) -> None:
+    """
+    Cache a value under the embedding of its key text.
+
+    Args:
+        namespace: "analysis", "retrieval" or "response"
+        key: The text the value was computed for
+        embedding: Embedding of the key text
+        value: The value to cache
+        scope: Optional scope that lookups must match
+    """
+    if not SEMANTIC_CACHE_ENABLED or embedding is None:
+        return
+    SEMANTIC_CACHES[namespace].set(key, embedding, value, scope)
+
+def get_semantic_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return hit-rate stats for every semantic cache namespace."""
+    return {namespace: cache.stats() for namespace, cache in SEMANTIC_CACHES.items()}
@@ -9,6 +9,7 @@ class UserPreferences(TypedDict):
     cuisine_type: Optional[List[str]]
     food_type: Optional[List[str]]
     location: str
+    price: Optional[str]  # price level as "$" to "$$$$"
     special_features: Optional[List[str]]  # special requirements (e.g., outdoor dining/area, payment_options, etc.)
 
 class ChatState(TypedDict):
@@ -0,0 +1,8 @@
+"""
+Shared test setup. The package is imported as zeal.backend; module-level stores are
+kept in memory so importing them never writes the default databases.
+"""
+import os
+
+os.environ.setdefault("CONVERSATION_BACKEND", "memory")
+os.environ.setdefault("DISK_CACHE_ENABLED", "0")
@@ -0,0 +1,67 @@
+"""Tests for the namespaced LRU + TTL query cache (memory/cache.py)."""
+from zeal.backend.memory import cache
+from zeal.backend.memory.cache import NamespaceCache, estimate_size
+
+def test_evicts_least_recently_used_first():
+    namespace = NamespaceCache("test", max_entries=3, max_bytes=1 << 20, segments=1)
+    for key in ("a", "b", "c"):
+        namespace.set(key, key.upper())
+    assert namespace.get("a") == "A"  # "b" is now the oldest
+    namespace.set("d", "D")
+    assert namespace.get("b") is None
+    assert [namespace.get(key) for key in ("a", "c", "d")] == ["A", "C", "D"]
+    assert namespace.stats()["evictions"] == 1
+
+def test_replacing_a_key_does_not_evict():
+    namespace = NamespaceCache("test", max_entries=2, max_bytes=1 << 20, segments=1)
+    namespace.set("a", 1)
+    namespace.set("b", 2)
+    namespace.set("a", 3)
+    assert namespace.get("a") == 3 and namespace.get("b") == 2
+    assert namespace.stats()["entries"] == 2
+    assert namespace.stats()["evictions"] == 0
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    namespace = NamespaceCache("test", max_entries=10, max_bytes=1 << 20, ttl=60, segments=1)
+    namespace.set("a", "A")
+    now[0] += 59
+    assert namespace.get("a") == "A"
+    now[0] += 2
+    assert namespace.get("a") is None
+    stats = namespace.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0 and stats["bytes"] == 0
+
+def test_byte_accounting_matches_entries():
+    namespace = NamespaceCache("test", max_entries=100, max_bytes=1 << 20, segments=4)
+    values = {f"key{i}": {"text": "x" * i, "items": list(range(i))} for i in range(20)}
+    for key, value in values.items():
+        namespace.set(key, value)
+    namespace.set("key3", "replaced")
+    values["key3"] = "replaced"
+    expected = sum(estimate_size(value) + estimate_size(key) for key, value in values.items())
+    assert namespace.stats()["bytes"] == expected
+    namespace.clear()
+    assert namespace.stats()["bytes"] == 0
+
+def test_byte_budget_evicts_and_skips_oversized_values():
+    value = "x" * 100
+    size = estimate_size(value) + estimate_size("k0")
+    namespace = NamespaceCache("test", max_entries=100, max_bytes=3 * size, segments=1)
+    for i in range(5):
+        namespace.set(f"k{i}", value)
+    stats = namespace.stats()
+    assert stats["entries"] == 3 and stats["bytes"] <= 3 * size
+    assert namespace.get("k0") is None and namespace.get("k4") == value
+    namespace.set("huge", "x" * (4 * size))
+    assert namespace.get("huge") is None
+    assert namespace.stats()["entries"] == 3
+
+def test_hit_rate():
+    namespace = NamespaceCache("test", max_entries=10, max_bytes=1 << 20)
+    namespace.set("a", 1)
+    namespace.get("a")
+    namespace.get("missing")
+    assert namespace.stats()["hit_rate"] == 0.5
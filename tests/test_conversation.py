@@ -0,0 +1,48 @@
+"""Tests for the striped LRU + TTL session store (memory/conversation.py)."""
+from zeal.backend.memory import conversation
+from zeal.backend.memory.conversation import ConversationMemory
+
+def messages(memory, session_id):
+    return [interaction["user_message"] for interaction in memory.get_history(session_id)]
+
+def test_history_is_capped_per_session():
+    memory = ConversationMemory(max_history_per_session=3, stripes=1)
+    for i in range(5):
+        memory.add_interaction("s", f"m{i}", f"r{i}")
+    assert messages(memory, "s") == ["m2", "m3", "m4"]
+    assert [interaction["user_message"] for interaction in memory.get_history("s", limit=1)] == ["m4"]
+
+def test_evicts_least_recently_used_session():
+    memory = ConversationMemory(max_sessions=2, stripes=1)
+    memory.add_interaction("a", "hi", "hello")
+    memory.add_interaction("b", "hi", "hello")
+    memory.get_history("a")  # "b" is now the least recently used
+    memory.add_interaction("c", "hi", "hello")
+    assert memory.get_history("b") == []
+    assert messages(memory, "a") == ["hi"] and messages(memory, "c") == ["hi"]
+    assert memory.stats()["evictions"] == 1
+
+def test_sessions_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation.time, "monotonic", lambda: now[0])
+    memory = ConversationMemory(session_ttl=60, stripes=1)
+    memory.add_interaction("s", "hi", "hello")
+    now[0] += 59
+    assert messages(memory, "s") == ["hi"]  # a read refreshes the session
+    now[0] += 59
+    assert messages(memory, "s") == ["hi"]
+    now[0] += 61
+    assert memory.get_history("s") == []
+    stats = memory.stats()
+    assert stats["expirations"] == 1 and stats["sessions"] == 0 and stats["bytes"] == 0
+
+def test_byte_accounting_follows_trimming_and_clearing():
+    memory = ConversationMemory(max_history_per_session=2, stripes=2)
+    for i in range(6):
+        memory.add_interaction(f"s{i % 2}", "x" * (10 * i), "ok")
+    sizes = sum(conversation.estimate_size(interaction) for session_id in ("s0", "s1")
+                for interaction in memory.get_history(session_id))
+    assert memory.stats()["bytes"] == sizes
+    memory.clear_session("s0")
+    memory.clear_session("s1")
+    assert memory.stats()["bytes"] == 0 and memory.stats()["sessions"] == 0
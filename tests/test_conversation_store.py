@@ -0,0 +1,112 @@
+"""Tests for the SQLite conversation backend (memory/conversation_store.py) shared by several memories."""
+import pytest
+from zeal.backend.memory import conversation
+from zeal.backend.memory.conversation import ConversationMemory
+from zeal.backend.memory.conversation_store import SQLiteConversationBackend
+
+@pytest.fixture
+def open_backend(tmp_path):
+    backends = []
+    def open_backend(**kwargs):
+        backend = SQLiteConversationBackend(str(tmp_path / "conversations.sqlite3"), flush_interval=0.01, **kwargs)
+        backends.append(backend)
+        return backend
+    yield open_backend
+    for backend in backends:
+        backend.close()
+
+def messages(memory, session_id):
+    return [interaction["user_message"] for interaction in memory.get_history(session_id)]
+
+def test_history_survives_a_new_memory(open_backend):
+    backend = open_backend()
+    first = ConversationMemory(backend=backend)
+    first.add_interaction("s", "hi", "hello")
+    first.add_interaction("s", "pizza?", "try Luigi's", {"restaurants": [{"id": "1", "name": "Luigi's"}]})
+    backend.flush()
+    restarted = ConversationMemory(backend=open_backend())
+    history = restarted.get_history("s")
+    assert [interaction["user_message"] for interaction in history] == ["hi", "pizza?"]
+    assert history[1]["metadata"]["restaurants"][0]["name"] == "Luigi's"
+
+def test_workers_see_each_others_turns(open_backend):
+    first_backend, second_backend = open_backend(), open_backend()
+    first = ConversationMemory(backend=first_backend, revalidate_seconds=0)
+    second = ConversationMemory(backend=second_backend, revalidate_seconds=0)
+    first.add_interaction("s", "m0", "r0")
+    first_backend.flush()
+    second.add_interaction("s", "m1", "r1")  # continues the persisted session
+    second_backend.flush()
+    assert messages(first, "s") == ["m0", "m1"]
+    assert messages(second, "s") == ["m0", "m1"]
+
+def test_cached_session_is_revalidated_after_its_age(open_backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation.time, "monotonic", lambda: now[0])
+    first_backend, second_backend = open_backend(), open_backend()
+    first = ConversationMemory(backend=first_backend, revalidate_seconds=5)
+    second = ConversationMemory(backend=second_backend, revalidate_seconds=5)
+    first.add_interaction("s", "m0", "r0")
+    first_backend.flush()
+    assert messages(second, "s") == ["m0"]
+    first.add_interaction("s", "m1", "r1")
+    first_backend.flush()
+    assert messages(second, "s") == ["m0"]  # served from its cache until it is due
+    now[0] += 6
+    assert messages(second, "s") == ["m0", "m1"]
+
+def test_revalidation_reloads_only_sessions_changed_elsewhere(open_backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation.time, "monotonic", lambda: now[0])
+    first_backend, second_backend = open_backend(), open_backend()
+    first = ConversationMemory(backend=first_backend, revalidate_seconds=5)
+    second = ConversationMemory(backend=second_backend, revalidate_seconds=5)
+    for i in range(3):
+        first.add_interaction("s", f"m{i}", f"r{i}")
+        first_backend.flush()
+        now[0] += 6
+        assert messages(first, "s") == [f"m{j}" for j in range(i + 1)]
+    assert first.stats()["backend_loads"] == 1  # its own writes never trigger a reload
+
+    second.add_interaction("s", "m3", "r3")
+    second_backend.flush()
+    now[0] += 6
+    assert messages(first, "s") == ["m0", "m1", "m2", "m3"]
+    assert first.stats()["backend_loads"] == 2
+
+    second.clear_session("s")
+    second_backend.flush()
+    now[0] += 6
+    assert first.get_history("s") == []
+
+def test_backend_trims_and_deletes_sessions(open_backend):
+    backend = open_backend(max_history=3)
+    for i in range(5):
+        backend.append("s", {"timestamp": 1e9 + i, "user_message": f"m{i}"})
+    backend.flush()
+    assert [interaction["user_message"] for interaction in backend.load_history("s", 10)] == ["m2", "m3", "m4"]
+    backend.delete("s")
+    backend.flush()
+    assert backend.load_history("s", 10) == []
+
+def test_rolling_summary_survives_a_new_memory(open_backend, monkeypatch):
+    monkeypatch.setattr(conversation, "CONVERSATION_SUMMARY_KEEP_TURNS", 2)
+    monkeypatch.setattr(conversation, "CONVERSATION_SUMMARY_BATCH", 2)
+    summarizer = lambda summary, turns: " ".join(filter(None, [summary] + [turn["user_message"] for turn in turns]))
+    backend = open_backend()
+    first = ConversationMemory(backend=backend, summarizer=summarizer)
+    for i in range(6):
+        first.add_interaction("s", f"m{i}", f"r{i}")
+        first._summary_executor.submit(lambda: None).result()  # let a summarization finish before the next turn
+    backend.flush()
+    summary, turns = first.get_window("s", 1000)
+    assert summary == "m0 m1 m2 m3"
+
+    restarted = ConversationMemory(backend=open_backend(), summarizer=summarizer)
+    summary, turns = restarted.get_window("s", 1000)
+    assert summary == "m0 m1 m2 m3"
+    assert [turn["user_message"] for turn in turns] == ["m4", "m5"]
+
+    restarted.clear_session("s")
+    restarted.backend.flush()
+    assert ConversationMemory(backend=open_backend()).get_window("s", 1000) == (None, [])
@@ -0,0 +1,77 @@
+"""Tests for the ring-buffer query-embedding store (database/embedding_cache.py)."""
+import os
+from zeal.backend.database.embedding_cache import EmbeddingStore, key_digest
+
+def vector(i):
+    return [float(i), float(i) + 0.5, -float(i)]
+
+def test_ring_overwrites_oldest_entry():
+    store = EmbeddingStore(max_entries=3)
+    for i in range(4):
+        store.set(f"q{i}", vector(i))
+    assert store.get("q0") is None
+    assert [store.get(f"q{i}") for i in (1, 2, 3)] == [vector(1), vector(2), vector(3)]
+    assert len(store) == 3
+
+def test_existing_key_keeps_its_slot():
+    store = EmbeddingStore(max_entries=2)
+    store.set("a", vector(1))
+    store.set("a", vector(2))
+    store.set("b", vector(3))
+    assert store.get("a") == vector(1) and store.get("b") == vector(3)
+
+def test_rejects_other_dimensions():
+    store = EmbeddingStore(max_entries=2)
+    store.set("a", vector(1))
+    store.set("b", [1.0, 2.0])
+    assert store.get("b") is None and len(store) == 1
+
+def test_key_digest_is_stable_and_non_zero():
+    assert key_digest("query") == key_digest("query") != key_digest("other")
+    assert all(0 < key_digest(f"k{i}") < 2 ** 63 for i in range(100))
+
+def test_spilled_store_survives_reopen(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    store = EmbeddingStore(max_entries=4, path=path)
+    for i in range(3):
+        store.set(f"q{i}", vector(i))
+    reopened = EmbeddingStore(max_entries=4, path=path)
+    assert [reopened.get(f"q{i}") for i in range(3)] == [vector(0), vector(1), vector(2)]
+
+def test_instances_continue_a_shared_ring(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    first = EmbeddingStore(max_entries=2, path=path)
+    first.set("a", vector(1))
+    second = EmbeddingStore(max_entries=2, path=path)
+    second.set("b", vector(2))
+    second.set("c", vector(3))  # wraps the ring over "a"'s slot
+    assert first.get("a") is None
+    assert second.get("b") == vector(2) and second.get("c") == vector(3)
+
+def test_stale_slot_is_not_served_after_another_instance_overwrites_it(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    first = EmbeddingStore(max_entries=1, path=path)
+    first.set("a", vector(1))
+    second = EmbeddingStore(max_entries=1, path=path)
+    second.set("b", vector(2))
+    assert first.get("a") is None
+    assert EmbeddingStore(max_entries=1, path=path).get("b") == vector(2)
+
+def test_key_log_is_compacted_when_the_ring_wraps(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    store = EmbeddingStore(max_entries=4, path=path)
+    for i in range(40):
+        store.set(f"q{i}", vector(i))
+    with open(path + ".keys", "r", encoding="utf-8") as file:
+        assert len(file.readlines()) == 4
+    reopened = EmbeddingStore(max_entries=4, path=path)
+    assert sorted(reopened.slots) == ["q36", "q37", "q38", "q39"]
+
+def test_capacity_change_ignores_spilled_store(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    EmbeddingStore(max_entries=2, path=path).set("a", vector(1))
+    resized = EmbeddingStore(max_entries=3, path=path)
+    assert resized.get("a") is None
+    resized.set("b", vector(2))
+    assert resized.get("b") == vector(2)
+    assert os.path.exists(path + ".slots.npy")
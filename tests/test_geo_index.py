@@ -0,0 +1,89 @@
+"""Tests for the grid-bucketed geospatial index (database/geo_index.py) against brute-force haversine."""
+import math
+import random
+import pytest
+from zeal.backend.database.geo_index import EARTH_RADIUS_METERS, GeoIndex
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(a, 1.0)))
+
+def restaurant(restaurant_id, lat, lon, **fields):
+    return {"id": restaurant_id, "location_geom": {"type": "Point", "coordinates": [lon, lat]}, **fields}
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(7)
+    points = {}
+    for center_lat, center_lon in ((40.73, -73.99), (34.05, -118.24), (64.14, -21.94), (0.0, 179.99)):
+        for _ in range(300):
+            lon = (center_lon + rng.uniform(-0.2, 0.2) + 180) % 360 - 180
+            points[f"r{len(points)}"] = (center_lat + rng.uniform(-0.2, 0.2), lon)
+    return points
+
+@pytest.fixture(scope="module")
+def index(points):
+    index = GeoIndex(cell_degrees=0.01)
+    for restaurant_id, (lat, lon) in points.items():
+        index.add(restaurant(restaurant_id, lat, lon))
+    return index.build()
+
+@pytest.mark.parametrize("lat, lon", [(40.73, -73.99), (40.9, -74.15), (34.0, -118.3), (64.14, -21.94), (0.05, 179.95), (0.0, 179.998), (0.0, -179.998)])
+@pytest.mark.parametrize("radius", [50, 800, 5000, 40000])
+def test_within_matches_brute_force(index, points, lat, lon, radius):
+    expected = {restaurant_id for restaurant_id, point in points.items() if haversine(lat, lon, *point) <= radius}
+    results = index.within(lat, lon, radius)
+    assert {restaurant_id for restaurant_id, _ in results} == expected
+    distances = [distance for _, distance in results]
+    assert distances == sorted(distances)
+    for restaurant_id, distance in results:
+        assert distance == pytest.approx(haversine(lat, lon, *points[restaurant_id]), abs=1e-3)
+
+def test_nearest_matches_brute_force(index, points):
+    lat, lon = 34.05, -118.24
+    expected = sorted(points, key=lambda restaurant_id: haversine(lat, lon, *points[restaurant_id]))[:10]
+    assert [restaurant_id for restaurant_id, _ in index.nearest(lat, lon, 10)] == expected
+    subset = expected[5:] + ["r0", "missing"]
+    assert [restaurant_id for restaurant_id, _ in index.nearest(lat, lon, 3, subset)] == expected[5:8]
+
+def test_invalid_coordinates_are_skipped():
+    index = GeoIndex()
+    index.add(restaurant("ok", 40.0, -74.0))
+    index.add(restaurant("out-of-range", 95.0, -74.0))
+    index.add({"id": "missing", "location_geom": None})
+    index.add(restaurant("", 40.0, -74.0))
+    index.build()
+    assert index.ids == ["ok"]
+    assert [restaurant_id for restaurant_id, _ in index.within(40.0, -74.0, 10)] == ["ok"]
+
+def test_empty_index():
+    index = GeoIndex().build()
+    assert index.within(40.0, -74.0, 1000) == []
+    assert index.nearest(40.0, -74.0, 5) == []
+
+@pytest.fixture(scope="module")
+def places():
+    index = GeoIndex()
+    for row, (lat, lon) in enumerate(((40.723, -74.002), (40.724, -74.000), (40.735, -73.991), (40.736, -73.990))):
+        neighborhood = "SoHo" if row < 2 else "Union Square"
+        index.add(restaurant(f"p{row}", lat, lon, neighborhood=neighborhood, city="New York"))
+    return index.build()
+
+@pytest.mark.parametrize("message, place", [
+    ("sushi near soho", "soho"),
+    ("dinner around the union square area", "union square"),
+    ("pizza within 2 blocks of union square", "union square"),
+    ("closest ramen to soho", "soho"),
+    ("any tacos nearby?", "soho"),  # the place comes from the extracted location
+])
+def test_proximity_requests(places, message, place):
+    assert places.parse_proximity(message, location="soho")["place"] == place
+
+@pytest.mark.parametrize("message", [
+    "a table around 8pm in soho",
+    "something near $20 a head in soho",
+    "italian in new york",
+])
+def test_near_without_a_place_after_it_is_not_proximity(places, message):
+    assert places.parse_proximity(message) is None
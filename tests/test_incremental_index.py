@@ -0,0 +1,145 @@
+"""Tests for index builds and incremental syncs (database/index_builder.py, database/incremental_index.py)."""
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from zeal.backend.database import index_builder, vector_store
+from zeal.backend.database.mapped_index import has_mapped_docstore, load_mapped_index, restamp_side_files
+from zeal.backend.database.incremental_index import MANIFEST_FILE, catalog_changed, load_manifest, sync_index
+from zeal.backend.database.index_builder import build_index
+from zeal.backend.database.vector_store import load_faiss_index
+
+class StubEmbeddings(Embeddings):
+    """Deterministic embeddings derived from a hash of the text, counting the texts embedded."""
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(8).astype(np.float32).tolist()
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embeddings = StubEmbeddings()
+    monkeypatch.setattr(index_builder, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(vector_store, "get_embeddings", lambda: embeddings)
+    return embeddings
+
+def restaurant(restaurant_id, name, **fields):
+    return {"id": restaurant_id, "name": name, "city": "New York", "cuisines": ["Italian"], **fields}
+
+def write_catalog(path, restaurants):
+    path.write_text(json.dumps(restaurants), encoding="utf-8")
+    manifest = path.parent / "index" / MANIFEST_FILE
+    if manifest.exists():  # date the manifest before the edit, however coarse the file system clock
+        modified = path.stat().st_mtime_ns - 1_000_000_000
+        os.utime(manifest, ns=(modified, modified))
+
+def indexed_docs(index_dir, embeddings, mmap=False):
+    store = load_faiss_index(str(index_dir), embeddings, mmap=mmap)
+    docs = [store.docstore.search(store.index_to_docstore_id[row]) for row in range(store.index.ntotal)]
+    return {doc.metadata["id"]: doc for doc in docs}
+
+def test_build_then_sync_applies_each_kind_of_change(tmp_path, embeddings):
+    catalog, index_dir = tmp_path / "restaurants.json", tmp_path / "index"
+    write_catalog(catalog, [restaurant("1", "Luigi's"), restaurant("2", "Sakura"), restaurant("3", "Taqueria")])
+    build_index(str(catalog), str(index_dir), workers=1, max_docs=2)
+    assert len(embeddings.embedded) == 3
+    assert not os.path.exists(str(index_dir) + ".build")
+    assert not catalog_changed(str(catalog), str(index_dir))
+
+    write_catalog(catalog, [
+        restaurant("1", "Luigi's", images_url="https://example.com/1.jpg"),  # metadata only
+        restaurant("2", "Sakura", description="Omakase counter"),  # re-worded
+        restaurant("4", "Noodle Bar"),  # added; "3" is deleted
+    ])
+    assert catalog_changed(str(catalog), str(index_dir))
+    embeddings.embedded.clear()
+    counts = sync_index(load_faiss_index(str(index_dir), embeddings), str(catalog), str(index_dir))
+    assert counts == {"added": 1, "reembedded": 1, "metadata_updated": 1, "deleted": 1, "unchanged": 0}
+    assert len(embeddings.embedded) == 2 and "Omakase counter" in "".join(embeddings.embedded)
+    assert set(load_manifest(str(index_dir))["restaurants"]) == {"1", "2", "4"}
+    assert not catalog_changed(str(catalog), str(index_dir))
+
+    for mmap in (False, True):
+        docs = indexed_docs(index_dir, embeddings, mmap)
+        assert set(docs) == {"1", "2", "4"}
+        assert docs["1"].metadata["images_url"] == "https://example.com/1.jpg"
+        assert "Omakase counter" in docs["2"].page_content
+        store = load_faiss_index(str(index_dir), embeddings, mmap=mmap)
+        match = store.similarity_search_by_vector(embeddings.embed_query(docs["4"].page_content), k=1)[0]
+        assert match.metadata["id"] == "4"
+
+def test_unchanged_catalog_embeds_nothing(tmp_path, embeddings):
+    catalog, index_dir = tmp_path / "restaurants.json", tmp_path / "index"
+    write_catalog(catalog, [restaurant("1", "Luigi's"), restaurant("2", "Sakura")])
+    build_index(str(catalog), str(index_dir), workers=1)
+    embeddings.embedded.clear()
+    counts = sync_index(load_faiss_index(str(index_dir), embeddings), str(catalog), str(index_dir))
+    assert counts["unchanged"] == 2 and embeddings.embedded == []
+
+def test_failed_save_keeps_the_manifest_and_checkpoints(tmp_path, embeddings, monkeypatch):
+    catalog, index_dir = tmp_path / "restaurants.json", tmp_path / "index"
+    write_catalog(catalog, [restaurant("1", "Luigi's"), restaurant("2", "Sakura")])
+
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+    with monkeypatch.context() as patch:
+        patch.setattr(FAISS, "save_local", fail)
+        with pytest.raises(OSError):
+            build_index(str(catalog), str(index_dir), workers=1, max_docs=1)
+    assert load_manifest(str(index_dir)) is None
+    assert sorted(os.listdir(str(index_dir) + ".build")) == [
+        "batch_000000.npy", "batch_000000.sha256", "batch_000001.npy", "batch_000001.sha256"]
+
+    embeddings.embedded.clear()
+    build_index(str(catalog), str(index_dir), workers=1, max_docs=1)
+    assert embeddings.embedded == []  # resumed from the checkpoints
+    manifest = load_manifest(str(index_dir))
+
+    write_catalog(catalog, [restaurant("1", "Luigi's"), restaurant("3", "Taqueria")])
+    with monkeypatch.context() as patch:
+        patch.setattr(FAISS, "save_local", fail)
+        with pytest.raises(OSError):
+            sync_index(load_faiss_index(str(index_dir), embeddings), str(catalog), str(index_dir))
+    assert load_manifest(str(index_dir)) == manifest
+    assert catalog_changed(str(catalog), str(index_dir))
+    assert set(indexed_docs(index_dir, embeddings)) == {"1", "2"}
+
+def test_readers_never_pair_files_from_two_saves(tmp_path, embeddings):
+    catalog, index_dir = tmp_path / "restaurants.json", tmp_path / "index"
+    write_catalog(catalog, [restaurant("1", "Luigi's"), restaurant("2", "Sakura"), restaurant("3", "Taqueria")])
+    build_index(str(catalog), str(index_dir), workers=1)
+    first, second = tmp_path / "first", tmp_path / "second"
+    shutil.copytree(index_dir, first)  # copy2 keeps the modification times the stamps are made of
+    write_catalog(catalog, [restaurant("1", "Luigi's"), restaurant("2", "Sakura"), restaurant("4", "Noodle Bar")])
+    sync_index(load_faiss_index(str(index_dir), embeddings), str(catalog), str(index_dir))
+    shutil.copytree(index_dir, second)
+    assert len([name for name in os.listdir(index_dir) if name.startswith("docstore.") and name.endswith(".records")]) == 2  # this save and the last
+
+    # Side files and config written, index files not renamed yet: only the heap copy loads, as the old index
+    for name in ("index.faiss", "index.pkl"):
+        shutil.copy2(first / name, index_dir / name)
+    assert load_mapped_index(str(index_dir), embeddings) is None
+    assert set(indexed_docs(index_dir, embeddings)) == {"1", "2", "3"}
+
+    # index.faiss renamed, index.pkl not yet: the heap copy would pair the new rows with the old docstore
+    shutil.copy2(second / "index.faiss", index_dir / "index.faiss")
+    assert load_faiss_index(str(index_dir), embeddings) is None
+    assert set(indexed_docs(index_dir, embeddings, mmap=True)) == {"1", "2", "4"}
+
+    # A copy without modification times maps again once its side files are restamped
+    copied = tmp_path / "copied"
+    shutil.copytree(second, copied, copy_function=shutil.copyfile)
+    assert not has_mapped_docstore(str(copied)) and load_mapped_index(str(copied), embeddings) is None
+    restamp_side_files(load_faiss_index(str(copied), embeddings), str(copied))
+    assert has_mapped_docstore(str(copied))
+    assert set(indexed_docs(copied, embeddings, mmap=True)) == {"1", "2", "4"}
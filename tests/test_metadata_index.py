@@ -0,0 +1,28 @@
+"""Tests for the metadata pre-filter index (database/restaurant_loader.py)."""
+import pytest
+from zeal.backend.database.restaurant_loader import build_metadata_index
+
+@pytest.fixture(scope="module")
+def index():
+    return build_metadata_index([
+        {"id": "1", "city": "New York", "state": "NY", "neighborhood": "SoHo", "cuisines": ["Italian"], "price": "$$"},
+        {"id": "2", "city": "Brooklyn", "state": "NY", "neighborhood": "Williamsburg", "cuisines": ["Pizza"], "price": "$"},
+        {"id": "3", "city": "Buffalo", "state": "NY", "cuisines": ["Italian"], "price": "$$"},
+        {"id": "4", "city": "Boston", "state": "MA", "cuisines": ["Italian"], "price": "$$$"},
+    ])
+
+@pytest.mark.parametrize("location, expected", [
+    ("NYC", {"1", "2"}),  # boroughs belong to the New York metro
+    ("new york", {"1", "2"}),
+    ("brooklyn", {"2"}),
+    ("ny", {"1", "2", "3"}),  # the state, as well as the aliased city
+    ("soho", {"1"}),
+    ("boston", {"4"}),
+])
+def test_location_matching(index, location, expected):
+    assert index.candidate_ids({"location": location}) == expected
+
+def test_constraints_are_intersected_and_relaxed(index):
+    assert index.candidate_ids({"location": "NYC", "cuisine_type": ["italian"]}) == {"1"}
+    assert index.candidate_ids({"location": "boston", "cuisine_type": "pizza"}) == {"4"}  # cuisine relaxed
+    assert index.candidate_ids({"location": "atlantis"}) is None
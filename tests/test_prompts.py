@@ -0,0 +1,34 @@
+"""Tests for the cacheable-prefix accounting of stable prompts (llm/prompts.py)."""
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from zeal.backend.llm.prompts import StablePrompt
+
+def turns(count, topic="ramen"):
+    messages = []
+    for turn in range(count):
+        messages += [HumanMessage(content=f"Question {turn} about {topic} " + "spots nearby " * 40),
+                     AIMessage(content=f"Answer {turn} about {topic} " + "some place downtown " * 40)]
+    return messages
+
+def cacheable_tokens(prompt, history, session_id):
+    before = prompt.cacheable_tokens
+    prompt.assemble(history, [HumanMessage(content="and the next one?")], session_id)
+    return prompt.cacheable_tokens - before
+
+def test_only_history_unchanged_since_the_last_call_is_cacheable():
+    prompt = StablePrompt("test", "You recommend restaurants.")
+    history = turns(6)
+    assert cacheable_tokens(prompt, history, "a") == 0  # first call: nothing cached but the short static prefix
+    reused = cacheable_tokens(prompt, history + turns(1, "tacos"), "a")
+    assert reused == prompt.prefix_tokens + sum(prompt.previous_calls["a"][row][1] for row in range(len(history)))
+    assert cacheable_tokens(prompt, history, "b") == 0  # another session's history was never sent before
+
+    # A summary replacing the oldest turns changes the first message, so nothing after it is reused
+    summarized = [SystemMessage(content="Summary: the user likes ramen.")] + history[4:]
+    assert cacheable_tokens(prompt, summarized, "a") == 0
+
+def test_prefix_below_the_provider_minimum_is_not_cacheable():
+    prompt = StablePrompt("test", "You recommend restaurants.")
+    history = turns(1)
+    for _ in range(3):
+        assert cacheable_tokens(prompt, history, "a") == 0
+    assert prompt.stats()["cacheable_fraction"] == 0
@@ -0,0 +1,45 @@
+"""Tests for streaming restaurant records from JSON and JSON Lines files (database/restaurant_loader.py)."""
+import json
+import pytest
+from zeal.backend.database.restaurant_loader import iter_restaurants
+
+RESTAURANTS = [
+    {"id": "1", "name": "Luigi's [Pizza], Bar", "cuisine_type": ["Italian", "Pizza"]},
+    {"id": "2", "name": "Café \"Ü\" 東京", "menu": {"items": [{"dish": "ramen, spicy", "price": 14.5}]}},
+    {"id": "3", "name": "", "hours": None, "nested": [[], {}, [{"a": "}]"}]]},
+    {"id": "4", "description": "x" * 300},
+]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("separator", [",", ",\n  ", " ,\r\n"])
+def test_array_matches_json_load(tmp_path, chunk_size, separator):
+    path = tmp_path / "restaurants.json"
+    path.write_text("\n [" + separator.join(json.dumps(restaurant, ensure_ascii=False) for restaurant in RESTAURANTS) + "]\n",
+                    encoding="utf-8")
+    assert list(iter_restaurants(str(path), chunk_size=chunk_size)) == RESTAURANTS
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_empty_array(tmp_path, chunk_size):
+    path = tmp_path / "restaurants.json"
+    path.write_text("[ ]", encoding="utf-8")
+    assert list(iter_restaurants(str(path), chunk_size=chunk_size)) == []
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+def test_truncated_array_raises(tmp_path, chunk_size):
+    path = tmp_path / "restaurants.json"
+    path.write_text("[" + json.dumps(RESTAURANTS[0]) + ", {\"id\": \"2\", \"na", encoding="utf-8")
+    restaurants = iter_restaurants(str(path), chunk_size=chunk_size)
+    assert next(restaurants) == RESTAURANTS[0]
+    with pytest.raises(json.JSONDecodeError):
+        next(restaurants)
+
+def test_json_lines_skip_blank_and_malformed_lines(tmp_path):
+    path = tmp_path / "restaurants.jsonl"
+    lines = [json.dumps(restaurant, ensure_ascii=False) for restaurant in RESTAURANTS]
+    path.write_text("\n".join(lines[:2] + ["", "{\"id\": \"broken\""] + lines[2:]) + "\n", encoding="utf-8")
+    assert list(iter_restaurants(str(path), chunk_size=1)) == RESTAURANTS
+
+def test_json_lines_detected_without_extension(tmp_path):
+    path = tmp_path / "restaurants.json"
+    path.write_text("\n".join(json.dumps(restaurant) for restaurant in RESTAURANTS), encoding="utf-8")
+    assert list(iter_restaurants(str(path))) == RESTAURANTS
@@ -0,0 +1,128 @@
+"""
+Process-level application context and startup warm-up for the restaurant agent.
+"""
+import threading
+import time
+from zeal.backend.logger import logger
+from zeal.backend.config import WARMUP_QUERY, WARMUP_LLM_CALL
+from zeal.backend.database.vector_store import setup_retriever_with_persistence
+from zeal.backend.database.sharded_index import get_sharded_index
+from zeal.backend.database.restaurant_store import get_restaurant_store
+from zeal.backend.database.restaurant_loader import get_metadata_index
+from zeal.backend.database.name_index import get_name_index
+from zeal.backend.database.gazetteer import get_gazetteer
+from zeal.backend.database.geo_index import get_geo_index
+from zeal.backend.handlers.intent_classifier import get_intent_classifier
+from zeal.backend.llm.llm_interface import get_llm
+from zeal.backend.workflow.graph import get_compiled_graph
+
+# (temperature, streaming) pairs used by the analyzer and the intent handlers
+LLM_CLIENTS = ((0, False), (0.2, False), (0.2, True))
+
+class AppContext:
+    """Long-lived resources shared by every request: the compiled graphs, the retriever, the index shards, the catalog lookups and the LLM clients."""
+    def __init__(self):
+        """Initialize an empty, not-yet-ready application context."""
+        self.graph = None
+        self.async_graph = None
+        self.retriever = None
+        self.sharded_index = None
+        self.llms = {}
+        self.warmup_seconds = None
+        self.warmup_error = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def initialize(self):
+        """
+        Build the compiled graph, retriever, index shards, catalog lookups and LLM clients.
+        All of them are cached at module level, so request handlers reuse the exact same
+        instances instead of building them on the first request (or, on the async path,
+        inside a node where the build would block the event loop).
+        """
+        logger.info("Initializing application context")
+        self.graph = get_compiled_graph()
+        self.async_graph = get_compiled_graph(use_async=True)
+        self.retriever = setup_retriever_with_persistence()
+        self.sharded_index = get_sharded_index()  # cuts stale shards now rather than on the first request
+        # Each of these is built by its own pass over the catalog
+        get_restaurant_store()
+        get_metadata_index()
+        get_name_index()
+        get_gazetteer()
+        get_geo_index()
+        get_intent_classifier()
+        for temperature, streaming in LLM_CLIENTS:
+            self.llms[(temperature, streaming)] = get_llm(temperature=temperature, streaming=streaming)
+        logger.info("Application context initialized")
+
+    def warm_up(self):
+        """
+        Run one end-to-end retrieval (embedding call + FAISS search) and, if enabled,
+        a one-token request per LLM client so connection pools are open before the
+        first user arrives.
+        """
+        logger.info("Running warm-up pass")
+        results = self.retriever.invoke(WARMUP_QUERY)
+        logger.debug(f"Warm-up retrieval returned {len(results)} documents")
+
+        if WARMUP_LLM_CALL:
+            for (temperature, streaming), llm in self.llms.items():
+                llm.invoke("ping", max_tokens=1)
+                logger.debug(f"Warmed up LLM client with temperature={temperature}, streaming={streaming}")
+
+    def start(self, background=True):
+        """
+        Initialize and warm up the context once per process.
+
+        Args:
+            background: Whether to run the warm-up in a daemon thread
+        """
+        with self._lock:
+            if self._thread is not None or self._ready.is_set():
+                return
+            self._thread = threading.Thread(target=self._run, name="app-warmup", daemon=True)
+
+        if background:
+            self._thread.start()
+        else:
+            self._run()
+
+    def _run(self):
+        """Initialize and warm up, recording the outcome for the readiness check."""
+        start_time = time.time()
+        try:
+            self.initialize()
+            self.warm_up()
+            self.warmup_seconds = time.time() - start_time
+            self._ready.set()
+            logger.info(f"Warm-up finished in {self.warmup_seconds:.2f}s, application is ready")
+        except Exception as e:
+            self.warmup_error = str(e)
+            logger.error(f"Warm-up failed: {e}", exc_info=True)
+
+    def is_ready(self):
+        """Return True once initialization and warm-up have both completed."""
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until warm-up finishes or the timeout expires. Returns readiness."""
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """Return a readiness summary suitable for a health endpoint."""
+        if self.is_ready():
+            state = "ready"
+        elif self.warmup_error:
+            state = "failed"
+        else:
+            state = "warming_up"
+        return {
+            "status": state,
+            "warmup_seconds": round(self.warmup_seconds, 2) if self.warmup_seconds is not None else None,
+            "error": self.warmup_error
+        }
+
+# Create global application context
+APP_CONTEXT = AppContext()
@@ -1,24 +1,38 @@
-from zeal.backend.handlers.intent_handlers import handle_restaurant_recommendation, handle_restaurant_info, handle_casual_conversation
-from zeal.backend.handlers.query_analyzer import analyze_user_query
+from zeal.backend.handlers.intent_handlers import (
+    handle_restaurant_recommendation, handle_restaurant_info, handle_casual_conversation,
+    ahandle_restaurant_recommendation, ahandle_restaurant_info, ahandle_casual_conversation,
+    RECOMMENDATION_ERROR_MESSAGE
+)
+from zeal.backend.handlers.query_analyzer import analyze_user_query, aanalyze_user_query
 from zeal.backend.handlers.router import route_query
+from zeal.backend.handlers.intent_classifier import get_intent_classifier
 from zeal.backend.models.data_models import ChatState
 from zeal.backend.logger import logger
-from zeal.backend.memory.conversation import ConversationMemory, CONVERSATION_MEMORY
-from zeal.backend.llm.llm_interface import get_llm
-from zeal.backend.config import OPENAI_API_KEY
+from zeal.backend.memory.conversation import CONVERSATION_MEMORY
+from zeal.backend.memory.semantic_cache import get_semantic_cached_response, set_semantic_cached_response
+from zeal.backend.database.vector_store import embed_text, aembed_text
+from zeal.backend.llm.llm_interface import StreamingCallbackHandler, AsyncStreamingCallbackHandler
 
+import asyncio
 import time
 import queue
 import threading
+from functools import lru_cache
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, END
 
 
+# Sent to streaming clients in an error event when a response fails part-way
+STREAM_ERROR_MESSAGE = "Sorry, there was an error processing your request."
+
 # Main workflow graph definition
-def create_restaurant_assistant_graph() -> StateGraph:
+def create_restaurant_assistant_graph(use_async: bool = False) -> StateGraph:
     """
     Creates the main workflow graph for the restaurant chatbot
     
+    Args:
+        use_async: Whether to use the async node implementations (for graph.ainvoke)
+    
     Returns:
         A StateGraph object representing the workflow
     """
@@ -26,10 +40,16 @@ def create_restaurant_assistant_graph() -> StateGraph:
     workflow = StateGraph(ChatState)
     
     # Add nodes to the graph
-    workflow.add_node("analyze_query", analyze_user_query)
-    workflow.add_node("restaurant_recommendation", handle_restaurant_recommendation)
-    workflow.add_node("restaurant_info", handle_restaurant_info)
-    workflow.add_node("casual_conversation", handle_casual_conversation)
+    if use_async:
+        workflow.add_node("analyze_query", aanalyze_user_query)
+        workflow.add_node("restaurant_recommendation", ahandle_restaurant_recommendation)
+        workflow.add_node("restaurant_info", ahandle_restaurant_info)
+        workflow.add_node("casual_conversation", ahandle_casual_conversation)
+    else:
+        workflow.add_node("analyze_query", analyze_user_query)
+        workflow.add_node("restaurant_recommendation", handle_restaurant_recommendation)
+        workflow.add_node("restaurant_info", handle_restaurant_info)
+        workflow.add_node("casual_conversation", handle_casual_conversation)
     
     # Add edges
     workflow.add_conditional_edges(
@@ -52,6 +72,74 @@ def create_restaurant_assistant_graph() -> StateGraph:
     
     return workflow.compile()
 
+@lru_cache(maxsize=2)
+def get_compiled_graph(use_async: bool = False):
+    """
+    Returns the compiled workflow graph, compiling it only once per process
+    
+    Args:
+        use_async: Whether to return the graph built from the async nodes
+    
+    Returns:
+        The compiled restaurant assistant graph
+    """
+    logger.info(f"Compiling restaurant assistant graph (async={use_async})")
+    return create_restaurant_assistant_graph(use_async)
+
+def _initial_state(message, session_id) -> ChatState:
+    """Build the initial graph state for a new user message."""
+    return ChatState(
+        messages=[HumanMessage(content=message)],
+        intent=None,
+        user_preferences={"cuisine_type": [], "food_type": [], "location": "", "price": "", "special_features": []},
+        specific_restaurant=None,
+        restaurant_matches=None,
+        conversation_history=None,
+        session_id=session_id
+    )
+
+def _final_response(result) -> str:
+    """Extract the final bot response from a graph result."""
+    return result["messages"][-1].content if result["messages"] else "I'm not sure how to respond to that."
+
+def _store_interaction(session_id, message, response, result) -> None:
+    """Store a completed interaction in conversation memory, with the restaurants it mentioned."""
+    CONVERSATION_MEMORY.add_interaction(
+        session_id=session_id,
+        user_message=message,
+        bot_response=response,
+        metadata={
+            "intent": result.get("intent"),
+            "preferences": result.get("user_preferences"),
+            "restaurants": [
+                {"id": match.get("id"), "name": match.get("name")}
+                for match in result.get("restaurant_matches") or []
+            ]
+        }
+    )
+
+def _uses_response_cache(message, session_id) -> bool:
+    """
+    Only first turns are answered from the response cache; later turns depend on history.
+    Messages the local classifier recognizes as casual skip it too, so a greeting never
+    waits for an embedding request.
+    """
+    return not get_intent_classifier().is_casual(message) and not CONVERSATION_MEMORY.get_history(session_id, limit=1)
+
+def _cache_response(message, embedding, response, result) -> None:
+    """Cache a first-turn response semantically, unless it is an error message."""
+    if embedding is None or response == RECOMMENDATION_ERROR_MESSAGE:
+        return
+    set_semantic_cached_response("response", message, embedding, {
+        "response": response,
+        "intent": result.get("intent"),
+        "user_preferences": result.get("user_preferences"),
+        "restaurant_matches": [
+            {"id": match.get("id"), "name": match.get("name")}
+            for match in result.get("restaurant_matches") or []
+        ]
+    })
+
 # Create an application function to handle incoming messages
 def handle_message(message, session_id=None, stream=False):
     """
@@ -64,78 +152,68 @@ def handle_message(message, session_id=None, stream=False):
         
     Returns:
         If stream=False: str with the complete response
-        If stream=True: Generator that yields tokens one by one
+        If stream=True: Generator that yields tokens one by one, and raises the
+            error if the response fails part-way
     """
     # Default session ID if none provided
     if not session_id:
         session_id = str(int(time.time()))
     
-    # Initialize streaming queue if needed
-    response_queue = queue.Queue() if stream else None
+    # Answer paraphrases of already answered first-turn messages from the semantic response cache
+    embedding = embed_text(message) if _uses_response_cache(message, session_id) else None
+    cached = get_semantic_cached_response("response", embedding)
+    if cached:
+        logger.info("Using semantically cached response")
+        _store_interaction(session_id, message, cached["response"], cached)
+        return iter([cached["response"]]) if stream else cached["response"]
     
-    # Create or get the compiled graph
-    graph = create_restaurant_assistant_graph()
+    # Get the process-wide compiled graph
+    graph = get_compiled_graph()
     
     # Initialize the state
-    state = ChatState(
-        messages=[HumanMessage(content=message)],
-        intent=None,
-        user_preferences={"cuisine_type": [], "food_type": [], "location": "", "special_features": []},
-        specific_restaurant=None,
-        restaurant_matches=None,
-        conversation_history=None,
-        session_id=session_id
-    )
+    state = _initial_state(message, session_id)
 
-    # Get streaming LLM if streaming is requested
-    if stream:
-        # Override the get_llm function result in the global namespace
-        global get_llm
-        original_get_llm = get_llm
-        
-        def streaming_get_llm(*args, **kwargs):
-            return original_get_llm(streaming=True, queue=response_queue, *args, **kwargs)
-        
-        get_llm = streaming_get_llm # Temporarily replaces get_llm with our streaming version
-    
     # Starts processing in a separate thread if streaming
     if stream:
+        # Request-scoped queue and callback: nothing is shared with concurrent requests
+        response_queue = queue.Queue()
+        streaming_handler = StreamingCallbackHandler(response_queue)
+        config = {
+            "callbacks": [streaming_handler],
+            "configurable": {"stream_response": True}
+        }
+        
         def response_generator(): # generator to yield streaming tokens
             # Start a thread to process the request
             def process_request():
-                nonlocal graph, state
                 try:
-                    result = graph.invoke(state)
-                    response_queue.put(None) # Signal completion
+                    result = graph.invoke(state, config=config)
                     
                     # Get the final response for memory storage
-                    response = result["messages"][-1].content if result["messages"] else "I'm not sure how to respond to that."
+                    response = _final_response(result)
                     
-                    CONVERSATION_MEMORY.add_interaction( # Stores the interaction in memory
-                        session_id=session_id,
-                        user_message=message,
-                        bot_response=response,
-                        metadata={
-                            "intent": result.get("intent"),
-                            "preferences": result.get("user_preferences")
-                        }
-                    )
+                    # Responses that never reached the LLM (cache hits, error messages) are sent in one piece
+                    if streaming_handler.token_count == 0:
+                        response_queue.put(response)
+                    
+                    _store_interaction(session_id, message, response, result) # Stores the interaction in memory
+                    _cache_response(message, embedding, response, result)
                 except Exception as e:
-                    logger.error(f"Error in streaming process: {e}")
+                    logger.error(f"Error in streaming process: {e}", exc_info=True)
+                    response_queue.put(e)  # Re-raised in the consumer
+                finally:
                     response_queue.put(None)  # Signal completion even on error
                 
-                # Restore the original get_llm function
-                global get_llm
-                get_llm = original_get_llm
-                
             # Start processing thread
-            threading.Thread(target=process_request).start()
+            threading.Thread(target=process_request, daemon=True).start()
             
             # Yield tokens as they arrive
             while True:
                 token = response_queue.get()
                 if token is None:  # End of response
                     break
+                if isinstance(token, Exception):
+                    raise token
                 yield token
         
         # Return the generator
@@ -146,17 +224,101 @@ def handle_message(message, session_id=None, stream=False):
         result = graph.invoke(state)
         
         # Get the final response
-        response = result["messages"][-1].content if result["messages"] else "I'm not sure how to respond to that."
+        response = _final_response(result)
         
         # Store the interaction in memory
-        CONVERSATION_MEMORY.add_interaction(
-            session_id=session_id,
-            user_message=message,
-            bot_response=response,
-            metadata={
-                "intent": result.get("intent"),
-                "preferences": result.get("user_preferences")
-            }
-        )
+        _store_interaction(session_id, message, response, result)
+        _cache_response(message, embedding, response, result)
         
         return response
+
+async def ahandle_message(message, session_id=None):
+    """
+    Async version of handle_message that drives the async graph with graph.ainvoke
+    
+    Args:
+        message (str): The user's message
+        session_id (str, optional): A unique session identifier
+        
+    Returns:
+        str with the complete response
+    """
+    if not session_id:
+        session_id = str(int(time.time()))
+    
+    embedding = await aembed_text(message) if _uses_response_cache(message, session_id) else None
+    cached = get_semantic_cached_response("response", embedding)
+    if cached:
+        logger.info("Using semantically cached response")
+        _store_interaction(session_id, message, cached["response"], cached)
+        return cached["response"]
+    
+    graph = get_compiled_graph(use_async=True)
+    result = await graph.ainvoke(_initial_state(message, session_id))
+    
+    response = _final_response(result)
+    _store_interaction(session_id, message, response, result)
+    _cache_response(message, embedding, response, result)
+    return response
+
+async def astream_message(message, session_id=None):
+    """
+    Async generator that yields response tokens as the async graph produces them
+    
+    Args:
+        message (str): The user's message
+        session_id (str, optional): A unique session identifier
+        
+    Yields:
+        Response tokens one by one; raises the error if the response fails part-way
+    """
+    if not session_id:
+        session_id = str(int(time.time()))
+    
+    embedding = await aembed_text(message) if _uses_response_cache(message, session_id) else None
+    cached = get_semantic_cached_response("response", embedding)
+    if cached:
+        logger.info("Using semantically cached response")
+        _store_interaction(session_id, message, cached["response"], cached)
+        yield cached["response"]
+        return
+    
+    graph = get_compiled_graph(use_async=True)
+    
+    # Request-scoped queue and callback, same isolation as the threaded streaming path
+    response_queue = asyncio.Queue()
+    streaming_handler = AsyncStreamingCallbackHandler(response_queue)
+    config = {
+        "callbacks": [streaming_handler],
+        "configurable": {"stream_response": True}
+    }
+    
+    async def process_request():
+        try:
+            result = await graph.ainvoke(_initial_state(message, session_id), config=config)
+            response = _final_response(result)
+            
+            # Responses that never reached the LLM (cache hits, error messages) are sent in one piece
+            if streaming_handler.token_count == 0:
+                await response_queue.put(response)
+            
+            _store_interaction(session_id, message, response, result)
+            _cache_response(message, embedding, response, result)
+        except Exception as e:
+            logger.error(f"Error in async streaming process: {e}", exc_info=True)
+            await response_queue.put(e)  # Re-raised in the consumer
+        finally:
+            await response_queue.put(None)  # Signal completion even on error
+    
+    task = asyncio.create_task(process_request())
+    try:
+        while True:
+            token = await response_queue.get()
+            if token is None:  # End of response
+                break
+            if isinstance(token, Exception):
+                raise token
+            yield token
+    finally:
+        if not task.done():
+            task.cancel()